@@ -1,27 +1,145 @@
 # app.py
-from fastapi import FastAPI
+from collections import Counter
+from contextlib import asynccontextmanager, nullcontext
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import FastAPI, HTTPException, Request
+from starlette.concurrency import run_in_threadpool
+from pymongo import ReadPreference
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Any, Dict, List, Literal, Optional
+import asyncio
+import itertools
 import json
+import logging
+import threading
+import time
+import uuid
 from datetime import datetime
 from src.database_manager import DatabaseManager
-from src.nlp_processor import NLPProcessor
-from src.conversation_manager import ConversationManager
 from config.settings import config
+from src.mongo_clients import client_registry
+from src.startup import StartupState, connect_with_retries, warm_collections
+from src.result_cache import SessionResultCache
+from src.materializer import Materializer
+from src.world_model import WorldModel
+from src.derived_fields import DerivedFieldManager
+from src.projection import apply_projection
+from src.deadline import DEADLINE_HEADER, Deadline, DeadlineExceeded, check_deadline, deadline_scope
+from src.admission import llm_admission, llm_breaker, priority_scope
+from src.profiling import profiler, render_flamegraph
+from src.compression import CompressionMiddleware
+from src.logging_setup import configure_logging, current_request_id, log_context, shutdown_logging
 
-app = FastAPI(title="Conversational DB Agent")
+logger = logging.getLogger(__name__)
 
-db_manager = DatabaseManager(config.MONGODB_URI, config.DATABASE_NAME)
-if not db_manager.connect():
-    raise RuntimeError("Database connection failed")
+# Populated by start_services() once MongoDB is reachable
+db_manager = None
+nlp_processor = None
+conv_manager = None
+materializer = None
+derived_fields = None
+world_model = None
+startup_state = StartupState()
+result_cache = SessionResultCache()
 
-nlp_processor = NLPProcessor(db_manager)
-conv_manager = ConversationManager()
+def _import_components():
+    """Import the langchain-backed modules; run off the request path."""
+    from src.nlp_processor import NLPProcessor
+    from src.conversation_manager import ConversationManager
+    return NLPProcessor, ConversationManager
+
+def start_services():
+    """
+    Bring the agent up in the background: import heavy modules while
+    connecting to MongoDB (with retries), build the processors, mark the
+    service ready, then pre-warm schemas and sample documents.
+    """
+    global db_manager, nlp_processor, conv_manager, materializer, derived_fields, world_model
+    try:
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="import") as loader:
+            components = loader.submit(_import_components)
+            startup_state.set_phase("connecting")
+            manager = DatabaseManager(config.MONGODB_URI, config.DATABASE_NAME)
+            if not connect_with_retries(manager, startup_state):
+                startup_state.fail("Database connection failed")
+                return
+            startup_state.set_phase("loading")
+            NLPProcessor, ConversationManager = components.result()
+
+        nlp_processor = NLPProcessor(manager)
+        conv_manager = ConversationManager()
+        db_manager = manager
+        client_registry.warm(["analytics"])
+        startup_state.mark_ready()
+
+        startup_state.set_phase("warming")
+        warm_collections(manager, config.COLLECTIONS, startup_state)
+        nlp_processor.value_dictionaries.warm(config.COLLECTIONS)
+        if config.DERIVED_FIELDS_ENABLED:
+            # Reconcile reads stay on the primary: a stale read could undo a newer change-stream update
+            derived_fields = DerivedFieldManager(client_registry.get_client(config.MONGODB_URI, "etl").get_database(
+                config.DATABASE_NAME, read_preference=ReadPreference.PRIMARY))
+            manager.derived_fields = derived_fields
+            derived_fields.start()
+        if config.MATERIALIZE_ENABLED:
+            materializer = Materializer(
+                manager.db,
+                client_registry.get_client(config.MONGODB_URI, "analytics")[config.ANALYTICS_DB].events,
+                # Recomputed from the primary so refreshed_at is the age of the data, not of a lagging secondary
+                refresh_db=client_registry.get_client(config.MONGODB_URI, "etl").get_database(
+                    config.DATABASE_NAME, read_preference=ReadPreference.PRIMARY)
+            )
+            manager.materializer = materializer
+            materializer.start()
+        if config.WORLD_MODEL_ENABLED:
+            # Learning reads from the primary: a lagging secondary would move the watermark past
+            # events it has not replicated yet, and the state it just wrote must read back
+            analytics_db = client_registry.get_client(config.MONGODB_URI, "analytics").get_database(
+                config.ANALYTICS_DB, read_preference=ReadPreference.PRIMARY)
+            world_model = WorldModel(analytics_db, analytics_db.events, manager.get_schema)
+            world_model.start()
+        startup_state.set_phase("serving")
+    except Exception as e:
+        logger.exception("Startup failed")
+        startup_state.fail(str(e))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    configure_logging()
+    threading.Thread(target=start_services, name="startup", daemon=True).start()
+    yield
+    if materializer is not None:
+        materializer.stop()
+    if world_model is not None:
+        world_model.stop()
+    if derived_fields is not None:
+        derived_fields.stop()
+    client_registry.close_all()
+    shutdown_logging()
+
+app = FastAPI(title="Conversational DB Agent", lifespan=lifespan)
+# Negotiated zstd/br/gzip for /query responses above HTTP_COMPRESSION_MIN_SIZE
+app.add_middleware(CompressionMiddleware)
+
+REQUEST_ID_HEADER = "X-Request-ID"
+
+@app.middleware("http")
+async def tag_request(http_request: Request, call_next):
+    """Give each request an id (the client's, if sent) that its log records carry."""
+    request_id = http_request.headers.get(REQUEST_ID_HEADER) or uuid.uuid4().hex
+    with log_context(request_id=request_id):
+        response = await call_next(http_request)
+    response.headers[REQUEST_ID_HEADER] = request_id
+    return response
 
 class QueryRequest(BaseModel):
     session_id: Optional[str] = None
     collection: str
     query_text: str
+    # Fields the client displays (always returned); an explicit projection, {} for whole documents
+    render_fields: Optional[List[str]] = None
+    projection: Optional[Dict[str, Any]] = None
 
 class QueryResponse(BaseModel):
     session_id: str
@@ -30,6 +148,38 @@ class QueryResponse(BaseModel):
     error: Optional[str] = None
     error_type: Optional[str] = None
 
+class BatchQueryItem(BaseModel):
+    collection: str
+    query_text: str
+
+class BatchQueryRequest(BaseModel):
+    session_id: Optional[str] = None
+    items: List[BatchQueryItem] = Field(min_length=1)
+
+class ExportRequest(BaseModel):
+    session_id: Optional[str] = None
+    collection: str
+    query_text: str
+    format: Literal["arrow", "parquet", "csv"] = "arrow"
+    # Fields to export; {} or None exports whole documents
+    projection: Optional[Dict[str, Any]] = None
+
+class BatchItemResult(BaseModel):
+    index: int
+    collection: str
+    query_text: str
+    data: List[dict] = Field(default_factory=list)
+    execution_time: float
+    parse_time: float
+    total_time: float
+    error: Optional[str] = None
+    error_type: Optional[str] = None
+
+class BatchQueryResponse(BaseModel):
+    session_id: str
+    results: List[BatchItemResult]
+    total_time: float
+
 def convert_datetime_to_str(obj):
     """Recursively convert datetime objects to ISO strings"""
     if isinstance(obj, dict):
@@ -40,63 +190,385 @@ def convert_datetime_to_str(obj):
         return obj.isoformat()
     return obj
 
-@app.post("/query", response_model=QueryResponse)
-def handle_query(request: QueryRequest):
-    # Manage session
-    session_id = request.session_id or conv_manager.session_id
-    if not request.session_id:
-        conv_manager.session_id = session_id
+def _answer_query(collection: str, query_text: str, session_id: str, remember: bool = True,
+                  llm_slot=None, db_slot=None, projection: Optional[Dict[str, Any]] = None,
+                  render_fields: Optional[List[str]] = None,
+                  deadline: Optional[Deadline] = None, priority: str = "interactive") -> Dict[str, Any]:
+    """
+    Parse, execute and log one question. Shared by /query and /query/batch;
+    the optional slots bound how many items use the LLM and MongoDB at once.
+    Conversational turns (remember=True) see the previous turn's intent and
+    may be answered from its cached result set instead of MongoDB. Find
+    intents without a projection get one inferred from the question.
 
+    Under a `deadline`, the LLM call and MongoDB get only the time that is
+    left, and stages that have not started yet are skipped once it expires
+    or is cancelled; the answer then has error_type "timeout" or "cancelled".
+    `priority` is the admission class of its LLM call ("interactive" or
+    "batch"); a shed call comes back as error_type "overloaded".
+    """
+    with deadline_scope(deadline), priority_scope(priority), log_context(session_id=session_id):
+        try:
+            return _parse_and_execute(collection, query_text, session_id, remember, llm_slot, db_slot,
+                                      projection, render_fields)
+        except DeadlineExceeded as e:
+            conv_manager.add_ai_message_to_analytics(
+                text=f"ERROR: {str(e)}",
+                intent={"query_type": "error", "error_type": e.error_type},
+                success_flag=False,
+                exec_time=0.0,
+                session_id=session_id,
+                collection=collection,
+                question=query_text
+            )
+            return {"data": [], "execution_time": 0.0, "parse_time": 0.0,
+                    "error": str(e), "error_type": e.error_type}
+
+def _parse_and_execute(collection: str, query_text: str, session_id: str, remember: bool,
+                       llm_slot, db_slot, projection: Optional[Dict[str, Any]],
+                       render_fields: Optional[List[str]]) -> Dict[str, Any]:
     # Log user message
-    conv_manager.add_user_message_to_analytics(request.query_text)
+    conv_manager.add_user_message_to_analytics(query_text, collection, session_id=session_id)
 
     # Parse and execute query
-    intent = nlp_processor.parse_query(request.query_text, request.collection)
-    
+    started = time.perf_counter()
+    session_context = result_cache.context(session_id) if remember else None
+    # Questions known to be unanswerable against this schema skip the LLM
+    intent = world_model.lookup(collection, query_text, bool(session_context)) if world_model is not None else None
+    if intent is None:
+        with llm_slot or nullcontext():
+            check_deadline()
+            intent = nlp_processor.parse_query(query_text, collection, session_context=session_context)
+    parse_time = time.perf_counter() - started
+
     # Handle error responses
     if intent.get("query_type") == "error":
         error_type = intent.get("error_type", "unknown")
         error_msg = intent.get("error_message", "Could not process request")
-        
+
         # Log and return error
         conv_manager.add_ai_message_to_analytics(
             text=f"ERROR: {error_msg}",
             intent=intent,
             success_flag=False,
-            exec_time=0.0
+            exec_time=0.0,
+            session_id=session_id,
+            collection=collection,
+            question=query_text
         )
-        return QueryResponse(
+        return {"data": [], "execution_time": 0.0, "parse_time": parse_time,
+                "error": error_msg, "error_type": error_type, "retry_after": intent.get("retry_after")}
+
+    if intent.get("query_type") == "find":
+        try:
+            schema = db_manager.get_schema(collection)
+        except Exception as e:
+            logger.warning(f"No schema for projection inference on {collection}: {str(e)}")
+            schema = {}
+        intent = apply_projection(intent, query_text, schema, override=projection, render_fields=render_fields)
+
+    # Execute valid query, reusing the previous turn's rows when they cover it
+    cached_started = time.perf_counter()
+    cached_rows = result_cache.answer(session_id, collection, intent) if remember else None
+    if cached_rows is not None:
+        result = {"success": True, "data": cached_rows, "result_count": len(cached_rows),
+                  "execution_time_seconds": time.perf_counter() - cached_started}
+    else:
+        with db_slot or nullcontext():
+            check_deadline()
+            result = nlp_processor.execute_intent(collection, intent)
+    if result.get("error_type") in ("timeout", "cancelled"):
+        conv_manager.add_ai_message_to_analytics(
+            text=f"ERROR: {result['error']}",
+            intent=intent,
+            success_flag=False,
+            exec_time=0.0,
             session_id=session_id,
-            data=[],
-            execution_time=0.0,
-            error=error_msg,
-            error_type=error_type
+            collection=collection,
+            question=query_text
         )
-    
-    # Execute valid query
-    result = nlp_processor.execute_intent(request.collection, intent)
-    
+        return {"data": [], "execution_time": 0.0, "parse_time": parse_time,
+                "error": result["error"], "error_type": result["error_type"]}
+    if remember:
+        fresh_rows = result.get("data") if cached_rows is None and result.get("success") else None
+        result_cache.remember(session_id, collection, intent, fresh_rows)
+
     # Prepare and sanitize response
     response_data = convert_datetime_to_str(result.get("data", []))
     execution_time = result.get("execution_time_seconds", 0.0)
     success = result.get("success", False)
-    
+
     # Log AI response
     conv_manager.add_ai_message_to_analytics(
-        text=str(response_data),
+        text=f"{len(response_data)} results" if success else f"ERROR: {result.get('error')}",
         intent=intent,
         success_flag=success,
-        exec_time=execution_time
+        exec_time=execution_time,
+        session_id=session_id,
+        collection=collection,
+        results=response_data,
+        question=query_text
     )
-    
+
     # Save interaction to memory
-    conv_manager.save_interaction_to_memory(
-        user_input=request.query_text,
-        ai_output=str(response_data)
-    )
+    if remember:
+        conv_manager.save_interaction_to_memory(
+            user_input=query_text,
+            ai_output=str(response_data)
+        )
 
-    return QueryResponse(
-        session_id=session_id,
-        data=response_data,
-        execution_time=execution_time
-    )
+    return {"data": response_data, "execution_time": execution_time, "parse_time": parse_time,
+            "success": success, "execution_error": result.get("error")}
+
+def _require_ready():
+    if not startup_state.ready:
+        raise HTTPException(status_code=503, detail="Service is starting up", headers={"Retry-After": "1"})
+
+async def _cancel_on_disconnect(http_request: Request, deadline: Optional[Deadline], func):
+    """
+    Run blocking query work in the threadpool; if the client disconnects
+    first, cancel its deadline so the remaining LLM and MongoDB stages are
+    skipped instead of running for nobody.
+    """
+    work = asyncio.ensure_future(run_in_threadpool(func))
+    while not work.done():
+        await asyncio.wait({work}, timeout=config.DISCONNECT_POLL_INTERVAL)
+        if deadline is not None and not work.done() and await http_request.is_disconnected():
+            deadline.cancel()
+            break
+    return await work
+
+@app.post("/query", response_model=QueryResponse)
+async def handle_query(request: QueryRequest, http_request: Request):
+    _require_ready()
+    deadline = Deadline.from_header(http_request.headers.get(DEADLINE_HEADER))
+
+    # Callers without a session get their own; the id keys the cached result set
+    session_id = request.session_id or str(uuid.uuid4())
+
+    def respond():
+        answer = _answer_query(request.collection, request.query_text, session_id,
+                               projection=request.projection, render_fields=request.render_fields,
+                               deadline=deadline)
+        if answer.get("error_type") == "overloaded":
+            return answer, None
+        # Built here rather than on the event loop so sampled profiles include its validation
+        return answer, QueryResponse(
+            session_id=session_id,
+            data=answer["data"],
+            execution_time=answer["execution_time"],
+            error=answer.get("error"),
+            error_type=answer.get("error_type")
+        )
+
+    if profiler.should_sample():
+        respond = profiler.profiled(respond)
+    answer, response = await _cancel_on_disconnect(http_request, deadline, respond)
+    if response is None:
+        raise HTTPException(status_code=429, detail=answer["error"],
+                            headers={"Retry-After": str(answer.get("retry_after") or 1)})
+    return response
+
+@app.post("/query/batch", response_model=BatchQueryResponse)
+def handle_batch_query(request: BatchQueryRequest, http_request: Request):
+    """
+    Answer many (collection, question) pairs concurrently. Schemas for the
+    distinct collections are loaded once up front, identical questions are
+    answered once, and intent generation and MongoDB execution run under
+    separate concurrency caps, so wall time tracks the slowest item. All
+    items share the request's deadline.
+    """
+    _require_ready()
+    deadline = Deadline.from_header(http_request.headers.get(DEADLINE_HEADER))
+    if len(request.items) > config.BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Batch exceeds {config.BATCH_MAX_ITEMS} items")
+
+    started = time.perf_counter()
+    session_id = request.session_id or str(uuid.uuid4())
+    db_manager.get_schemas([item.collection for item in request.items])
+
+    unique = list(dict.fromkeys((item.collection, item.query_text) for item in request.items))
+    llm_slot = threading.BoundedSemaphore(max(config.BATCH_LLM_CONCURRENCY, 1))
+    db_slot = threading.BoundedSemaphore(max(config.BATCH_DB_CONCURRENCY, 1))
+    request_id = current_request_id()
+
+    def answer(pair):
+        item_started = time.perf_counter()
+        try:
+            result = _answer_query(pair[0], pair[1], session_id, remember=False,
+                                   llm_slot=llm_slot, db_slot=db_slot, deadline=deadline,
+                                   priority="batch")
+        except Exception as e:
+            logger.exception("Batch item failed")
+            result = {"data": [], "execution_time": 0.0, "parse_time": 0.0,
+                      "error": str(e), "error_type": "processing"}
+        if result.get("execution_error") and not result.get("error"):
+            result["error"], result["error_type"] = result["execution_error"], "execution"
+        result["total_time"] = time.perf_counter() - item_started
+        return result
+
+    def answer_in_request(pair):
+        # Executor threads do not inherit the request's log context
+        with log_context(session_id=session_id, request_id=request_id):
+            return answer(pair)
+
+    workers = max(1, min(len(unique), config.BATCH_LLM_CONCURRENCY + config.BATCH_DB_CONCURRENCY))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch") as executor:
+        answers = dict(zip(unique, executor.map(answer_in_request, unique)))
+
+    results = []
+    for index, item in enumerate(request.items):
+        result = answers[(item.collection, item.query_text)]
+        results.append(BatchItemResult(
+            index=index,
+            collection=item.collection,
+            query_text=item.query_text,
+            data=result["data"],
+            execution_time=result["execution_time"],
+            parse_time=result["parse_time"],
+            total_time=result["total_time"],
+            error=result.get("error"),
+            error_type=result.get("error_type")
+        ))
+    return BatchQueryResponse(session_id=session_id, results=results,
+                              total_time=time.perf_counter() - started)
+
+EXPORT_EXTENSIONS = {"arrow": "arrows", "parquet": "parquet", "csv": "csv"}
+
+@app.post("/query/export")
+def handle_export(request: ExportRequest, http_request: Request):
+    """
+    Answer a question with a columnar file instead of JSON. The intent's
+    cursor is read in EXPORT_BATCH_SIZE batches; each becomes an Arrow
+    record batch typed from the extracted schema and the first batch, and
+    is streamed out as Arrow IPC, Parquet or CSV, so memory stays bounded by
+    one batch. Later values that do not fit their column are nulled and
+    counted in the analytics event. The request deadline covers intent
+    generation only.
+    """
+    _require_ready()
+    # Imported here so the API can start serving before pyarrow loads
+    from src.columnar_export import MEDIA_TYPES, stream_export
+    deadline = Deadline.from_header(http_request.headers.get(DEADLINE_HEADER))
+    session_id = request.session_id or str(uuid.uuid4())
+    collection = request.collection
+
+    conv_manager.add_user_message_to_analytics(request.query_text, collection, session_id=session_id)
+    with deadline_scope(deadline), priority_scope("batch"), log_context(session_id=session_id):
+        intent = nlp_processor.parse_query(request.query_text, collection)
+    if intent.get("query_type") == "error":
+        error_type = intent.get("error_type", "unknown")
+        error_msg = intent.get("error_message", "Could not process request")
+        conv_manager.add_ai_message_to_analytics(
+            text=f"ERROR: {error_msg}",
+            intent=intent,
+            success_flag=False,
+            exec_time=0.0,
+            session_id=session_id,
+            collection=collection,
+            question=request.query_text
+        )
+        if error_type == "overloaded":
+            raise HTTPException(status_code=429, detail=error_msg,
+                                headers={"Retry-After": str(intent.get("retry_after") or 1)})
+        raise HTTPException(status_code=504 if error_type in ("timeout", "cancelled") else 422, detail=error_msg)
+    if request.projection is not None:
+        intent = dict(intent, projection=request.projection or None)
+    try:
+        schema = db_manager.get_schema(collection)
+    except Exception as e:
+        logger.warning(f"No schema for export typing on {collection}: {str(e)}")
+        schema = {}
+
+    def chunks():
+        started = time.perf_counter()
+        exported = 0
+        coerced = Counter()
+        success = False
+
+        def counted(batches):
+            nonlocal exported
+            for batch in batches:
+                exported += len(batch)
+                yield batch
+        try:
+            yield from stream_export(counted(db_manager.iter_query(collection, intent["query_type"], intent)),
+                                     request.format, schema, intent.get("projection"), coerced)
+            success = True
+        finally:
+            nulled = f" ({sum(coerced.values())} values did not fit their column and were nulled)" if coerced else ""
+            conv_manager.add_ai_message_to_analytics(
+                text=f"Exported {exported} rows as {request.format}{nulled}",
+                intent=intent,
+                success_flag=success,
+                exec_time=time.perf_counter() - started,
+                session_id=session_id,
+                collection=collection,
+                question=request.query_text
+            )
+
+    # Run the query and encode the first batch now, so failures are still an HTTP error
+    body = chunks()
+    try:
+        head = next(body)
+    except Exception as e:
+        logger.exception("Export failed")
+        raise HTTPException(status_code=400, detail=f"Export failed: {str(e)}")
+    filename = f"{collection}.{EXPORT_EXTENSIONS[request.format]}"
+    return StreamingResponse(itertools.chain([head], body), media_type=MEDIA_TYPES[request.format],
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+@app.get("/health")
+def health():
+    """Liveness: the process is up, even if dependencies are still warming."""
+    return {"status": "ok"}
+
+@app.get("/ready")
+def ready():
+    """Readiness plus warm-up progress; 503 until queries can be served."""
+    state = startup_state.snapshot()
+    return JSONResponse(status_code=200 if state["ready"] else 503, content=state)
+
+@app.get("/admin/pools")
+def pool_stats():
+    """Connection pool utilization per MongoDB client role."""
+    return {"pools": client_registry.pool_stats()}
+
+@app.get("/admin/admission")
+def admission_stats():
+    """LLM admission queue and circuit breaker state."""
+    return {"admission": llm_admission.stats(), "breaker": llm_breaker.stats()}
+
+@app.get("/admin/profile")
+def profile(seconds: int = 300, format: str = "svg"):
+    """
+    Stacks sampled from profiled /query requests over the last `seconds`:
+    an SVG flame graph, or collapsed stacks ("collapsed") for other tools.
+    Requests are profiled at PROFILE_SAMPLE_RATE; 0 turns sampling off.
+    """
+    if format == "collapsed":
+        return PlainTextResponse(profiler.collapsed(seconds))
+    if format == "stats":
+        return profiler.stats()
+    if format != "svg":
+        raise HTTPException(status_code=400, detail="format must be svg, collapsed or stats")
+    title = f"/query, last {seconds}s"
+    return Response(render_flamegraph(profiler.stacks(seconds), title), media_type="image/svg+xml")
+
+@app.get("/admin/derived-fields")
+def derived_field_status():
+    """Derived fields in use for query rewriting and how each is kept current."""
+    return {"fields": derived_fields.status() if derived_fields is not None else {}}
+
+@app.get("/admin/world-model")
+def world_model_gaps(limit: int = 50):
+    """Known-unanswerable questions per collection, most frequent first."""
+    if world_model is None:
+        return {"enabled": False, "stats": None, "gaps": []}
+    return {"enabled": True, "stats": world_model.stats(), "gaps": world_model.gaps_report(limit)}
+
+@app.get("/admin/materialized")
+def materialized_stats():
+    """Hot intents currently served from summary collections."""
+    return {"enabled": materializer is not None,
+            "stats": materializer.stats() if materializer is not None else None}
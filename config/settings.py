@@ -16,6 +16,10 @@ class Config:
     # Application Settings
     DEBUG = os.getenv('DEBUG', 'False').lower() == 'true'
     LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+    LOG_FORMAT = os.getenv('LOG_FORMAT', 'json')  # "json" lines, or "text" for local runs
+    LOG_QUEUE_SIZE = 10000  # Records waiting for the logging thread; more are dropped
+    LOG_PAYLOAD_SAMPLE_RATE = float(os.getenv('LOG_PAYLOAD_SAMPLE_RATE', 0.01))  # Requests whose debug payloads (raw LLM output) are kept
+    LOG_PAYLOAD_MAX_CHARS = 2000  # Longer payloads are truncated
 
     # Collections to work with
     COLLECTIONS = ['customers', 'events', 'transactions', 'dashboard_metrics']
@@ -24,10 +28,178 @@ class Config:
     GROQ_TEMPERATURE = 0.1  # Low temperature for consistent responses
     GROQ_MAX_TOKENS = 1000  # Reasonable limit for responses
     GROQ_BASE_URL = "https://api.groq.com/openai/v1"  # OpenAI compatibility
+    GROQ_MAX_RETRIES = 1  # Each retry gets the full remaining deadline again
+
+    # LLM backend (see src/llm_backends.py): "groq", "record" (Groq, saving calls) or "replay" (offline)
+    LLM_BACKEND = os.getenv('LLM_BACKEND', 'groq')
+    LLM_RECORDING_PATH = os.getenv('LLM_RECORDING_PATH', 'recordings/llm_calls.jsonl')
+    LLM_REPLAY_LATENCY = os.getenv('LLM_REPLAY_LATENCY', 'recorded')  # "none", "recorded" or "synthetic"
+    LLM_SYNTHETIC_LATENCY = (0.4, 1.2)  # Median and p95 seconds of synthetic replay latency
+    LLM_FAULT_MALFORMED_RATE = float(os.getenv('LLM_FAULT_MALFORMED_RATE', 0))  # Share of calls returning malformed JSON
+    LLM_FAULT_TIMEOUT_RATE = float(os.getenv('LLM_FAULT_TIMEOUT_RATE', 0))  # Share of calls that time out
+    LLM_FAULT_TIMEOUT_SECONDS = 10.0  # How long an injected timeout hangs when the call has no deadline
+    LLM_FAULT_SEED = int(os.getenv('LLM_FAULT_SEED', 0))
+
+    # Request deadlines (see src/deadline.py)
+    REQUEST_DEADLINE_MS = int(os.getenv('REQUEST_DEADLINE_MS', 25000))  # Used when a client sends no X-Request-Deadline-Ms; 0 disables
+    REQUEST_DEADLINE_MAX_MS = int(os.getenv('REQUEST_DEADLINE_MAX_MS', 120000))  # Cap on client-requested deadlines
+    DISCONNECT_POLL_INTERVAL = 0.25  # Seconds between client disconnect checks
+
+    # Admission control for LLM calls (see src/admission.py)
+    ADMISSION_MAX_CONCURRENT = int(os.getenv('ADMISSION_MAX_CONCURRENT', 8))  # LLM calls in flight
+    ADMISSION_MAX_QUEUE = int(os.getenv('ADMISSION_MAX_QUEUE', 64))  # Callers waiting for a slot
+    ADMISSION_MAX_QUEUE_WAIT = {'interactive': 5.0, 'batch': 30.0}  # Seconds each class may queue
+    ADMISSION_INITIAL_SERVICE_TIME = 1.0  # Assumed LLM call time (seconds) until calls are measured
+    BREAKER_FAILURE_THRESHOLD = 5  # Consecutive provider errors that open the circuit
+    BREAKER_RESET_TIMEOUT = 30  # Seconds before a probe call is let through
+    RECENT_INTENTS_SIZE = 512  # Intents kept as a fallback when the LLM is unavailable
 
     # Database Manager Settings
     DB_CONNECTION_TIMEOUT = 10000  # 10 seconds
     DB_QUERY_LIMIT = 100  # Default query limit
-    SCHEMA_SAMPLE_SIZE = 100  # Documents to sample for schema extraction
+    SCHEMA_SAMPLE_SIZE = int(os.getenv('SCHEMA_SAMPLE_SIZE', 100))  # Documents to sample for schema extraction
+    SCHEMA_ARRAY_ELEMENT_CAP = 50  # Array elements inspected per array when profiling
+    SCHEMA_TOP_K = 5  # Most frequent values kept per field as prompt hints
+    PROMPT_HINT_MAX_DISTINCT = 50  # Only fields with at most this many distinct values get value hints
+    SCHEMA_CACHE_TTL = int(os.getenv('SCHEMA_CACHE_TTL', 600))  # Seconds before a cached schema is re-extracted
+    SCHEMA_EXTRACTION_WORKERS = int(os.getenv('SCHEMA_EXTRACTION_WORKERS', 8))  # Collections sampled concurrently
+
+    # Value dictionaries for entity resolution (see src/value_dictionary.py)
+    VALUE_DICTIONARY_COLLECTION = 'value_dictionaries'
+    VALUE_DICT_MAX_DISTINCT = 200  # Fields with more distinct values are not scanned
+    VALUE_DICT_MIN_FREQUENCY = 0.1  # Skip fields present in fewer sampled documents
+    VALUE_DICT_MAX_FIELDS = 20  # Per collection, most frequent fields first
+    VALUE_DICT_MAX_VALUE_LENGTH = 64
+    VALUE_DICT_TTL = int(os.getenv('VALUE_DICT_TTL', 3600))  # Seconds before a dictionary is rebuilt
+    VALUE_DICT_FAST_PATH = os.getenv('VALUE_DICT_FAST_PATH', 'True').lower() == 'true'  # Answer fully matched questions without the LLM
+
+    # Derived indexed fields such as customers.state_code (see src/derived_fields.py)
+    DERIVED_FIELDS_ENABLED = os.getenv('DERIVED_FIELDS_ENABLED', 'True').lower() == 'true'
+    DERIVED_FIELDS_RECONCILE_INTERVAL = 300  # Seconds between reconciles when change streams are unavailable
+    DERIVED_FIELDS_BATCH_SIZE = 500  # Documents per bulk update during reconcile
+
+    # Default projections for find intents (see src/projection.py)
+    PROJECTION_INFERENCE = os.getenv('PROJECTION_INFERENCE', 'True').lower() == 'true'
+    PROJECTION_FIELD_BUDGET = int(os.getenv('PROJECTION_FIELD_BUDGET', 8))  # Fields returned unless more are needed
+    PROJECTION_RENDER_FIELDS = ['name', 'account_id']  # What clients show for each result (summarize_for_speech)
+    PROJECTION_MAX_NESTED_FIELDS = 8  # Objects with more nested fields are only returned when asked for
+
+    # Startup Settings
+    STARTUP_RETRY_BASE_DELAY = 0.5  # First backoff between MongoDB connection attempts (seconds)
+    STARTUP_RETRY_MAX_DELAY = 10.0  # Backoff cap (seconds)
+    STARTUP_MAX_ATTEMPTS = int(os.getenv('STARTUP_MAX_ATTEMPTS', 0))  # 0 = keep retrying
+
+    # Batch query settings (/query/batch)
+    BATCH_MAX_ITEMS = int(os.getenv('BATCH_MAX_ITEMS', 100))
+    BATCH_LLM_CONCURRENCY = int(os.getenv('BATCH_LLM_CONCURRENCY', 8))  # Concurrent intent generations
+    BATCH_DB_CONCURRENCY = int(os.getenv('BATCH_DB_CONCURRENCY', 16))  # Concurrent MongoDB queries
+
+    # Session result reuse for follow-up questions (see src/result_cache.py)
+    RESULT_CACHE_TTL = int(os.getenv('RESULT_CACHE_TTL', 300))  # Seconds a cached result set may be reused
+    RESULT_CACHE_MAX_ROWS = 1000  # Larger result sets are not kept
+    RESULT_CACHE_MAX_SESSIONS = 1000  # Least recently used sessions are dropped beyond this
+
+    # Materialized results for hot count/aggregate intents (see src/materializer.py)
+    MATERIALIZE_ENABLED = os.getenv('MATERIALIZE_ENABLED', 'True').lower() == 'true'
+    MATERIALIZE_MIN_HITS = int(os.getenv('MATERIALIZE_MIN_HITS', 5))  # Executions in the window that make an intent hot
+    MATERIALIZE_WINDOW_HOURS = 24  # Events window scanned for hot intents
+    MATERIALIZE_MAX_INTENTS = 50  # Most frequent intents kept materialized
+    MATERIALIZE_REFRESH_INTERVAL = int(os.getenv('MATERIALIZE_REFRESH_INTERVAL', 60))  # Seconds between refreshes
+    MATERIALIZED_MAX_AGE = int(os.getenv('MATERIALIZED_MAX_AGE', 120))  # Older summaries are not served
+    MATERIALIZED_COUNTS_COLLECTION = 'materialized_counts'
+    MATERIALIZED_AGGREGATES_COLLECTION = 'materialized_aggregates'
+
+    # Read routing: interactive queries read from the primary (or 'nearest'); background
+    # scans prefer secondaries tagged for analytics, then any secondary, within a staleness bound
+    MONGO_QUERY_READ_PREFERENCE = os.getenv('MONGO_QUERY_READ_PREFERENCE', 'primary')
+    MONGO_BACKGROUND_READ_PREFERENCE = os.getenv('MONGO_BACKGROUND_READ_PREFERENCE', 'secondaryPreferred')
+    MONGO_MAX_STALENESS_SECONDS = int(os.getenv('MONGO_MAX_STALENESS_SECONDS', 120))  # MongoDB requires at least 90
+    MONGO_BACKGROUND_READ_TAGS = [os.getenv('MONGO_BACKGROUND_READ_TAGS', 'workload:analytics'), '']
+
+    # Analytics events store a digest of each result set (see src/result_digest.py)
+    ANALYTICS_PREVIEW_ROWS = int(os.getenv('ANALYTICS_PREVIEW_ROWS', 3))  # Leading rows kept in the event
+    ANALYTICS_PREVIEW_BYTES = int(os.getenv('ANALYTICS_PREVIEW_BYTES', 2048))  # ... within this many bytes of JSON
+    ANALYTICS_STORE_FULL_PAYLOADS = os.getenv('ANALYTICS_STORE_FULL_PAYLOADS', 'False').lower() == 'true'
+    ANALYTICS_PAYLOADS_COLLECTION = 'event_payloads'  # Compressed full result sets, referenced by payload_id
+    ANALYTICS_PAYLOAD_TTL = int(os.getenv('ANALYTICS_PAYLOAD_TTL', 7 * 24 * 3600))  # Seconds full payloads are kept
+    ANALYTICS_PAYLOAD_MAX_BYTES = 8 * 1024 * 1024  # Larger compressed payloads are skipped
+
+    # Known-unanswerable questions learned from the events log (see src/world_model.py)
+    WORLD_MODEL_ENABLED = os.getenv('WORLD_MODEL_ENABLED', 'True').lower() == 'true'
+    WORLD_MODEL_COLLECTION = 'known_gaps'
+    WORLD_MODEL_STATE_COLLECTION = 'world_model_state'  # Schema fingerprint and learning watermark per collection
+    WORLD_MODEL_MIN_FAILURES = int(os.getenv('WORLD_MODEL_MIN_FAILURES', 2))  # Failures before a question is short-circuited
+    WORLD_MODEL_TTL = int(os.getenv('WORLD_MODEL_TTL', 7 * 24 * 3600))  # Seconds a gap is kept without new failures
+    WORLD_MODEL_LOOKBACK_HOURS = 24  # History learned from when a collection is first seen
+    WORLD_MODEL_REFRESH_INTERVAL = int(os.getenv('WORLD_MODEL_REFRESH_INTERVAL', 60))  # Seconds between learning rounds
+    WORLD_MODEL_MAX_EVENTS = 5000  # Failure events read per collection per round
+    WORLD_MODEL_FIELD_MIN_FREQUENCY = 0.05  # Rarer fields do not count toward the schema fingerprint
+
+    # Columnar exports from /query/export (see src/columnar_export.py)
+    EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', 5000))  # Documents per cursor batch and record batch
+    EXPORT_MAX_ROWS = int(os.getenv('EXPORT_MAX_ROWS', 1000000))  # Cap for finds without a limit
+    EXPORT_PARQUET_COMPRESSION = 'zstd'
+
+    # Sampled profiling of /query (see src/profiling.py and /admin/profile)
+    PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', 0.0))  # Fraction of requests profiled; 0.01 is cheap enough for production
+    PROFILE_INTERVAL_MS = int(os.getenv('PROFILE_INTERVAL_MS', 5))  # Stack sampling interval while a request is profiled
+    PROFILE_BUCKET_SECONDS = 10  # Granularity of the time window
+    PROFILE_RETENTION_SECONDS = 3600  # Samples older than this are dropped
+    PROFILE_MAX_DEPTH = 128  # Frames kept per stack, from the leaf
+
+    # Wire compression between MongoDB and the app, in order of preference ("zstd,snappy,zlib";
+    # zstd and snappy need pymongo's zstd/snappy extras, or are skipped). Empty turns it off.
+    MONGO_COMPRESSORS = os.getenv('MONGO_COMPRESSORS', 'zstd,zlib')
+    MONGO_ZLIB_COMPRESSION_LEVEL = int(os.getenv('MONGO_ZLIB_COMPRESSION_LEVEL', 6))
+
+    # HTTP response compression (see src/compression.py)
+    HTTP_COMPRESSION_PATHS = ['/query']  # Path prefixes whose responses are compressed
+    HTTP_COMPRESSION_MIN_SIZE = int(os.getenv('HTTP_COMPRESSION_MIN_SIZE', 1024))  # Smaller bodies are sent as is
+    HTTP_COMPRESSION_ENCODINGS = ['zstd', 'br', 'gzip']  # Server preference when the client accepts several
+    HTTP_COMPRESSION_LEVELS = {'zstd': 3, 'br': 4, 'gzip': 6}
+    HTTP_COMPRESSION_SKIP_TYPES = ['application/vnd.apache.parquet']  # Bodies that are compressed already
+
+    # MongoDB client pools, one per workload role (see src/mongo_clients.py)
+    MONGO_POOL_PROFILES = {
+        # Interactive /query traffic: large warm pool, fail fast when saturated
+        "query": {
+            "maxPoolSize": int(os.getenv('MONGO_QUERY_MAX_POOL', 50)),
+            "minPoolSize": int(os.getenv('MONGO_QUERY_MIN_POOL', 5)),
+            "waitQueueTimeoutMS": 2000,
+            "compressors": MONGO_COMPRESSORS,
+            "readPreference": MONGO_QUERY_READ_PREFERENCE,
+        },
+        # Analytics event writes and dashboard reads: small pool, isolated from queries
+        "analytics": {
+            "maxPoolSize": int(os.getenv('MONGO_ANALYTICS_MAX_POOL', 10)),
+            "minPoolSize": 1,
+            "waitQueueTimeoutMS": 5000,
+            "socketTimeoutMS": 10000,
+            "compressors": "",  # Small writes gain little from compression
+            "readPreference": MONGO_BACKGROUND_READ_PREFERENCE,
+            "maxStalenessSeconds": MONGO_MAX_STALENESS_SECONDS,
+            "readPreferenceTags": MONGO_BACKGROUND_READ_TAGS,
+        },
+        # Batch ETL scans: few connections, patient waits, compressed transfers
+        "etl": {
+            "maxPoolSize": int(os.getenv('MONGO_ETL_MAX_POOL', 4)),
+            "minPoolSize": 0,
+            "waitQueueTimeoutMS": 30000,
+            "compressors": MONGO_COMPRESSORS,
+            "readPreference": MONGO_BACKGROUND_READ_PREFERENCE,
+            "maxStalenessSeconds": MONGO_MAX_STALENESS_SECONDS,
+            "readPreferenceTags": MONGO_BACKGROUND_READ_TAGS,
+        },
+        # Schema and value-dictionary sampling: one connection per extraction worker
+        "sampling": {
+            "maxPoolSize": SCHEMA_EXTRACTION_WORKERS,
+            "minPoolSize": 0,
+            "waitQueueTimeoutMS": 10000,
+            "compressors": MONGO_COMPRESSORS,
+            "readPreference": MONGO_BACKGROUND_READ_PREFERENCE,
+            "maxStalenessSeconds": MONGO_MAX_STALENESS_SECONDS,
+            "readPreferenceTags": MONGO_BACKGROUND_READ_TAGS,
+        },
+    }
 
 config = Config()
\ No newline at end of file
@@ -1,7 +1,6 @@
 import os
 import sys
 import pandas as pd
-from pymongo import MongoClient
 from dotenv import load_dotenv
 import streamlit as st
 import datetime
@@ -10,6 +9,7 @@ from bson import ObjectId
 # Ensure the root directory is in the Python path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from config.settings import config
+from src.mongo_clients import client_registry
 
 # Load environment variables
 load_dotenv()
@@ -41,7 +41,7 @@ def clean_mongo_document(doc):
 # --- Data Loading and Caching ---
 @st.cache_data(ttl=600)
 def load_metrics_data():
-    client = MongoClient(config.MONGODB_URI)
+    client = client_registry.get_client(config.MONGODB_URI, "analytics")
     db = client[config.DATABASE_NAME]
     cursor = db.dashboard_metrics.find().sort("date", -1)
     data = list(cursor)
@@ -113,4 +113,25 @@ else:
 
 # --- Data Gaps Table ---
 st.subheader("Data Gaps Table")
-st.dataframe(df[['data_gaps']])
\ No newline at end of file
+st.dataframe(df[['data_gaps']])
+# --- Known Data Gaps (World Model) ---
+@st.cache_data(ttl=600)
+def load_known_gaps():
+    client = client_registry.get_client(config.MONGODB_URI, "analytics")
+    db = client[config.ANALYTICS_DB]
+    current = {state["_id"]: state["fingerprint"] for state in db[config.WORLD_MODEL_STATE_COLLECTION].find()}
+    gaps = [clean_mongo_document(gap) for gap in db[config.WORLD_MODEL_COLLECTION].find({}, {"_id": 0})
+            if current.get(gap.get("collection")) == gap.get("fingerprint")]
+    return pd.DataFrame(gaps)
+
+st.subheader("Known Data Gaps (World Model)")
+gaps_df = load_known_gaps()
+if gaps_df.empty:
+    st.info("No unanswerable questions learned yet.")
+else:
+    gaps_df['examples'] = gaps_df['examples'].apply(lambda examples: " | ".join(examples or []))
+    gaps_df['short_circuited'] = gaps_df['failures'] >= config.WORLD_MODEL_MIN_FAILURES
+    st.dataframe(gaps_df.sort_values('failures', ascending=False)[
+        ['collection', 'pattern', 'error_type', 'failures', 'short_circuited', 'last_seen', 'suggestion', 'examples']])
+    st.bar_chart(gaps_df.pivot_table(index='collection', columns='error_type', values='failures',
+                                     aggfunc='sum', fill_value=0))
@@ -30,6 +30,8 @@ else:
     collection = st.selectbox("Collection", ["customers", "accounts", "transactions", "dashboard_metrics", "events"])
     query_text = st.text_area("Your query", height=80, key="query_text_area")
 
+full_documents = st.checkbox("Return full documents", value=False)
+
 # --- Send Query Button ---
 if st.button("Send"):
     if not query_text.strip():
@@ -40,8 +42,15 @@ if st.button("Send"):
             "collection": collection,
             "query_text": query_text
         }
+        if full_documents:
+            payload["projection"] = {}
         try:
-            response = requests.post("http://localhost:8000/query", json=payload, timeout=30)
+            # The server stops working on the query shortly before we stop waiting for it
+            response = requests.post("http://localhost:8000/query", json=payload, timeout=30,
+                                     headers={"X-Request-Deadline-Ms": "28000"})
+            if response.status_code == 429:
+                st.warning(f"The agent is overloaded; retry in {response.headers.get('Retry-After', 'a few')} seconds.")
+                st.stop()
             response.raise_for_status()
             result = response.json()
 
@@ -28,13 +28,21 @@ def demonstrate_database_operations():
         collections = db_manager.get_collections()
         print(f"Available collections: {collections}\n")
         
+        # Extract all schemas in one parallel pass
+        demo_collections = [c for c in ['customers', 'accounts', 'transactions'] if c in collections]
+        extraction = db_manager.extract_schemas(demo_collections, sample_size=20)
+        print(f"Extracted {len(demo_collections)} schemas in {extraction['total_seconds']:.2f}s")
+        for collection, seconds in extraction['timings'].items():
+            print(f"  • {collection}: {seconds:.2f}s")
+        print()
+
         # Demonstrate operations on each collection
-        for collection in ['customers', 'accounts', 'transactions']:
+        for collection in demo_collections:
             if collection in collections:
                 print(f"--- {collection.upper()} Collection ---")
                 
                 # Get schema
-                schema = db_manager.extract_schema(collection, sample_size=20)
+                schema = extraction['schemas'][collection]
                 print(f"Total documents: {schema.get('total_documents', 0)}")
                 
                 # Show field information
@@ -0,0 +1,203 @@
+# scripts/benchmark_compression.py
+"""
+Bytes-versus-latency trade-off of compressing /query results.
+
+For result sets of several sizes (shaped like sample_analytics customers,
+or read from MongoDB with --uri), reports for each HTTP encoding the body
+size, compression and decompression time, and the estimated end-to-end
+time over links of the given bandwidths and round-trip time. With --uri,
+it also times the same find over MongoDB clients using each wire
+compressor.
+
+Example:
+    python scripts/benchmark_compression.py --rows 10 100 1000 10000 --bandwidth-mbps 5 50
+    python scripts/benchmark_compression.py --uri "$MONGODB_URI" --collection customers --rows 100 1000
+"""
+import argparse
+import json
+import random
+import sys
+import os
+import time
+import zlib
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+# Ensure the root directory is in the Python path to find the 'config' module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from config.settings import config
+from src.compression import available_encodings, compress
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+WIRE_COMPRESSORS = ["", "zlib", "zstd", "snappy"]
+
+
+def synthetic_rows(count: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """Documents shaped like sample_analytics.customers after sanitizing."""
+    rng = random.Random(seed)
+    first = ["Ann", "Brian", "Carla", "Derek", "Elena", "Farid", "Grace", "Hugo"]
+    last = ["Lopez", "Smith", "Nguyen", "Okafor", "Schmidt", "Rossi", "Kim", "Haddad"]
+    products = ["Brokerage", "Commodity", "CurrencyService", "Derivatives", "InvestmentFund", "InvestmentStock"]
+    start = datetime(1970, 1, 1)
+    rows = []
+    for i in range(count):
+        name = f"{rng.choice(first)} {rng.choice(last)}"
+        rows.append({
+            "_id": f"{rng.getrandbits(96):024x}",
+            "username": name.lower().replace(" ", "") + str(rng.randint(1, 999)),
+            "name": name,
+            "address": f"{rng.randint(1, 9999)} {rng.choice(last)} Street, Apt. {rng.randint(1, 999)}",
+            "birthdate": (start + timedelta(days=rng.randint(0, 12000))).isoformat(),
+            "email": f"{name.split()[0].lower()}{i}@example.com",
+            "active": rng.random() < 0.8,
+            "accounts": [rng.randint(100000, 999999) for _ in range(rng.randint(1, 6))],
+            "tier_and_details": {
+                f"{rng.getrandbits(64):016x}": {
+                    "tier": rng.choice(["Bronze", "Silver", "Gold", "Platinum"]),
+                    "benefits": rng.sample(["24 hour dedicated line", "concierge services", "dedicated account "
+                                            "representative", "airline lounge access", "car rental insurance"], 2),
+                    "active": True,
+                    "id": f"{rng.getrandbits(64):016x}"
+                } for _ in range(rng.randint(0, 3))
+            }
+        })
+    return rows
+
+
+def _decompress(data: bytes, encoding: str) -> bytes:
+    if encoding == "gzip":
+        return zlib.decompress(data, 31)
+    if encoding == "br":
+        return brotli.decompress(data)
+    return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+
+
+def _best_of(func, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def benchmark_http(rows: List[Dict[str, Any]], bandwidths_mbps: List[float], rtt_ms: float,
+                   repeat: int = 5) -> List[Dict[str, Any]]:
+    """One entry per encoding ("identity" first) for the JSON body of `rows`."""
+    body = json.dumps({"session_id": "benchmark", "data": rows, "execution_time": 0.0}).encode("utf-8")
+    results = []
+    for encoding in ["identity"] + list(available_encodings()):
+        if encoding == "identity":
+            data, compress_time, decompress_time = body, 0.0, 0.0
+        else:
+            data = compress(body, encoding)
+            compress_time = _best_of(lambda: compress(body, encoding), repeat)
+            decompress_time = _best_of(lambda: _decompress(data, encoding), repeat)
+        entry = {
+            "rows": len(rows),
+            "encoding": encoding,
+            "bytes": len(data),
+            "ratio": len(body) / len(data) if data else 1.0,
+            "compress_ms": compress_time * 1000,
+            "decompress_ms": decompress_time * 1000,
+            # Body small enough to skip compression in the middleware?
+            "below_threshold": len(body) < config.HTTP_COMPRESSION_MIN_SIZE,
+        }
+        for mbps in bandwidths_mbps:
+            transfer = len(data) * 8 / (mbps * 1_000_000)
+            entry[f"total_ms@{mbps:g}Mbps"] = (compress_time + transfer + decompress_time) * 1000 + rtt_ms
+        results.append(entry)
+    return results
+
+
+def benchmark_wire(uri: str, database: str, collection: str, limits: List[int],
+                   repeat: int = 3) -> List[Dict[str, Any]]:
+    """Time the same find over clients using each wire compressor pymongo can load."""
+    from pymongo import MongoClient
+    results = []
+    for compressor in WIRE_COMPRESSORS:
+        options = {"compressors": compressor} if compressor else {}
+        client = MongoClient(uri, serverSelectionTimeoutMS=5000, **options)
+        try:
+            negotiated = client.options.pool_options._compression_settings.compressors
+            if compressor and compressor not in negotiated:
+                print(f"⚠ Skipping {compressor}: its library is not installed")
+                continue
+            coll = client[database][collection]
+            coll.find_one()  # Connect and warm the pool
+            for limit in limits:
+                elapsed = _best_of(lambda: list(coll.find({}).limit(limit)), repeat)
+                results.append({"compressor": compressor or "none", "rows": limit, "find_ms": elapsed * 1000})
+        finally:
+            client.close()
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark wire and HTTP compression of query results.")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10, 100, 1000, 10000],
+                        help="Result set sizes to measure")
+    parser.add_argument("--bandwidth-mbps", type=float, nargs="+", default=[5.0, 50.0],
+                        help="Link speeds for the end-to-end estimate (mobile, cross-region)")
+    parser.add_argument("--rtt-ms", type=float, default=80.0, help="Round-trip time added to each estimate")
+    parser.add_argument("--repeat", type=int, default=5, help="Timing repetitions (best is reported)")
+    parser.add_argument("--uri", help="MongoDB URI; read real documents and time wire compressors")
+    parser.add_argument("--database", default=config.DATABASE_NAME)
+    parser.add_argument("--collection", default="customers")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    return parser.parse_args(argv)
+
+
+def _load_rows(args, count: int) -> List[Dict[str, Any]]:
+    if not args.uri:
+        return synthetic_rows(count)
+    from pymongo import MongoClient
+    client = MongoClient(args.uri, serverSelectionTimeoutMS=5000)
+    try:
+        documents = list(client[args.database][args.collection].find({}).limit(count))
+    finally:
+        client.close()
+    return json.loads(json.dumps(documents, default=str))
+
+
+def print_report(http: List[Dict[str, Any]], wire: Optional[List[Dict[str, Any]]]) -> None:
+    print("\n--- HTTP response compression ---")
+    totals = [key for key in http[0] if key.startswith("total_ms@")]
+    print(f"{'rows':>6} {'encoding':>9} {'bytes':>10} {'ratio':>6} {'comp ms':>8} {'decomp ms':>9} "
+          + " ".join(f"{key[9:]:>12}" for key in totals))
+    for entry in http:
+        marker = "*" if entry["below_threshold"] else " "
+        print(f"{entry['rows']:>6} {entry['encoding']:>9} {entry['bytes']:>10}{marker}{entry['ratio']:>6.1f} "
+              f"{entry['compress_ms']:>8.2f} {entry['decompress_ms']:>9.2f} "
+              + " ".join(f"{entry[key]:>12.1f}" for key in totals))
+    print(f"* below HTTP_COMPRESSION_MIN_SIZE ({config.HTTP_COMPRESSION_MIN_SIZE} bytes): sent uncompressed")
+    if wire:
+        print("\n--- MongoDB wire compression ---")
+        for entry in wire:
+            print(f"{entry['compressor']:>8} {entry['rows']:>6} rows  {entry['find_ms']:>8.1f} ms")
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    http = []
+    for count in args.rows:
+        http.extend(benchmark_http(_load_rows(args, count), args.bandwidth_mbps, args.rtt_ms, args.repeat))
+    wire = benchmark_wire(args.uri, args.database, args.collection, args.rows) if args.uri else None
+    if args.json:
+        print(json.dumps({"http": http, "wire": wire}, indent=2))
+    else:
+        print_report(http, wire)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
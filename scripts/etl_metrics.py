@@ -1,7 +1,6 @@
 # scripts/etl_metrics.py
 from dotenv import load_dotenv
 import pandas as pd
-from pymongo import MongoClient
 from datetime import datetime, timedelta
 import sys
 import os
@@ -10,13 +9,14 @@ import numpy as np
 # Ensure the root directory is in the Python path to find the 'config' module
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from config.settings import config
+from src.mongo_clients import client_registry
 
 # Load environment variables from .env file
 load_dotenv()
 
 # --- Database Connection ---
 try:
-    client = MongoClient(config.MONGODB_URI, serverSelectionTimeoutMS=5000)
+    client = client_registry.get_client(config.MONGODB_URI, "etl")
     client.admin.command('ismaster')
     db = client[config.DATABASE_NAME]
     events = db.events
@@ -31,7 +31,11 @@ except Exception as e:
 # Load events from the last 24 hours
 print("\nFetching events from the last 24 hours...")
 yesterday = datetime.utcnow() - timedelta(days=1)
-events_cursor = events.find({"timestamp": {"$gte": yesterday}})
+events_cursor = events.find(
+    {"timestamp": {"$gte": yesterday}},
+    # Only the fields the metrics use; result digests and texts stay on the server
+    {"_id": 0, "type": 1, "intent": 1, "execution_time": 1, "response_success": 1}
+)
 df = pd.DataFrame(list(events_cursor))
 
 if df.empty:
@@ -0,0 +1,288 @@
+# scripts/replay_traffic.py
+"""
+Replay recorded user questions from the `events` log against a running API.
+
+Every `user_message` event in the chosen time window is re-sent to `/query`
+at its original relative offset (optionally compressed in time), so capacity
+planning uses the real query mix instead of synthetic loops.
+
+Example:
+    python scripts/replay_traffic.py --hours 6 --speedup 10 --concurrency 16
+"""
+from dotenv import load_dotenv
+import argparse
+import heapq
+import itertools
+import json
+import math
+import sys
+import os
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Tuple
+
+import requests
+
+# Ensure the root directory is in the Python path to find the 'config' module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from config.settings import config
+from src.mongo_clients import client_registry
+
+load_dotenv()
+
+DEFAULT_API_URL = os.getenv("AGENT_API_URL", "http://localhost:8000/query")
+DEFAULT_COLLECTION = "customers"
+
+
+def load_user_messages(db, start: datetime, end: datetime, limit: int = 0) -> List[Dict[str, Any]]:
+    """Fetch the recorded user questions in [start, end), oldest first."""
+    cursor = db.events.find(
+        {"type": "user_message", "timestamp": {"$gte": start, "$lt": end}},
+        {"_id": 0, "text": 1, "session_id": 1, "timestamp": 1, "collection": 1}
+    ).sort("timestamp", 1)
+    if limit > 0:
+        cursor = cursor.limit(limit)
+    return [event for event in cursor if event.get("text")]
+
+
+def build_schedule(events: List[Dict[str, Any]], speedup: float = 1.0,
+                   default_collection: str = DEFAULT_COLLECTION) -> List[Dict[str, Any]]:
+    """
+    Turn recorded events into replay items with send offsets (seconds from
+    replay start), compressed by `speedup`.
+    """
+    if speedup <= 0:
+        raise ValueError("speedup must be positive")
+    if not events:
+        return []
+
+    origin = events[0]["timestamp"]
+    schedule = []
+    for event in events:
+        offset = (event["timestamp"] - origin).total_seconds() / speedup
+        schedule.append({
+            "offset": max(offset, 0.0),
+            "session_id": event.get("session_id"),
+            # Events recorded before the collection was logged fall back to the default
+            "collection": event.get("collection") or default_collection,
+            "query_text": event["text"]
+        })
+    return schedule
+
+
+def group_by_session(schedule: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    """Group replay items by recorded session, keeping each session's order."""
+    sessions: Dict[Any, List[Dict[str, Any]]] = {}
+    for item in schedule:
+        sessions.setdefault(item["session_id"], []).append(item)
+    return sorted(sessions.values(), key=lambda items: items[0]["offset"])
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(pct / 100.0 * len(sorted_values)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+class ReplayStats:
+    """Thread-safe collector for per-request latency and outcome."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies: List[float] = []
+        self.outcomes = Counter()
+        self.max_lag = 0.0
+
+    def record(self, latency: float, outcome: str, lag: float = 0.0) -> None:
+        with self._lock:
+            self.latencies.append(latency)
+            self.outcomes[outcome] += 1
+            self.max_lag = max(self.max_lag, lag)
+
+    def summary(self, wall_time: float) -> Dict[str, Any]:
+        with self._lock:
+            latencies = sorted(self.latencies)
+            outcomes = dict(self.outcomes)
+            max_lag = self.max_lag
+        total = len(latencies)
+        errors = total - outcomes.get("ok", 0)
+        return {
+            "requests": total,
+            "errors": errors,
+            "error_rate": errors / total if total else 0.0,
+            "outcomes": outcomes,
+            "latency_seconds": {
+                "mean": sum(latencies) / total if total else 0.0,
+                "p50": percentile(latencies, 50),
+                "p90": percentile(latencies, 90),
+                "p95": percentile(latencies, 95),
+                "p99": percentile(latencies, 99),
+                "max": latencies[-1] if latencies else 0.0
+            },
+            "wall_time_seconds": wall_time,
+            "throughput_rps": total / wall_time if wall_time > 0 else 0.0,
+            "max_schedule_lag_seconds": max_lag
+        }
+
+
+class TrafficReplayer:
+    """
+    Sends replay items to the API on schedule. A dispatcher releases each
+    turn to a bounded worker pool when it falls due, so the pool caps
+    in-flight requests rather than sessions; a session's next turn is only
+    scheduled once its previous reply is back.
+    """
+
+    def __init__(self, api_url: str, concurrency: int = 8, timeout: float = 30.0,
+                 session_affinity: bool = True):
+        self.api_url = api_url
+        self.concurrency = max(concurrency, 1)
+        self.timeout = timeout
+        self.session_affinity = session_affinity
+        self.stats = ReplayStats()
+        self._local = threading.local()
+        self._start = 0.0
+        self._due: List[Tuple[float, int, List[Dict[str, Any]], int, str]] = []
+        self._sequence = itertools.count()
+        self._open_sessions = 0
+        self._wakeup = threading.Condition()
+
+    def _http(self) -> requests.Session:
+        # One keep-alive session per worker thread
+        if not hasattr(self._local, "session"):
+            self._local.session = requests.Session()
+        return self._local.session
+
+    def _schedule(self, items: List[Dict[str, Any]], index: int, api_session_id: str) -> None:
+        """Queue turn `index` of a session for its recorded offset. Caller holds `_wakeup`."""
+        heapq.heappush(self._due, (items[index]["offset"], next(self._sequence), items, index, api_session_id))
+        self._wakeup.notify()
+
+    def _send(self, item: Dict[str, Any], api_session_id: str) -> None:
+        lag = max(time.monotonic() - self._start - item["offset"], 0.0)
+        payload = {"collection": item["collection"], "query_text": item["query_text"],
+                   "session_id": api_session_id}
+
+        started = time.perf_counter()
+        try:
+            response = self._http().post(self.api_url, json=payload, timeout=self.timeout)
+            latency = time.perf_counter() - started
+            if response.status_code != 200:
+                self.stats.record(latency, f"http_{response.status_code}", lag)
+                return
+            body = response.json()
+            outcome = body.get("error_type") or ("error" if body.get("error") else "ok")
+            self.stats.record(latency, outcome, lag)
+        except requests.exceptions.Timeout:
+            self.stats.record(time.perf_counter() - started, "client_timeout", lag)
+        except requests.exceptions.RequestException:
+            self.stats.record(time.perf_counter() - started, "connection_error", lag)
+
+    def _turn(self, items: List[Dict[str, Any]], index: int, api_session_id: str) -> None:
+        try:
+            self._send(items[index], api_session_id)
+        finally:
+            with self._wakeup:
+                if index + 1 < len(items):
+                    self._schedule(items, index + 1, api_session_id)
+                else:
+                    self._open_sessions -= 1
+                    self._wakeup.notify()
+
+    def run(self, schedule: List[Dict[str, Any]]) -> Dict[str, Any]:
+        # Session affinity: one recorded session maps to one fresh API session, in order.
+        # Without it every question is its own session.
+        units = group_by_session(schedule) if self.session_affinity else [[item] for item in schedule]
+        self._start = time.monotonic()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor, self._wakeup:
+            self._open_sessions = len(units)
+            for items in units:
+                self._schedule(items, 0, str(uuid.uuid4()))
+            while self._open_sessions:
+                delay = self._due[0][0] - (time.monotonic() - self._start) if self._due else None
+                if delay is None or delay > 0:
+                    self._wakeup.wait(delay)
+                    continue
+                _, _, items, index, api_session_id = heapq.heappop(self._due)
+                executor.submit(self._turn, items, index, api_session_id)
+        return self.stats.summary(time.monotonic() - self._start)
+
+
+def _parse_time(value: str) -> datetime:
+    return datetime.fromisoformat(value)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Replay recorded user questions against the query API.")
+    parser.add_argument("--api-url", default=DEFAULT_API_URL, help="Query endpoint to replay against")
+    parser.add_argument("--start", type=_parse_time, help="Window start (ISO, UTC)")
+    parser.add_argument("--end", type=_parse_time, help="Window end (ISO, UTC); defaults to now")
+    parser.add_argument("--hours", type=float, default=24.0, help="Window length when --start is omitted")
+    parser.add_argument("--speedup", type=float, default=1.0, help="Time compression factor (10 = 10x faster)")
+    parser.add_argument("--concurrency", type=int, default=8, help="Maximum in-flight requests")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Per-request timeout in seconds")
+    parser.add_argument("--no-session-affinity", action="store_true",
+                        help="Send every question independently instead of replaying sessions in order")
+    parser.add_argument("--limit", type=int, default=0, help="Replay at most this many events")
+    parser.add_argument("--default-collection", default=DEFAULT_COLLECTION,
+                        help="Collection for events recorded without one")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    return parser.parse_args(argv)
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    latency = report["latency_seconds"]
+    print("\n--- Replay Report ---")
+    print(f"Requests: {report['requests']}  Errors: {report['errors']} ({report['error_rate']:.1%})")
+    print(f"Throughput: {report['throughput_rps']:.2f} req/s over {report['wall_time_seconds']:.1f}s")
+    print(f"Latency mean={latency['mean']:.3f}s p50={latency['p50']:.3f}s p90={latency['p90']:.3f}s "
+          f"p95={latency['p95']:.3f}s p99={latency['p99']:.3f}s max={latency['max']:.3f}s")
+    print(f"Max schedule lag: {report['max_schedule_lag_seconds']:.3f}s")
+    print(f"Outcomes: {report['outcomes']}")
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    end = args.end or datetime.utcnow()
+    start = args.start or end - timedelta(hours=args.hours)
+
+    try:
+        client = client_registry.get_client(config.MONGODB_URI, "analytics")
+        client.admin.command('ping')
+        db = client[config.ANALYTICS_DB]
+    except Exception as e:
+        print(f"✗ Failed to connect to MongoDB: {e}")
+        return 1
+
+    events = load_user_messages(db, start, end, args.limit)
+    if not events:
+        print(f"No user messages found between {start.isoformat()} and {end.isoformat()}.")
+        return 0
+
+    schedule = build_schedule(events, args.speedup, args.default_collection)
+    print(f"Replaying {len(schedule)} questions from {start.isoformat()} to {end.isoformat()} "
+          f"at {args.speedup}x with concurrency {args.concurrency}...")
+
+    replayer = TrafficReplayer(
+        args.api_url,
+        concurrency=args.concurrency,
+        timeout=args.timeout,
+        session_affinity=not args.no_session_affinity
+    )
+    report = replayer.run(schedule)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,213 @@
+# src/admission.py
+import contextvars
+import copy
+import heapq
+import itertools
+import math
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Any, Iterator, Optional
+from config.settings import config
+from src.value_dictionary import normalize_tokens
+
+# Lower rank is served first
+PRIORITIES = {"interactive": 0, "batch": 1}
+
+_priority: contextvars.ContextVar[str] = contextvars.ContextVar("request_priority", default="interactive")
+
+
+def current_priority() -> str:
+    return _priority.get()
+
+
+@contextmanager
+def priority_scope(priority: str) -> Iterator[str]:
+    """Make `priority` the admission class for LLM calls made in this context."""
+    token = _priority.set(priority)
+    try:
+        yield priority
+    finally:
+        _priority.reset(token)
+
+
+class Overloaded(Exception):
+    """LLM work was shed; the caller should retry after `retry_after` seconds."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = max(int(math.ceil(retry_after)), 1)
+
+
+class AdmissionController:
+    """
+    Bounded concurrency for LLM calls with a priority queue in front.
+
+    At most `max_concurrent` calls run at once; the rest wait, interactive
+    before batch. A caller is turned away immediately when the queue is
+    full or when the wait expected from its queue position (at the recent
+    average call time) exceeds what it can afford: the per-class
+    `max_wait`, or what is left of its request deadline.
+    """
+
+    def __init__(self, max_concurrent: Optional[int] = None, max_queue: Optional[int] = None,
+                 max_wait: Optional[Dict[str, float]] = None):
+        self.max_concurrent = max(max_concurrent or config.ADMISSION_MAX_CONCURRENT, 1)
+        self.max_queue = config.ADMISSION_MAX_QUEUE if max_queue is None else max_queue
+        self.max_wait = dict(config.ADMISSION_MAX_QUEUE_WAIT if max_wait is None else max_wait)
+        self.service_time = config.ADMISSION_INITIAL_SERVICE_TIME  # Moving average of call duration
+        self._lock = threading.Lock()
+        self._active = 0
+        self._waiting = []  # Heap of [rank, sequence, granted event]
+        self._sequence = itertools.count()
+        self.admitted = 0
+        self.shed = 0
+
+    def expected_wait(self, ahead: int) -> float:
+        return (ahead + 1) / self.max_concurrent * self.service_time
+
+    def _budget(self, priority: str, deadline) -> float:
+        budget = self.max_wait.get(priority, max(self.max_wait.values()))
+        if deadline is not None:
+            budget = min(budget, deadline.remaining())
+        return budget
+
+    def _acquire(self, priority: str, deadline) -> None:
+        rank = PRIORITIES.get(priority, max(PRIORITIES.values()))
+        budget = self._budget(priority, deadline)
+        with self._lock:
+            if self._active < self.max_concurrent and not self._waiting:
+                self._active += 1
+                self.admitted += 1
+                return
+            ahead = sum(1 for entry in self._waiting if entry[0] <= rank)
+            wait = self.expected_wait(ahead)
+            if len(self._waiting) >= self.max_queue or wait > budget:
+                self.shed += 1
+                raise Overloaded(f"LLM queue is full (expected wait {wait:.1f}s)", wait)
+            entry = [rank, next(self._sequence), threading.Event()]
+            heapq.heappush(self._waiting, entry)
+        entry[2].wait(budget)
+        with self._lock:
+            if entry[2].is_set():
+                return  # A finishing call handed its slot over
+            self._waiting.remove(entry)
+            heapq.heapify(self._waiting)
+            self.shed += 1
+            wait = self.expected_wait(len(self._waiting))
+        raise Overloaded(f"Waited {budget:.1f}s for an LLM slot", wait)
+
+    def _release(self, duration: float) -> None:
+        with self._lock:
+            self.service_time = 0.8 * self.service_time + 0.2 * duration
+            if self._waiting:
+                heapq.heappop(self._waiting)[2].set()
+                self.admitted += 1
+            else:
+                self._active -= 1
+
+    @contextmanager
+    def slot(self, priority: Optional[str] = None, deadline=None) -> Iterator[None]:
+        """Hold one LLM slot; raises Overloaded if the caller is shed."""
+        self._acquire(priority or current_priority(), deadline)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self._release(time.monotonic() - started)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"active": self._active, "queued": len(self._waiting), "admitted": self.admitted,
+                    "shed": self.shed, "avg_call_seconds": round(self.service_time, 3)}
+
+
+class CircuitBreaker:
+    """
+    Stops calling the LLM provider after `failure_threshold` consecutive
+    failures. After `reset_timeout` seconds one probe call is let through:
+    success closes the circuit, failure keeps it open for another period,
+    and a probe that ends without an outcome (shed, past its deadline,
+    cancelled) hands the probe to the next caller.
+    """
+
+    def __init__(self, failure_threshold: Optional[int] = None, reset_timeout: Optional[float] = None):
+        self.failure_threshold = failure_threshold or config.BREAKER_FAILURE_THRESHOLD
+        self.reset_timeout = config.BREAKER_RESET_TIMEOUT if reset_timeout is None else reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = "half_open"
+            if self.state == "half_open" and not self._probing:
+                self._probing = True
+                return True
+            return self.state == "closed"
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state, self.failures, self._probing = "closed", 0, False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                self.state, self.opened_at, self._probing = "open", time.monotonic(), False
+
+    def record_abandoned(self) -> None:
+        """The call allowed last never reached the provider or was cut short; it says nothing about its health."""
+        with self._lock:
+            self._probing = False
+
+    def retry_after(self) -> float:
+        with self._lock:
+            return max(self.reset_timeout - (time.monotonic() - self.opened_at), 1.0)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"state": self.state, "consecutive_failures": self.failures}
+
+
+class RecentIntents:
+    """
+    LRU of intents the LLM produced for stand-alone questions, keyed by
+    collection and normalized wording. Only consulted when the LLM cannot
+    be called, so a repeated question still gets an answer.
+    """
+
+    def __init__(self, max_size: Optional[int] = None):
+        self.max_size = max_size or config.RECENT_INTENTS_SIZE
+        self._intents: "OrderedDict[tuple, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(collection_name: str, user_text: str) -> tuple:
+        return collection_name, " ".join(normalize_tokens(user_text))
+
+    def remember(self, collection_name: str, user_text: str, intent: Dict[str, Any]) -> None:
+        key = self._key(collection_name, user_text)
+        with self._lock:
+            self._intents[key] = copy.deepcopy(intent)
+            self._intents.move_to_end(key)
+            while len(self._intents) > self.max_size:
+                self._intents.popitem(last=False)
+
+    def get(self, collection_name: str, user_text: str) -> Optional[Dict[str, Any]]:
+        key = self._key(collection_name, user_text)
+        with self._lock:
+            intent = self._intents.get(key)
+            if intent is None:
+                return None
+            self._intents.move_to_end(key)
+            return dict(copy.deepcopy(intent), resolved_by="recent_intent")
+
+
+llm_admission = AdmissionController()
+llm_breaker = CircuitBreaker()
+recent_intents = RecentIntents()
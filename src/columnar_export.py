@@ -0,0 +1,212 @@
+# src/columnar_export.py
+import itertools
+import json
+import logging
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Any, Callable, Iterable, Iterator, List, Optional
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+from config.settings import config
+
+logger = logging.getLogger(__name__)
+
+MEDIA_TYPES = {
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet",
+    "csv": "text/csv",
+}
+
+# Schema profiler type names (type(value).__name__) with a direct Arrow type
+_SCALAR_TYPES = {
+    "int": pa.int64(),
+    "float": pa.float64(),
+    "bool": pa.bool_(),
+    "str": pa.string(),
+    "datetime": pa.timestamp("ms"),
+    "ObjectId": pa.string(),
+    "Decimal128": pa.string(),
+}
+
+
+def arrow_type(type_names: Iterable[str], element_types: Optional[Iterable[str]] = None,
+               nested: bool = True) -> pa.DataType:
+    """
+    Arrow type for a field seen with the given Python type names. Mixed
+    numbers widen to float64; lists of one scalar type become list columns
+    (when `nested`); anything else is carried as a JSON string.
+    """
+    names = set(type_names) - {"NoneType"}
+    if names == {"int", "float"}:
+        return pa.float64()
+    if len(names) == 1:
+        name = names.pop()
+        if name in _SCALAR_TYPES:
+            return _SCALAR_TYPES[name]
+        if name == "list" and nested and element_types is not None:
+            element = arrow_type(element_types, nested=False)
+            if not pa.types.is_string(element) or set(element_types) - {"NoneType"} == {"str"}:
+                return pa.list_(element)
+    return pa.string()
+
+
+def _observed_types(rows: List[Dict[str, Any]]) -> Dict[str, Dict[str, set]]:
+    observed: Dict[str, Dict[str, set]] = {}
+    for row in rows:
+        for key, value in row.items():
+            entry = observed.setdefault(key, {"type": set(), "elements": set()})
+            entry["type"].add(type(value).__name__)
+            if isinstance(value, list):
+                entry["elements"].update(type(element).__name__ for element in value)
+    return observed
+
+
+def infer_schema(schema: Dict[str, Any], first_rows: List[Dict[str, Any]],
+                 projection: Optional[Dict[str, Any]] = None, nested: bool = True) -> pa.Schema:
+    """
+    Arrow schema for an export. Top-level fields of the extracted collection
+    `schema` come first (only those a projection includes), typed from the
+    types seen while sampling; fields that only appear in `first_rows`, such
+    as aggregation outputs, are typed from those rows. Columns are fixed
+    here, so fields first seen in later batches are not exported.
+    """
+    fields = schema.get("fields", {}) if isinstance(schema, dict) else {}
+    included = None
+    if projection:
+        included = {name.split(".")[0] for name, value in projection.items() if value and name != "_id"}
+        if projection.get("_id", 1):
+            included.add("_id")
+    observed = _observed_types(first_rows)
+    columns: Dict[str, pa.DataType] = {}
+    for name, info in fields.items():
+        if "." in name or name.endswith("[]") or (included is not None and name not in included):
+            continue
+        element_info = fields.get(f"{name}[]", {})
+        types = set(info.get("type", []))
+        if name in observed:
+            types |= observed[name]["type"]  # Sampled schemas miss rare types; widen with what is here
+        columns[name] = arrow_type(types, element_info.get("type"), nested)
+    for name, entry in observed.items():
+        if name not in columns:
+            columns[name] = arrow_type(entry["type"], entry["elements"], nested)
+    return pa.schema(list(columns.items()))
+
+
+def _converter(data_type: pa.DataType) -> Callable[[Any], Any]:
+    """Per-value conversion into `data_type`; values that do not fit become null."""
+    if pa.types.is_int64(data_type):
+        def to_int(v):
+            if isinstance(v, int) and not isinstance(v, bool):
+                return v
+            return int(v) if isinstance(v, float) and v.is_integer() else None
+        return to_int
+    if pa.types.is_float64(data_type):
+        return lambda v: float(v) if isinstance(v, (int, float)) and not isinstance(v, bool) else None
+    if pa.types.is_boolean(data_type):
+        return lambda v: v if isinstance(v, bool) else None
+    if pa.types.is_timestamp(data_type):
+        return lambda v: v if isinstance(v, datetime) else None
+    if pa.types.is_list(data_type):
+        element = _converter(data_type.value_type)
+        return lambda v: [element(e) for e in v] if isinstance(v, list) else None
+
+    def to_string(v):
+        if v is None or isinstance(v, str):
+            return v
+        if isinstance(v, (dict, list)):
+            return json.dumps(v, default=str)
+        return str(v)
+    return to_string
+
+
+def to_record_batch(rows: List[Dict[str, Any]], schema: pa.Schema,
+                    coerced: Optional[Counter] = None) -> pa.RecordBatch:
+    """Record batch of `rows`; values that do not fit their column are nulled and counted per column in `coerced`."""
+    columns = []
+    for field in schema:
+        convert = _converter(field.type)
+        values = []
+        for row in rows:
+            value = row.get(field.name)
+            converted = convert(value)
+            if converted is None and value is not None and coerced is not None:
+                coerced[field.name] += 1
+            values.append(converted)
+        columns.append(pa.array(values, type=field.type))
+    return pa.RecordBatch.from_arrays(columns, schema=schema)
+
+
+class _ChunkSink:
+    """Write-only file object whose contents are drained after each batch."""
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def _writer(fmt: str, sink: _ChunkSink, schema: pa.Schema):
+    if fmt == "arrow":
+        return pa.ipc.new_stream(sink, schema)
+    if fmt == "parquet":
+        return pq.ParquetWriter(sink, schema, compression=config.EXPORT_PARQUET_COMPRESSION)
+    if fmt == "csv":
+        return pa_csv.CSVWriter(sink, schema)
+    raise ValueError(f"Unknown export format: {fmt}")
+
+
+def stream_export(batches: Iterable[List[Dict[str, Any]]], fmt: str,
+                  collection_schema: Optional[Dict[str, Any]] = None,
+                  projection: Optional[Dict[str, Any]] = None,
+                  coerced: Optional[Counter] = None) -> Iterator[bytes]:
+    """
+    Encode batches of documents as an Arrow IPC stream, Parquet file (one
+    row group per batch) or CSV, yielding bytes as each batch is written.
+    The Arrow schema comes from the collection schema and the first batch,
+    so an int column that also holds floats there is float64 and mixed types
+    are strings; only one batch is held at a time. A later value that does
+    not fit its column is nulled (integral floats still fill int columns),
+    counted per column in `coerced` and logged. CSV cannot hold list
+    columns, so lists are JSON strings there.
+    """
+    if fmt not in MEDIA_TYPES:
+        raise ValueError(f"Unknown export format: {fmt}")
+    coerced = Counter() if coerced is None else coerced
+    batches = iter(batches)
+    first = next(batches, [])
+    schema = infer_schema(collection_schema or {}, first, projection, nested=fmt != "csv")
+    sink = _ChunkSink()
+    writer = _writer(fmt, sink, schema)
+    try:
+        for rows in itertools.chain([first], batches):
+            if rows:
+                writer.write_batch(to_record_batch(rows, schema, coerced))
+                yield sink.drain()
+    finally:
+        writer.close()
+        if coerced:
+            logger.warning(f"Export nulled values that did not fit their column type: {dict(coerced)}",
+                           extra={"format": fmt})
+    yield sink.drain()
+
@@ -0,0 +1,174 @@
+# src/compression.py
+import zlib
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from config.settings import config
+
+try:
+    import zstandard
+except ImportError:  # Optional: zstd is offered only when installed
+    zstandard = None
+
+try:
+    import brotli
+except ImportError:  # Optional: br is offered only when installed
+    brotli = None
+
+
+class _Compressor:
+    """Incremental compressor: `compress(chunk)` then one `flush()`."""
+
+    def __init__(self, compress: Callable[[bytes], bytes], flush: Callable[[], bytes]):
+        self.compress = compress
+        self.flush = flush
+
+
+def _gzip(level: int) -> _Compressor:
+    stream = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits 31: gzip container
+    return _Compressor(stream.compress, stream.flush)
+
+
+def _brotli(level: int) -> _Compressor:
+    stream = brotli.Compressor(quality=level)
+    return _Compressor(stream.process, stream.finish)
+
+
+def _zstd(level: int) -> _Compressor:
+    stream = zstandard.ZstdCompressor(level=level).compressobj()
+    return _Compressor(stream.compress, stream.flush)
+
+
+def available_encodings() -> Dict[str, Callable[[int], _Compressor]]:
+    encodings = {"gzip": _gzip}
+    if brotli is not None:
+        encodings["br"] = _brotli
+    if zstandard is not None:
+        encodings["zstd"] = _zstd
+    return encodings
+
+
+def compress(body: bytes, encoding: str, level: Optional[int] = None) -> bytes:
+    """Whole-body compression with the same settings the middleware uses."""
+    compressor = available_encodings()[encoding](config.HTTP_COMPRESSION_LEVELS[encoding] if level is None else level)
+    return compressor.compress(body) + compressor.flush()
+
+
+def negotiate(accept_encoding: str, preference: Sequence[str]) -> Optional[str]:
+    """
+    The encoding to use for an Accept-Encoding header: highest q-value among
+    those in `preference`, ties broken by `preference` order; None for identity.
+    """
+    weights: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name] = q
+    best, best_q = None, 0.0
+    for encoding in preference:
+        q = weights.get(encoding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware compressing responses under `paths` with the encoding
+    the client prefers among `encodings` (zstd, br, gzip; br and zstd only
+    when their libraries are installed). Complete bodies smaller than
+    `minimum_size` go out uncompressed; streamed bodies are compressed
+    chunk by chunk. Responses that already have a Content-Encoding, or a
+    content type in `skip_types` (formats compressed internally), are left
+    alone.
+    """
+
+    def __init__(self, app, paths: Optional[Sequence[str]] = None, minimum_size: Optional[int] = None,
+                 encodings: Optional[Sequence[str]] = None, levels: Optional[Dict[str, int]] = None,
+                 skip_types: Optional[Sequence[str]] = None):
+        self.app = app
+        self.paths = tuple(config.HTTP_COMPRESSION_PATHS if paths is None else paths)
+        self.minimum_size = config.HTTP_COMPRESSION_MIN_SIZE if minimum_size is None else minimum_size
+        installed = available_encodings()
+        self.factories = {name: installed[name] for name in (encodings or config.HTTP_COMPRESSION_ENCODINGS)
+                          if name in installed}
+        self.levels = dict(config.HTTP_COMPRESSION_LEVELS, **(levels or {}))
+        self.skip_types = tuple(t.encode("latin-1") for t in
+                                (config.HTTP_COMPRESSION_SKIP_TYPES if skip_types is None else skip_types))
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.paths):
+            await self.app(scope, receive, send)
+            return
+        accept = next((value.decode("latin-1") for key, value in scope["headers"] if key == b"accept-encoding"), "")
+        encoding = negotiate(accept, list(self.factories))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        await _CompressedResponse(self, encoding, send).run(self.app, scope, receive)
+
+
+class _CompressedResponse:
+    def __init__(self, middleware: CompressionMiddleware, encoding: str, send):
+        self.middleware = middleware
+        self.encoding = encoding
+        self.send = send
+        self.start: Optional[dict] = None
+        self.compressor: Optional[_Compressor] = None
+        self.passthrough = False
+
+    async def run(self, app, scope, receive) -> None:
+        await app(scope, receive, self.on_send)
+
+    def _headers(self, compressed_length: Optional[int]) -> List[Tuple[bytes, bytes]]:
+        headers = [(key, value) for key, value in self.start["headers"]
+                   if key.lower() not in (b"content-length", b"vary")]
+        vary = [value for key, value in self.start["headers"] if key.lower() == b"vary"]
+        headers.append((b"content-encoding", self.encoding.encode("latin-1")))
+        headers.append((b"vary", b", ".join(vary + [b"Accept-Encoding"])))
+        if compressed_length is not None:
+            headers.append((b"content-length", str(compressed_length).encode("latin-1")))
+        return headers
+
+    async def on_send(self, message: dict) -> None:
+        if message["type"] == "http.response.start":
+            headers = message.get("headers", [])
+            if any(key.lower() == b"content-encoding" or
+                   (key.lower() == b"content-type" and value.startswith(self.middleware.skip_types))
+                   for key, value in headers):
+                self.passthrough = True
+                await self.send(message)
+            else:
+                self.start = message  # Sent once the first body chunk decides the headers
+            return
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.compressor is None:
+            if not more_body and len(body) < self.middleware.minimum_size:
+                self.passthrough = True
+                await self.send(self.start)
+                self.start = None
+                await self.send(message)
+                return
+            self.compressor = self.middleware.factories[self.encoding](self.middleware.levels[self.encoding])
+            if not more_body:
+                data = self.compressor.compress(body) + self.compressor.flush()
+                await self.send(dict(self.start, headers=self._headers(len(data))))
+                await self.send({"type": "http.response.body", "body": data})
+                return
+            await self.send(dict(self.start, headers=self._headers(None)))
+        data = self.compressor.compress(body)
+        if not more_body:
+            data += self.compressor.flush()
+        await self.send({"type": "http.response.body", "body": data, "more_body": more_body})
@@ -1,8 +1,9 @@
 from dotenv import load_dotenv
-from langchain.memory import ConversationBufferMemory
 from datetime import datetime
-from pymongo import MongoClient
+from typing import Any, List, Optional
 from config.settings import config
+from src.mongo_clients import client_registry
+from src.result_digest import ResultPayloadStore, digest_results
 import uuid
 import logging
 load_dotenv()
@@ -13,6 +14,8 @@ class ConversationManager:
     and logging events to the analytics database.
     """
     def __init__(self, memory_key: str = "history"):
+        # Imported here so the API can start serving before langchain loads
+        from langchain.memory import ConversationBufferMemory
         self.memory = ConversationBufferMemory(
             memory_key=memory_key,
             return_messages=True
@@ -25,31 +28,59 @@ class ConversationManager:
         # Priority: ANALYTICS_DB (if set) → DATABASE_NAME
         db_name = config.ANALYTICS_DB  # Use the new ANALYTICS_DB value
         self.logger.info(f"Using analytics database: {db_name}")
-        self.analytics_db = MongoClient(config.MONGODB_URI)[db_name]
+        self.analytics_db = client_registry.get_client(config.MONGODB_URI, "analytics")[db_name]
+        self.payloads = (ResultPayloadStore(self.analytics_db[config.ANALYTICS_PAYLOADS_COLLECTION])
+                         if config.ANALYTICS_STORE_FULL_PAYLOADS else None)
 
-    def add_user_message_to_analytics(self, text: str) -> None:
+    def add_user_message_to_analytics(self, text: str, collection: Optional[str] = None,
+                                      session_id: Optional[str] = None) -> None:
         """Adds only the user message to the analytics database."""
         self.logger.debug(f"Logging user message to analytics: {text}")
         event = {
             "timestamp": datetime.utcnow(),
             "type": "user_message",
             "text": text,
-            "session_id": self.session_id
+            "session_id": session_id or self.session_id
         }
+        if collection:
+            # Recorded so scripts/replay_traffic.py can replay the real query mix
+            event["collection"] = collection
         self.analytics_db.events.insert_one(event)
 
-    def add_ai_message_to_analytics(self, text: str, intent: dict, success_flag: bool, exec_time: float) -> None:
-        """Adds only the AI message and its metadata to the analytics database."""
+    def add_ai_message_to_analytics(self, text: str, intent: dict, success_flag: bool, exec_time: float,
+                                    session_id: Optional[str] = None, collection: Optional[str] = None,
+                                    results: Optional[List[Any]] = None, question: Optional[str] = None) -> None:
+        """
+        Adds only the AI message and its metadata to the analytics database.
+        `results` are stored as a digest (count, size, hash, leading rows);
+        the full set goes to the payload store when that is enabled.
+        `question` is the user text this message answers.
+        """
         self.logger.debug(f"Logging AI message to analytics: {text}")
         event = {
             "timestamp": datetime.utcnow(),
             "type": "ai_response",
             "text": text,
-            "session_id": self.session_id,
+            "session_id": session_id or self.session_id,
             "intent": intent,
             "response_success": success_flag,
             "execution_time": exec_time
         }
+        if collection:
+            # Lets src/materializer.py find hot intents per collection
+            event["collection"] = collection
+        if question is not None:
+            # Sessions interleave turns, so src/world_model.py cannot pair messages by order
+            event["question"] = question
+        if results is not None:
+            event["result"] = digest_results(results)
+            if self.payloads is not None:
+                try:
+                    payload_id = self.payloads.save(results, event["result"]["hash"])
+                    if payload_id is not None:
+                        event["result"]["payload_id"] = payload_id
+                except Exception as e:
+                    self.logger.warning(f"Could not store result payload: {str(e)}")
         self.analytics_db.events.insert_one(event)
 
     def save_interaction_to_memory(self, user_input: str, ai_output: str) -> None:
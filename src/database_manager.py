@@ -1,12 +1,21 @@
 # src/database_manager.py
 from dotenv import load_dotenv
 import pymongo
-from typing import Dict, List, Any
+from pymongo.errors import ExecutionTimeout
+from typing import Dict, List, Any, Optional, Callable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+import time
 import logging
 from datetime import datetime
 load_dotenv()
 from bson import ObjectId
 import json
+import copy
+from config.settings import config
+from src.mongo_clients import client_registry
+from src.schema_profiler import SchemaProfiler
+from src.query_optimizer import count_rows, optimize_intent
+from src.deadline import DeadlineExceeded, max_time_kwargs
 
 class DatabaseManager:
     """
@@ -22,7 +31,13 @@ class DatabaseManager:
         self.database_name = database_name
         self.client = None
         self.db = None
+        # Same database through the "sampling" client, which prefers secondaries
+        self.sampling_db = None
         self.collections_info = {}
+        # Optional src.materializer.Materializer serving hot count/aggregate intents
+        self.materializer = None
+        # Optional src.derived_fields.DerivedFieldManager rewriting filters onto indexed fields
+        self.derived_fields = None
         self.logger = logging.getLogger(__name__)
         
     def connect(self) -> bool:
@@ -30,18 +45,15 @@ class DatabaseManager:
         Establish connection to MongoDB.
         """
         try:
-            self.client = pymongo.MongoClient(
-                self.uri,
-                serverSelectionTimeoutMS=5000,
-                connectTimeoutMS=10000
-            )
+            self.client = client_registry.get_client(self.uri, "query")
             self.client.admin.command('ping')
             self.db = self.client[self.database_name]
-            print(f"✓ Connected to MongoDB database: {self.database_name}")
+            self.sampling_db = client_registry.get_client(self.uri, "sampling")[self.database_name]
+            self.logger.info(f"Connected to MongoDB database: {self.database_name}")
             self._initialize_collections_info()
             return True
         except Exception as e:
-            print(f"✗ Error connecting to MongoDB: {str(e)}")
+            self.logger.error(f"Error connecting to MongoDB: {str(e)}")
             # FIX: Ensure self.db is None if connection fails
             self.db = None
             return False
@@ -53,13 +65,17 @@ class DatabaseManager:
             try:
                 collections = self.get_collections()
                 for collection_name in collections:
-                    self.collections_info[collection_name] = {
-                        'schema': None, 'sample_docs': None, 'last_updated': None
-                    }
-                print(f"✓ Initialized info for {len(collections)} collections")
+                    self._collection_info(collection_name)
+                self.logger.info(f"Initialized info for {len(collections)} collections")
             except Exception as e:
-                print(f"⚠ Warning: Could not initialize collections info: {str(e)}")
+                self.logger.warning(f"Could not initialize collections info: {str(e)}")
     
+    def _collection_info(self, collection_name: str) -> Dict[str, Any]:
+        """Return the cache entry for a collection, creating it if needed."""
+        return self.collections_info.setdefault(collection_name, {
+            'schema': None, 'sample_docs': None, 'last_updated': None
+        })
+
     def get_collections(self) -> List[str]:
         """
         Get list of all collections in the database.
@@ -93,6 +109,12 @@ class DatabaseManager:
             self.logger.error(f"Error getting collection stats: {str(e)}")
             return {'error': str(e)}
 
+    def sampling_collection(self, collection_name: str):
+        """Collection handle for background sampling scans, kept off the interactive pool."""
+        if self.sampling_db is not None:
+            return self.sampling_db[collection_name]
+        return self.db[collection_name]
+
     def extract_schema(self, collection_name: str, sample_size: int = 100) -> Dict[str, Any]:
         """
         Extract schema information from a collection by sampling documents.
@@ -102,7 +124,7 @@ class DatabaseManager:
             raise ConnectionError("Not connected to MongoDB. Call connect() first.")
         
         try:
-            collection = self.db[collection_name]
+            collection = self.sampling_collection(collection_name)
             total_docs = collection.count_documents({})
             
             if total_docs == 0:
@@ -110,26 +132,20 @@ class DatabaseManager:
             
             actual_sample_size = min(sample_size, total_docs)
             pipeline = [{"$sample": {"size": actual_sample_size}}]
-            sample_docs = list(collection.aggregate(pipeline))
+            # Stream the sample through the profiler instead of materializing it
+            profiler = SchemaProfiler().add_many(collection.aggregate(pipeline))
             
             schema = {
                 "collection_name": collection_name,
                 "total_documents": total_docs,
                 "sample_size": actual_sample_size,
-                "fields": {},
+                "fields": profiler.summary(),
                 "extracted_at": datetime.now().isoformat()
             }
             
-            for doc in sample_docs:
-                self._analyze_document_structure(doc, schema["fields"])
-            
-            for field_info in schema["fields"].values():
-                field_info["frequency"] = field_info.get("count", 0) / actual_sample_size
-                if isinstance(field_info.get("type"), set):
-                    field_info["type"] = list(field_info["type"])
-            
-            self.collections_info[collection_name]["schema"] = schema
-            self.collections_info[collection_name]["last_updated"] = datetime.now()
+            info = self._collection_info(collection_name)
+            info["schema"] = schema
+            info["last_updated"] = datetime.now()
             
             return schema
         except Exception as e:
@@ -137,6 +153,76 @@ class DatabaseManager:
             self.logger.error(error_msg)
             return {"error": error_msg}
         
+    def extract_schemas(self, collections: List[str], sample_size: Optional[int] = None,
+                        max_workers: Optional[int] = None,
+                        on_complete: Optional[Callable[[str, Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """
+        Extract schemas for many collections concurrently with a bounded
+        thread pool, filling the schema cache in one go. Wall time tracks the
+        slowest collection rather than the sum. `on_complete(name, schema)`
+        is called from the worker thread as each collection finishes.
+        """
+        if self.db is None:
+            raise ConnectionError("Not connected to MongoDB. Call connect() first.")
+
+        sample_size = sample_size or config.SCHEMA_SAMPLE_SIZE
+        workers = max(1, min(max_workers or config.SCHEMA_EXTRACTION_WORKERS, len(collections) or 1))
+        schemas, timings = {}, {}
+
+        def extract(collection_name: str) -> None:
+            started = time.perf_counter()
+            schema = self.extract_schema(collection_name, sample_size)
+            timings[collection_name] = time.perf_counter() - started
+            schemas[collection_name] = schema
+            if on_complete:
+                on_complete(collection_name, schema)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="schema") as executor:
+            list(executor.map(extract, dict.fromkeys(collections)))
+
+        return {
+            "schemas": schemas,
+            "timings": timings,
+            "total_seconds": time.perf_counter() - started,
+            "failed": [name for name, schema in schemas.items() if "error" in schema]
+        }
+
+    def _cached_schema(self, collection_name: str, max_age: float) -> Optional[Dict[str, Any]]:
+        info = self.collections_info.get(collection_name) or {}
+        schema, last_updated = info.get("schema"), info.get("last_updated")
+        if schema and last_updated and (datetime.now() - last_updated).total_seconds() < max_age:
+            return schema
+        return None
+
+    def get_schemas(self, collections: List[str], max_age: Optional[float] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Cached schemas for several collections; missing or stale ones are
+        extracted together in one parallel pass.
+        """
+        max_age = config.SCHEMA_CACHE_TTL if max_age is None else max_age
+        schemas, stale = {}, []
+        for collection_name in dict.fromkeys(collections):
+            schema = self._cached_schema(collection_name, max_age)
+            if schema is None:
+                stale.append(collection_name)
+            else:
+                schemas[collection_name] = schema
+        if stale:
+            schemas.update(self.extract_schemas(stale)["schemas"])
+        return schemas
+
+    def get_schema(self, collection_name: str, max_age: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Return the cached schema for a collection, extracting it when missing
+        or older than `max_age` seconds (config.SCHEMA_CACHE_TTL by default).
+        """
+        max_age = config.SCHEMA_CACHE_TTL if max_age is None else max_age
+        schema = self._cached_schema(collection_name, max_age)
+        if schema is not None:
+            return schema
+        return self.extract_schema(collection_name, config.SCHEMA_SAMPLE_SIZE)
+
     def _sanitize_document(self, doc):
         """Convert MongoDB-specific types to JSON-serializable formats"""
         if isinstance(doc, list):
@@ -147,63 +233,6 @@ class DatabaseManager:
             return str(doc)  # Convert ObjectId to string
         return doc
 
-    def execute_query(self, collection_name: str, query_type: str, query: Dict[str, Any]) -> Dict[str, Any]:
-        if self.db is None:
-            raise ConnectionError("Not connected to MongoDB. Call connect() first.")
-        
-        collection = self.db[collection_name]
-        
-        try:
-            start_time = datetime.now()
-            result = []
-            
-            if query_type == "find":
-                result = self._execute_find_query(collection, query)
-            elif query_type == "aggregate":
-                result = self._execute_aggregate_query(collection, query)
-            elif query_type == "count":
-                result = self._execute_count_query(collection, query)
-            elif query_type == "distinct":
-                result = self._execute_distinct_query(collection, query)
-            else:
-                raise ValueError(f"Unsupported query type: {query_type}")
-            
-            # Sanitize results before returning
-            sanitized_result = self._sanitize_document(result)
-            
-            execution_time = (datetime.now() - start_time).total_seconds()
-            
-            return {
-                "success": True,
-                "data": sanitized_result,
-                "execution_time_seconds": execution_time,
-                "result_count": len(sanitized_result)
-            }
-        except Exception as e:
-            return {"success": False, "error": str(e)}
-    
-    def _analyze_document_structure(self, doc: Dict, fields_info: Dict, prefix: str = "") -> None:
-        for key, value in doc.items():
-            if key == "_id":
-                continue
-            
-            field_name = f"{prefix}.{key}" if prefix else key
-            
-            if field_name not in fields_info:
-                fields_info[field_name] = {"type": set(), "count": 0}
-            
-            fields_info[field_name]["count"] += 1
-            
-            if isinstance(value, list):
-                fields_info[field_name]["type"].add("array")
-                if value and isinstance(value[0], dict):
-                    self._analyze_document_structure(value[0], fields_info, f"{field_name}[]")
-            elif isinstance(value, dict):
-                fields_info[field_name]["type"].add("object")
-                self._analyze_document_structure(value, fields_info, field_name)
-            else:
-                fields_info[field_name]["type"].add(type(value).__name__)
-    
     def execute_query(self, collection_name: str, query_type: str, query: Dict[str, Any]) -> Dict[str, Any]:
         """
         Execute a MongoDB query on a collection.
@@ -217,8 +246,16 @@ class DatabaseManager:
         try:
             start_time = datetime.now()
             result = []
-            
-            if query_type == "find":
+            source = "mongodb"
+            query = optimize_intent(dict(query, query_type=query_type))
+            query_type = query["query_type"]
+            materialized = self._materialized_result(collection_name, query_type, query)
+            if self.derived_fields is not None:
+                query = self.derived_fields.rewrite(collection_name, query)
+
+            if materialized is not None:
+                result, source = materialized, "materialized"
+            elif query_type == "find":
                 result = self._execute_find_query(collection, query)
             elif query_type == "aggregate":
                 result = self._execute_aggregate_query(collection, query)
@@ -238,17 +275,85 @@ class DatabaseManager:
                 "success": True,
                 "data": sanitized_result,
                 "execution_time_seconds": execution_time,
-                "result_count": len(sanitized_result)
+                "result_count": len(sanitized_result),
+                "source": source
             }
+        except DeadlineExceeded as e:
+            return {"success": False, "error": str(e), "error_type": e.error_type}
+        except ExecutionTimeout as e:
+            return {"success": False, "error": f"Query exceeded the request deadline: {str(e)}",
+                    "error_type": "timeout"}
         except Exception as e:
             return {"success": False, "error": str(e)}
-        
+
+    def _materialized_result(self, collection_name: str, query_type: str,
+                             query: Dict[str, Any]) -> Optional[List[Dict]]:
+        """Rows from a fresh materialization of this intent, if there is one."""
+        if self.materializer is None:
+            return None
+        try:
+            return self.materializer.lookup(collection_name, dict(query, query_type=query_type))
+        except Exception as e:
+            self.logger.warning(f"Materialized lookup failed, running live: {str(e)}")
+            return None
+
+    def iter_query(self, collection_name: str, query_type: str, query: Dict[str, Any],
+                   batch_size: Optional[int] = None, max_rows: Optional[int] = None) -> Iterator[List[Dict]]:
+        """
+        Run a query like execute_query, but yield sanitized documents in
+        batches of `batch_size` straight off the cursor instead of building
+        one list. Finds without a limit stop at `max_rows`. Used by exports,
+        so only the current batch is held in memory.
+        """
+        if self.db is None:
+            raise ConnectionError("Not connected to MongoDB. Call connect() first.")
+        batch_size = batch_size or config.EXPORT_BATCH_SIZE
+        max_rows = max_rows or config.EXPORT_MAX_ROWS
+        collection = self.db[collection_name]
+        query = optimize_intent(dict(query, query_type=query_type))
+        query_type = query["query_type"]
+        if self.derived_fields is not None:
+            query = self.derived_fields.rewrite(collection_name, query)
+
+        if query_type == "find":
+            cursor = collection.find(query.get("filter", {}), query.get("projection"), batch_size=batch_size)
+            if query.get("sort"):
+                cursor = cursor.sort(query["sort"])
+            limit = query.get("limit") or 0
+            cursor = cursor.limit(min(limit, max_rows) if limit > 0 else max_rows)
+        elif query_type == "aggregate":
+            if not query.get("pipeline"):
+                raise ValueError("Aggregation pipeline cannot be empty")
+            cursor = collection.aggregate(query["pipeline"], batchSize=batch_size, allowDiskUse=True)
+        elif query_type == "count":
+            yield self._sanitize_document(self._execute_count_query(collection, query))
+            return
+        elif query_type == "distinct":
+            yield self._sanitize_document(self._execute_distinct_query(collection, query))
+            return
+        else:
+            raise ValueError(f"Unsupported query type: {query_type}")
+
+        batch = []
+        for document in cursor:
+            batch.append(document)
+            if len(batch) >= batch_size:
+                yield self._sanitize_document(batch)
+                batch = []
+        if batch:
+            yield self._sanitize_document(batch)
+
     def _execute_find_query(self, collection, query: Dict) -> List[Dict]:
         filter_query = query.get("filter", {})
         projection = query.get("projection", None)
-        limit = query.get("limit", 100)
+        limit = query.get("limit")
+        if limit is None:
+            limit = config.DB_QUERY_LIMIT  # The LLM emits "limit": null for "no preference"
         sort = query.get("sort", None)
         cursor = collection.find(filter_query, projection)
+        max_time = max_time_kwargs()
+        if max_time:
+            cursor = cursor.max_time_ms(max_time["maxTimeMS"])
         if sort:
             cursor = cursor.sort(sort)
         if limit > 0:
@@ -259,18 +364,20 @@ class DatabaseManager:
         pipeline = query.get("pipeline", [])
         if not pipeline:
             raise ValueError("Aggregation pipeline cannot be empty")
-        return list(collection.aggregate(pipeline))
+        return list(collection.aggregate(pipeline, **max_time_kwargs()))
     
     def _execute_count_query(self, collection, query: Dict) -> List[Dict]:
         filter_query = query.get("filter", {})
-        count = collection.count_documents(filter_query)
-        return [{"count": count}]
+        if not filter_query:
+            # Answered from collection metadata instead of scanning
+            return count_rows(query, collection.estimated_document_count(**max_time_kwargs()))
+        return count_rows(query, collection.count_documents(filter_query, **max_time_kwargs()))
     
     def _execute_distinct_query(self, collection, query: Dict) -> List[Dict]:
         field = query.get("field", "")
         if not field:
             raise ValueError("Field name is required for distinct query")
-        distinct_values = collection.distinct(field, query.get("filter", {}))
+        distinct_values = collection.distinct(field, query.get("filter", {}), **max_time_kwargs())
         return [{"field": field, "distinct_values": distinct_values, "count": len(distinct_values)}]
     
     def get_sample_documents(self, collection_name: str, limit: int = 5) -> List[Dict]:
@@ -287,17 +394,26 @@ class DatabaseManager:
     
     def close(self) -> None:
         if self.client:
-            self.client.close()
-            print("✓ MongoDB connection closed")
+            client_registry.close_client(self.uri, "query")
+            client_registry.close_client(self.uri, "sampling")
+            self.client = None
+            self.sampling_db = None
             self.logger.info("MongoDB connection closed")
 
 
     def get_sample_document(self, collection_name: str) -> dict:
         if self.db is None:
             return {}
+        info = self._collection_info(collection_name)
+        if info.get("sample_docs"):
+            # Callers trim the document for prompts, so hand out a copy
+            return copy.deepcopy(info["sample_docs"][0])
         try:
             doc = self.db[collection_name].find_one({}, {'_id': 0})
-            return doc if doc else {}
+            if doc:
+                info["sample_docs"] = [doc]
+                return copy.deepcopy(doc)
+            return {}
         except Exception:
             return {}
 
@@ -0,0 +1,105 @@
+# src/deadline.py
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+from config.settings import config
+
+DEADLINE_HEADER = "X-Request-Deadline-Ms"
+
+_current: contextvars.ContextVar[Optional["Deadline"]] = contextvars.ContextVar("request_deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    """The request ran out of time, or its client went away."""
+
+    def __init__(self, deadline: "Deadline"):
+        self.error_type = "cancelled" if deadline.cancelled else "timeout"
+        message = ("Request cancelled: client disconnected" if deadline.cancelled
+                   else f"Request exceeded its {deadline.budget_ms} ms deadline")
+        super().__init__(message)
+
+
+class Deadline:
+    """
+    Time budget for one request. Each stage asks for what is left: the LLM
+    call as a client timeout, MongoDB as `maxTimeMS`. `cancel()` ends the
+    budget early (the client disconnected) so remaining stages are skipped.
+    """
+
+    def __init__(self, budget_ms: int):
+        self.budget_ms = budget_ms
+        self.expires_at = time.monotonic() + budget_ms / 1000.0
+        self._cancelled = threading.Event()
+
+    @classmethod
+    def from_header(cls, value: Optional[str]) -> Optional["Deadline"]:
+        """
+        Deadline from the request header, capped at REQUEST_DEADLINE_MAX_MS;
+        else config.REQUEST_DEADLINE_MS (0 disables it). Clients cannot turn
+        the deadline off: zero, negative and malformed values are ignored.
+        """
+        budget_ms = config.REQUEST_DEADLINE_MS
+        try:
+            requested = int(value) if value else 0
+        except ValueError:
+            requested = 0
+        if requested > 0:
+            budget_ms = requested
+            if config.REQUEST_DEADLINE_MAX_MS:
+                budget_ms = min(budget_ms, config.REQUEST_DEADLINE_MAX_MS)
+        return cls(budget_ms) if budget_ms > 0 else None
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def cancel(self) -> None:
+        self._cancelled.set()
+
+    def remaining(self) -> float:
+        """Seconds left; 0 once expired or cancelled."""
+        if self.cancelled:
+            return 0.0
+        return max(self.expires_at - time.monotonic(), 0.0)
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def check(self) -> None:
+        if self.expired():
+            raise DeadlineExceeded(self)
+
+    def max_time_ms(self) -> int:
+        """What is left as a MongoDB maxTimeMS (at least 1; 0 would mean no limit)."""
+        return max(int(self.remaining() * 1000), 1)
+
+
+def current_deadline() -> Optional[Deadline]:
+    return _current.get()
+
+
+@contextmanager
+def deadline_scope(deadline: Optional[Deadline]) -> Iterator[Optional[Deadline]]:
+    """Make `deadline` the current one for code running in this context."""
+    token = _current.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current.reset(token)
+
+
+def check_deadline() -> None:
+    deadline = _current.get()
+    if deadline is not None:
+        deadline.check()
+
+
+def max_time_kwargs() -> Dict[str, Any]:
+    """`maxTimeMS` for a MongoDB call under the current deadline ({} without one)."""
+    deadline = _current.get()
+    if deadline is None:
+        return {}
+    deadline.check()
+    return {"maxTimeMS": deadline.max_time_ms()}
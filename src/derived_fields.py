@@ -0,0 +1,221 @@
+# src/derived_fields.py
+import copy
+import re
+import threading
+import logging
+from typing import Dict, Any, List, Optional, Callable, Tuple
+from pymongo import UpdateOne
+from config.settings import config
+
+# "City, ST 12345" and military "APO AE 12345" endings of a US postal address
+_STATE_CODE = re.compile(r"\b([A-Z]{2})\s+\d{5}(?:-\d{4})?\s*$")
+# The address predicate the prompt produces for state questions: \bXX\b
+_STATE_REGEX = re.compile(r"^\\b([A-Za-z]{2})\\b$")
+
+
+def extract_state_code(address: Any) -> Optional[str]:
+    """Two-letter state code from the last line of an address, if present."""
+    if not isinstance(address, str):
+        return None
+    match = _STATE_CODE.search(address.strip().splitlines()[-1] if address.strip() else "")
+    return match.group(1) if match else None
+
+
+def state_code_for_predicate(condition: Any) -> Optional[str]:
+    """The state code a `{"$regex": "\\bXX\\b"}` address predicate asks for."""
+    if not isinstance(condition, dict) or set(condition) - {"$regex", "$options"}:
+        return None
+    if condition.get("$options", "i") not in ("", "i"):
+        return None
+    match = _STATE_REGEX.match(condition.get("$regex", "")) if isinstance(condition.get("$regex"), str) else None
+    return match.group(1).upper() if match else None
+
+
+class DerivedField:
+    """
+    A structured attribute extracted from a free-text field (`source`) and
+    stored, indexed, as `name`. `predicate_value` recognizes source
+    predicates that the derived field can answer with an equality match.
+    """
+
+    def __init__(self, collection: str, source: str, name: str,
+                 extract: Callable[[Any], Any], predicate_value: Callable[[Any], Any]):
+        self.collection = collection
+        self.source = source
+        self.name = name
+        self.extract = extract
+        self.predicate_value = predicate_value
+
+
+DERIVED_FIELDS = [
+    DerivedField("customers", "address", "state_code", extract_state_code, state_code_for_predicate)
+]
+
+
+class DerivedFieldManager:
+    """
+    Keeps derived fields populated and indexed, and rewrites filters on
+    their source fields into indexed equality lookups.
+
+    Each field is first reconciled (every document's derived value is
+    recomputed from its source, in batches) and indexed. It is then kept
+    current from a change stream, or, where change streams are not
+    available, by re-reconciling every `interval` seconds. Filters are only
+    rewritten for fields whose initial reconcile has finished, so a
+    partially backfilled field never hides documents. Under periodic
+    reconciling, documents inserted since the last pass have no derived
+    value yet, so those keep being matched on the source predicate.
+    """
+
+    def __init__(self, db, fields: Optional[List[DerivedField]] = None, interval: Optional[float] = None):
+        self.db = db
+        self.fields = DERIVED_FIELDS if fields is None else fields
+        self.interval = config.DERIVED_FIELDS_RECONCILE_INTERVAL if interval is None else interval
+        self.ready = set()
+        self.modes: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self.logger = logging.getLogger(__name__)
+
+    def ensure_index(self, field: DerivedField) -> None:
+        self.db[field.collection].create_index(field.name)
+
+    def reconcile(self, field: DerivedField, batch_size: Optional[int] = None) -> Dict[str, int]:
+        """Recompute the derived value for every document; write only the ones that changed."""
+        batch_size = batch_size or config.DERIVED_FIELDS_BATCH_SIZE
+        collection = self.db[field.collection]
+        scanned, updated, batch = 0, 0, []
+        for doc in collection.find({}, {field.source: 1, field.name: 1}).batch_size(batch_size):
+            scanned += 1
+            value = field.extract(doc.get(field.source))
+            if field.name not in doc or doc[field.name] != value:
+                batch.append(UpdateOne({"_id": doc["_id"]}, {"$set": {field.name: value}}))
+            if len(batch) >= batch_size:
+                updated += collection.bulk_write(batch, ordered=False).modified_count
+                batch = []
+        if batch:
+            updated += collection.bulk_write(batch, ordered=False).modified_count
+        return {"scanned": scanned, "updated": updated}
+
+    def _mark_ready(self, field: DerivedField, mode: str) -> None:
+        with self._lock:
+            self.ready.add((field.collection, field.name))
+            self.modes[f"{field.collection}.{field.name}"] = mode
+
+    def _apply_change(self, field: DerivedField, change: Dict[str, Any]) -> None:
+        doc = change.get("fullDocument")
+        if doc is None:
+            return
+        value = field.extract(doc.get(field.source))
+        if field.name not in doc or doc[field.name] != value:
+            self.db[field.collection].update_one({"_id": doc["_id"]}, {"$set": {field.name: value}})
+
+    def _maintain(self, field: DerivedField) -> None:
+        collection = self.db[field.collection]
+        # Only events that can change the source; our own $set of the derived field is skipped
+        pipeline = [{"$match": {"$or": [
+            {"operationType": {"$in": ["insert", "replace"]}},
+            {f"updateDescription.updatedFields.{field.source}": {"$exists": True}}
+        ]}}]
+        while not self._stop.is_set():
+            try:
+                self.ensure_index(field)
+                # The stream is opened before reconciling so no write falls in between
+                with collection.watch(pipeline, full_document="updateLookup", max_await_time_ms=1000) as stream:
+                    self.reconcile(field)
+                    self._mark_ready(field, "change_stream")
+                    while not self._stop.is_set():
+                        change = stream.try_next()
+                        if change is not None:
+                            self._apply_change(field, change)
+            except Exception as e:
+                if self._stop.is_set():
+                    return
+                self.logger.info(f"No change stream for {field.collection}.{field.name} ({str(e)}); "
+                                 f"reconciling every {self.interval}s")
+                try:
+                    self.ensure_index(field)
+                    self.reconcile(field)
+                    self._mark_ready(field, "periodic")
+                except Exception as reconcile_error:
+                    self.logger.warning(f"Reconcile of {field.collection}.{field.name} failed: "
+                                        f"{str(reconcile_error)}")
+                self._stop.wait(self.interval)
+
+    def start(self) -> None:
+        self._stop.clear()
+        for field in self.fields:
+            thread = threading.Thread(target=self._maintain, args=(field,),
+                                      name=f"derived-{field.name}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self) -> None:
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout=5)
+        self._threads = []
+
+    def _rewrite_predicate(self, collection_name: str, key: str, condition: Any,
+                           modes: Dict[str, str]) -> Tuple[str, Any]:
+        """
+        Equality on the derived field when change streams keep it current;
+        under periodic reconciling, also the source predicate for documents
+        the last pass has not reached.
+        """
+        for field in self.fields:
+            if field.collection != collection_name or field.source != key:
+                continue
+            mode = modes.get(f"{field.collection}.{field.name}")
+            value = field.predicate_value(condition) if mode is not None else None
+            if value is None:
+                continue
+            if mode == "change_stream":
+                return field.name, value
+            return "$or", [{field.name: value}, {field.name: {"$exists": False}, key: condition}]
+        return key, condition
+
+    def _rewrite_clause(self, collection_name: str, query_filter: Dict[str, Any],
+                        modes: Dict[str, str]) -> Dict[str, Any]:
+        rewritten: Dict[str, Any] = {}
+        extra = []
+        for key, condition in query_filter.items():
+            if key in ("$and", "$or", "$nor") and isinstance(condition, list):
+                condition = [self._rewrite_clause(collection_name, clause, modes) if isinstance(clause, dict)
+                             else clause for clause in condition]
+            else:
+                key, condition = self._rewrite_predicate(collection_name, key, condition, modes)
+            if key in rewritten:
+                extra.append({key: condition})
+            else:
+                rewritten[key] = condition
+        if extra:
+            rewritten.setdefault("$and", []).extend(extra)
+        return rewritten
+
+    def rewrite_filter(self, collection_name: str, query_filter: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Filter with derivable source predicates replaced by derived-field equality."""
+        if not query_filter:
+            return query_filter
+        with self._lock:
+            modes = dict(self.modes)
+        return self._rewrite_clause(collection_name, query_filter, modes) if modes else query_filter
+
+    def rewrite(self, collection_name: str, query: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Rewrite an intent's filter and the leading $match stages of its
+        pipeline (later stages may see reshaped documents).
+        """
+        query = copy.deepcopy(query)
+        if isinstance(query.get("filter"), dict):
+            query["filter"] = self.rewrite_filter(collection_name, query["filter"])
+        for stage in query.get("pipeline") or []:
+            if not isinstance(stage, dict) or not isinstance(stage.get("$match"), dict):
+                break
+            stage["$match"] = self.rewrite_filter(collection_name, stage["$match"])
+        return query
+
+    def status(self) -> Dict[str, str]:
+        with self._lock:
+            return dict(self.modes)
@@ -0,0 +1,238 @@
+# src/llm_backends.py
+import abc
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+from config.settings import config
+
+# The question and collection lines of the NLPProcessor prompt; used to match
+# recordings whose prompt differs only in sampled data
+_QUESTION_KEY = re.compile(r"User question: '(.*)'\nCollection: (\S+)")
+
+
+@dataclass
+class LLMResponse:
+    """What NLPProcessor reads from an LLM call (same shape as a langchain message)."""
+    content: str
+
+
+class LLMTimeout(TimeoutError):
+    """The (real or simulated) LLM call took longer than its timeout."""
+
+
+class ReplayMiss(KeyError):
+    """No recording matches the prompt."""
+
+
+def prompt_hash(prompt: str) -> str:
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+
+def question_key(prompt: str) -> Optional[str]:
+    match = _QUESTION_KEY.search(prompt)
+    return f"{match.group(2)}\n{match.group(1).strip().lower()}" if match else None
+
+
+class LLMBackend(abc.ABC):
+    """
+    Interface NLPProcessor calls: `invoke(prompt, timeout=None)` returns an
+    object with `.content`, and raises on provider errors or timeouts.
+    """
+
+    @abc.abstractmethod
+    def invoke(self, prompt: str, timeout: Optional[float] = None) -> LLMResponse:
+        """Send `prompt` to the model and return its reply."""
+
+
+class GroqBackend(LLMBackend):
+    """The Groq chat model through langchain."""
+
+    def __init__(self, model: Optional[str] = None):
+        # Imported here so the API can start serving before langchain loads
+        from langchain_groq import ChatGroq
+        self.model = model or config.MODEL_NAME
+        self.llm = ChatGroq(
+            model=self.model,
+            temperature=config.GROQ_TEMPERATURE,
+            api_key=config.GROQ_API_KEY,
+            max_retries=config.GROQ_MAX_RETRIES
+        )
+
+    def invoke(self, prompt: str, timeout: Optional[float] = None) -> LLMResponse:
+        response = self.llm.invoke(prompt) if timeout is None else self.llm.invoke(prompt, timeout=timeout)
+        return LLMResponse(content=response.content)
+
+
+class RecordingBackend(LLMBackend):
+    """
+    Passes calls through to `inner` and appends each prompt, response and
+    call latency as one JSON line to `path`. Failed calls are not recorded.
+    """
+
+    def __init__(self, inner: LLMBackend, path: Optional[str] = None):
+        self.inner = inner
+        self.path = path or config.LLM_RECORDING_PATH
+        self._lock = threading.Lock()
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def invoke(self, prompt: str, timeout: Optional[float] = None) -> LLMResponse:
+        started = time.perf_counter()
+        response = self.inner.invoke(prompt, timeout=timeout)
+        record = {
+            "prompt_hash": prompt_hash(prompt),
+            "question_key": question_key(prompt),
+            "prompt": prompt,
+            "response": response.content,
+            "latency": time.perf_counter() - started,
+            "model": getattr(self.inner, "model", None),
+            "recorded_at": datetime.utcnow().isoformat()
+        }
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+        return response
+
+
+def load_recordings(path: str) -> List[Dict[str, Any]]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def lognormal_params(median: float, p95: float) -> Tuple[float, float]:
+    """mu and sigma of a lognormal latency distribution with the given median and p95."""
+    mu = math.log(median)
+    return mu, max((math.log(p95) - mu) / 1.645, 0.0)
+
+
+class ReplayBackend(LLMBackend):
+    """
+    Serves recorded responses without network access.
+
+    Prompts are matched exactly first, then by question and collection (so
+    a prompt whose sampled example document changed still matches); repeated
+    prompts cycle through their recordings. `latency` is "none", "recorded"
+    (each recording's own latency, divided by `speedup`) or "synthetic"
+    (lognormal with `synthetic_latency` = (median, p95) seconds). Simulated
+    latency longer than the call's timeout raises LLMTimeout at the timeout.
+    """
+
+    def __init__(self, path: Optional[str] = None, latency: Optional[str] = None,
+                 synthetic_latency: Optional[Tuple[float, float]] = None,
+                 speedup: float = 1.0, seed: Optional[int] = None,
+                 recordings: Optional[List[Dict[str, Any]]] = None):
+        self.latency = latency or config.LLM_REPLAY_LATENCY
+        if self.latency not in ("none", "recorded", "synthetic"):
+            raise ValueError(f"Unknown replay latency mode: {self.latency}")
+        self.mu, self.sigma = lognormal_params(*(synthetic_latency or config.LLM_SYNTHETIC_LATENCY))
+        self.speedup = speedup
+        self._random = random.Random(seed)
+        self._by_hash: Dict[str, List[Dict[str, Any]]] = {}
+        self._by_question: Dict[str, List[Dict[str, Any]]] = {}
+        self._served: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        for record in recordings if recordings is not None else load_recordings(path or config.LLM_RECORDING_PATH):
+            self._by_hash.setdefault(record["prompt_hash"], []).append(record)
+            if record.get("question_key"):
+                self._by_question.setdefault(record["question_key"], []).append(record)
+
+    def _lookup(self, prompt: str) -> Dict[str, Any]:
+        key = prompt_hash(prompt)
+        candidates = self._by_hash.get(key)
+        if not candidates:
+            key = question_key(prompt)
+            candidates = self._by_question.get(key) if key else None
+        if not candidates:
+            raise ReplayMiss(f"No recording for prompt {prompt_hash(prompt)[:12]}")
+        with self._lock:
+            served = self._served.get(key, 0)
+            self._served[key] = served + 1
+            record = candidates[served % len(candidates)]
+            return dict(record, delay=self._delay(record))
+
+    def _delay(self, record: Dict[str, Any]) -> float:
+        if self.latency == "recorded":
+            return record.get("latency", 0.0) / self.speedup
+        if self.latency == "synthetic":
+            return self._random.lognormvariate(self.mu, self.sigma) / self.speedup
+        return 0.0
+
+    def invoke(self, prompt: str, timeout: Optional[float] = None) -> LLMResponse:
+        record = self._lookup(prompt)
+        if timeout is not None and record["delay"] > timeout:
+            time.sleep(timeout)
+            raise LLMTimeout(f"Replayed call took {record['delay']:.2f}s, over the {timeout:.2f}s timeout")
+        if record["delay"]:
+            time.sleep(record["delay"])
+        return LLMResponse(content=record["response"])
+
+
+class FaultInjectingBackend(LLMBackend):
+    """
+    Wraps another backend and, at the given rates, returns malformed output
+    instead of its response or times out (after the call's timeout, or
+    `timeout_seconds` when none is given). Draws are seeded for repeatable runs.
+    """
+
+    MALFORMED = (
+        lambda content: content[:max(len(content) // 2, 1)],            # Truncated JSON
+        lambda content: f"Sure! Here is your query: {content}",          # Prose around it
+        lambda content: content.replace('"', "'"),                      # Python-style quotes
+        lambda content: "",                                              # Empty completion
+    )
+
+    def __init__(self, inner: LLMBackend, malformed_rate: Optional[float] = None,
+                 timeout_rate: Optional[float] = None, timeout_seconds: Optional[float] = None,
+                 seed: Optional[int] = None):
+        self.inner = inner
+        self.malformed_rate = config.LLM_FAULT_MALFORMED_RATE if malformed_rate is None else malformed_rate
+        self.timeout_rate = config.LLM_FAULT_TIMEOUT_RATE if timeout_rate is None else timeout_rate
+        self.timeout_seconds = config.LLM_FAULT_TIMEOUT_SECONDS if timeout_seconds is None else timeout_seconds
+        self._random = random.Random(config.LLM_FAULT_SEED if seed is None else seed)
+        self._lock = threading.Lock()
+        self.injected = {"malformed": 0, "timeout": 0}
+
+    def invoke(self, prompt: str, timeout: Optional[float] = None) -> LLMResponse:
+        with self._lock:
+            draw = self._random.random()
+            variant = self._random.choice(self.MALFORMED)
+        if draw < self.timeout_rate:
+            wait = self.timeout_seconds if timeout is None else min(timeout, self.timeout_seconds)
+            with self._lock:
+                self.injected["timeout"] += 1
+            time.sleep(wait)
+            raise LLMTimeout(f"Injected timeout after {wait:.2f}s")
+        response = self.inner.invoke(prompt, timeout=timeout)
+        if draw < self.timeout_rate + self.malformed_rate:
+            with self._lock:
+                self.injected["malformed"] += 1
+            return LLMResponse(content=variant(response.content))
+        return response
+
+
+def create_backend(mode: Optional[str] = None) -> LLMBackend:
+    """
+    Backend selected by config.LLM_BACKEND: "groq", "record" (Groq, with
+    calls saved to LLM_RECORDING_PATH) or "replay" (offline, from that
+    file). Non-zero LLM_FAULT_* rates wrap it in fault injection.
+    """
+    mode = mode or config.LLM_BACKEND
+    if mode == "groq":
+        backend = GroqBackend()
+    elif mode == "record":
+        backend = RecordingBackend(GroqBackend())
+    elif mode == "replay":
+        backend = ReplayBackend()
+    else:
+        raise ValueError(f"Unknown LLM backend: {mode}")
+    if config.LLM_FAULT_MALFORMED_RATE > 0 or config.LLM_FAULT_TIMEOUT_RATE > 0:
+        backend = FaultInjectingBackend(backend)
+    return backend
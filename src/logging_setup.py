@@ -0,0 +1,172 @@
+# src/logging_setup.py
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import zlib
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, Optional
+from config.settings import config
+
+_session_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("log_session_id", default=None)
+_request_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("log_request_id", default=None)
+
+# Attributes every LogRecord has; anything else came in through `extra=`
+_STANDARD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+
+def current_request_id() -> Optional[str]:
+    return _request_id.get()
+
+
+@contextmanager
+def log_context(session_id: Optional[str] = None, request_id: Optional[str] = None) -> Iterator[None]:
+    """Tag log records written in this context with the given ids (None keeps the outer value)."""
+    tokens = []
+    if session_id is not None:
+        tokens.append((_session_id, _session_id.set(session_id)))
+    if request_id is not None:
+        tokens.append((_request_id, _request_id.set(request_id)))
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+
+def payload_sampled(rate: float) -> bool:
+    """
+    Whether verbose payloads are kept. Decided per request id, so a sampled
+    request keeps all of its payloads; random for records outside a request.
+    """
+    if rate >= 1:
+        return True
+    if rate <= 0:
+        return False
+    request_id = _request_id.get()
+    if request_id is None:
+        return random.random() < rate
+    return (zlib.crc32(request_id.encode("utf-8")) % 10_000) < rate * 10_000
+
+
+class ContextFilter(logging.Filter):
+    """
+    Runs in the caller's thread, where the context variables are set: adds
+    the session and request ids to the record, and drops or truncates
+    `payload` extras. Payloads on WARNING and above are always kept; below
+    that, only for LOG_PAYLOAD_SAMPLE_RATE of requests.
+    """
+
+    def __init__(self, sample_rate: Optional[float] = None, max_chars: Optional[int] = None):
+        super().__init__()
+        self.sample_rate = config.LOG_PAYLOAD_SAMPLE_RATE if sample_rate is None else sample_rate
+        self.max_chars = max_chars or config.LOG_PAYLOAD_MAX_CHARS
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.session_id = _session_id.get()
+        record.request_id = _request_id.get()
+        payload = getattr(record, "payload", None)
+        if payload is not None:
+            if record.levelno < logging.WARNING and not payload_sampled(self.sample_rate):
+                del record.payload
+            elif isinstance(payload, str) and len(payload) > self.max_chars:
+                record.payload = payload[:self.max_chars]
+                record.payload_truncated = len(payload)
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: timestamp, level, logger, message, ids and extras."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "thread": record.threadName,
+        }
+        for key, value in vars(record).items():
+            if key not in _STANDARD_ATTRS and value is not None:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc_info"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that never blocks the caller: records are dropped (and
+    counted) while the queue is full. Formatting is left to the listener
+    thread; only the message and traceback are rendered here, since args
+    and exc_info may not be safe to read later.
+    """
+
+    def __init__(self, log_queue: "queue.Queue"):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional[NonBlockingQueueHandler] = None
+
+
+def configure_logging(level: Optional[str] = None, fmt: Optional[str] = None, stream=None) -> NonBlockingQueueHandler:
+    """
+    Route the root logger through a bounded queue to a background thread
+    writing to `stream` (stdout): JSON lines, or plain text with
+    LOG_FORMAT=text. Safe to call again; it replaces the earlier setup.
+    """
+    global _listener, _queue_handler
+    shutdown_logging()
+    output = logging.StreamHandler(stream or sys.stdout)
+    if (fmt or config.LOG_FORMAT) == "text":
+        output.setFormatter(logging.Formatter(
+            "%(asctime)s %(levelname)s %(name)s [%(session_id)s %(request_id)s] %(message)s"))
+    else:
+        output.setFormatter(JsonFormatter())
+
+    _queue_handler = NonBlockingQueueHandler(queue.Queue(maxsize=config.LOG_QUEUE_SIZE))
+    _queue_handler.addFilter(ContextFilter())
+    root = logging.getLogger()
+    root.setLevel((level or config.LOG_LEVEL).upper())
+    root.addHandler(_queue_handler)
+    _listener = logging.handlers.QueueListener(_queue_handler.queue, output, respect_handler_level=True)
+    _listener.start()
+    return _queue_handler
+
+
+def shutdown_logging() -> None:
+    """Flush queued records and detach the queue handler."""
+    global _listener, _queue_handler
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+    if _queue_handler is not None:
+        logging.getLogger().removeHandler(_queue_handler)
+        _queue_handler = None
+
+
+atexit.register(shutdown_logging)
@@ -0,0 +1,200 @@
+# src/materializer.py
+import hashlib
+import json
+import threading
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional, Tuple
+from config.settings import config
+from src.query_optimizer import count_rows, optimize_intent
+
+MATERIALIZED_QUERY_TYPES = ("count", "aggregate")
+
+
+def intent_signature(collection_name: str, intent: Dict[str, Any]) -> str:
+    """Stable key for the parts of a count/aggregate intent that decide its result."""
+    intent = optimize_intent(intent)
+    query_type = intent.get("query_type")
+    body = {"collection": collection_name, "query_type": query_type}
+    if query_type == "count":
+        body["filter"] = intent.get("filter") or {}
+    else:
+        body["pipeline"] = intent.get("pipeline") or []
+    encoded = json.dumps(body, sort_keys=True, default=str)
+    return hashlib.sha1(encoded.encode("utf-8")).hexdigest()
+
+
+def find_hot_intents(events, since: datetime, min_hits: Optional[int] = None,
+                     limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Successful count and aggregate intents executed at least `min_hits`
+    times since `since`, most frequent first. Grouping runs server-side so
+    only the distinct intents leave the events collection; variants with
+    the same canonical form are then combined. Unfiltered counts are
+    skipped: they are already answered from collection metadata.
+    """
+    min_hits = config.MATERIALIZE_MIN_HITS if min_hits is None else min_hits
+    limit = config.MATERIALIZE_MAX_INTENTS if limit is None else limit
+    pipeline = [
+        {"$match": {
+            "type": "ai_response",
+            "response_success": True,
+            "timestamp": {"$gte": since},
+            "collection": {"$exists": True},
+            "intent.query_type": {"$in": list(MATERIALIZED_QUERY_TYPES)}
+        }},
+        {"$group": {
+            "_id": {
+                "collection": "$collection",
+                "query_type": "$intent.query_type",
+                "filter": "$intent.filter",
+                "pipeline": "$intent.pipeline"
+            },
+            "hits": {"$sum": 1}
+        }},
+        {"$sort": {"hits": -1}},
+        {"$limit": limit * 10}
+    ]
+    combined: Dict[str, Dict[str, Any]] = {}
+    for group in events.aggregate(pipeline):
+        intent = {key: value for key, value in group["_id"].items() if key != "collection"}
+        intent = optimize_intent(intent)
+        if intent["query_type"] == "count" and not intent.get("filter"):
+            continue
+        if intent["query_type"] == "aggregate" and not intent.get("pipeline"):
+            continue
+        key = intent_signature(group["_id"]["collection"], intent)
+        entry = combined.setdefault(key, {"collection": group["_id"]["collection"], "intent": intent, "hits": 0})
+        entry["hits"] += group["hits"]
+    hot = sorted((entry for entry in combined.values() if entry["hits"] >= min_hits),
+                 key=lambda entry: entry["hits"], reverse=True)
+    return hot[:limit]
+
+
+class Materializer:
+    """
+    Keeps the results of hot count and aggregate intents in summary
+    collections and answers matching intents from them.
+
+    Hot intents are re-detected from the events log and refreshed on a
+    schedule: each refresh runs the intent once with a trailing `$merge`
+    into `materialized_counts` or `materialized_aggregates`. Lookups only
+    touch MongoDB for intents known to be hot, and only return results
+    refreshed within `max_age` seconds; anything else runs live.
+    """
+
+    def __init__(self, db, events, refresh_db=None, max_age: Optional[float] = None):
+        self.db = db
+        self.events = events
+        # Refresh scans can run on a separate (ETL) client so they do not
+        # take connections from interactive queries
+        self.refresh_db = refresh_db if refresh_db is not None else db
+        self.max_age = config.MATERIALIZED_MAX_AGE if max_age is None else max_age
+        self.hot: Dict[str, Tuple[str, Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.logger = logging.getLogger(__name__)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def store_name(query_type: str) -> str:
+        if query_type == "count":
+            return config.MATERIALIZED_COUNTS_COLLECTION
+        return config.MATERIALIZED_AGGREGATES_COLLECTION
+
+    def _merge_pipeline(self, key: str, collection_name: str, intent: Dict[str, Any],
+                        refreshed_at: datetime) -> List[Dict[str, Any]]:
+        if intent["query_type"] == "count":
+            facet = [{"$match": intent.get("filter") or {}}, {"$count": "count"}]
+            value = {"count": {"$ifNull": [{"$arrayElemAt": ["$rows.count", 0]}, 0]}}
+        else:
+            facet = list(intent["pipeline"])
+            value = {"rows": "$rows"}
+        # $facet always emits one document, so empty results are stored too
+        return [
+            {"$facet": {"rows": facet}},
+            {"$project": dict(value, _id={"$literal": key}, collection={"$literal": collection_name},
+                              refreshed_at={"$literal": refreshed_at})},
+            {"$merge": {"into": self.store_name(intent["query_type"]), "on": "_id",
+                        "whenMatched": "replace", "whenNotMatched": "insert"}}
+        ]
+
+    def refresh(self, collection_name: str, intent: Dict[str, Any]) -> bool:
+        """Recompute one intent into its summary collection."""
+        intent = optimize_intent(intent)
+        key = intent_signature(collection_name, intent)
+        refreshed_at = datetime.utcnow()
+        try:
+            self.refresh_db[collection_name].aggregate(
+                self._merge_pipeline(key, collection_name, intent, refreshed_at))
+        except Exception as e:
+            self.logger.warning(f"Could not materialize {intent['query_type']} on {collection_name}: {str(e)}")
+            return False
+        with self._lock:
+            self.hot[key] = (collection_name, intent)
+        return True
+
+    def refresh_hot(self, window_hours: Optional[float] = None) -> Dict[str, int]:
+        """Re-detect hot intents, refresh each, and stop serving ones that cooled off."""
+        window_hours = config.MATERIALIZE_WINDOW_HOURS if window_hours is None else window_hours
+        since = datetime.utcnow() - timedelta(hours=window_hours)
+        hot = find_hot_intents(self.events, since)
+        keys = {intent_signature(entry["collection"], entry["intent"]) for entry in hot}
+        with self._lock:
+            for key in set(self.hot) - keys:
+                del self.hot[key]
+        refreshed = sum(1 for entry in hot if self.refresh(entry["collection"], entry["intent"]))
+        return {"hot": len(hot), "refreshed": refreshed}
+
+    def lookup(self, collection_name: str, intent: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
+        """
+        Result rows for a materialized intent, or None when the intent is
+        not hot or its summary is older than the freshness bound.
+        """
+        intent = optimize_intent(intent)
+        if intent.get("query_type") not in MATERIALIZED_QUERY_TYPES:
+            return None
+        key = intent_signature(collection_name, intent)
+        with self._lock:
+            known = key in self.hot
+        doc = None
+        if known:
+            doc = self.db[self.store_name(intent["query_type"])].find_one({"_id": key})
+        fresh = doc is not None and datetime.utcnow() - doc["refreshed_at"] <= timedelta(seconds=self.max_age)
+        with self._lock:
+            if fresh:
+                self.hits += 1
+            elif known:
+                self.misses += 1
+        if not fresh:
+            return None
+        if intent["query_type"] == "count":
+            return count_rows(intent, doc["count"])
+        return doc["rows"]
+
+    def start(self, interval: Optional[float] = None) -> None:
+        """Refresh hot intents every `interval` seconds on a daemon thread."""
+        interval = config.MATERIALIZE_REFRESH_INTERVAL if interval is None else interval
+
+        def run():
+            while not self._stop.is_set():
+                try:
+                    self.refresh_hot()
+                except Exception as e:
+                    self.logger.warning(f"Materialization refresh failed: {str(e)}")
+                self._stop.wait(interval)
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=run, name="materializer", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hot_intents": len(self.hot), "hits": self.hits, "misses": self.misses}
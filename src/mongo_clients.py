@@ -0,0 +1,199 @@
+# src/mongo_clients.py
+import threading
+import logging
+from typing import Dict, Any, List, Optional, Tuple
+import pymongo
+from pymongo import monitoring, uri_parser
+from config.settings import config
+
+
+class PoolStatsListener(monitoring.ConnectionPoolListener):
+    """
+    Tracks connection pool activity for one client so pool saturation
+    (checked-out connections and checkout waits) can be observed.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.open_connections = 0
+        self.checked_out = 0
+        self.max_checked_out = 0
+        self.waiting = 0
+        self.max_waiting = 0
+        self.checkouts = 0
+        self.checkout_failures = 0
+        self.pool_clears = 0
+
+    def _checkout_finished(self):
+        self.waiting = max(self.waiting - 1, 0)
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self.pool_clears += 1
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        with self._lock:
+            self.open_connections += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.open_connections = max(self.open_connections - 1, 0)
+
+    def connection_check_out_started(self, event):
+        with self._lock:
+            self.waiting += 1
+            self.max_waiting = max(self.max_waiting, self.waiting)
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self._checkout_finished()
+            self.checkout_failures += 1
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            self._checkout_finished()
+            self.checkouts += 1
+            self.checked_out += 1
+            self.max_checked_out = max(self.max_checked_out, self.checked_out)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out = max(self.checked_out - 1, 0)
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "open_connections": self.open_connections,
+                "checked_out": self.checked_out,
+                "max_checked_out": self.max_checked_out,
+                "waiting": self.waiting,
+                "max_waiting": self.max_waiting,
+                "checkouts": self.checkouts,
+                "checkout_failures": self.checkout_failures,
+                "pool_clears": self.pool_clears
+            }
+
+
+class MongoClientRegistry:
+    """
+    One MongoClient per (URI, role). Each role gets its own tuned pool
+    (see config.MONGO_POOL_PROFILES) so analytics writes and ETL scans do
+    not compete with interactive queries for connections, and its own read
+    preference so their reads can be served by secondaries.
+    """
+
+    def __init__(self, profiles: Optional[Dict[str, Dict[str, Any]]] = None):
+        self.profiles = profiles or config.MONGO_POOL_PROFILES
+        self._clients: Dict[Tuple[str, str], pymongo.MongoClient] = {}
+        self._listeners: Dict[Tuple[str, str], PoolStatsListener] = {}
+        self._lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+
+    def client_options(self, role: str) -> Dict[str, Any]:
+        """Keyword arguments used to build the MongoClient for a role."""
+        if role not in self.profiles:
+            raise ValueError(f"Unknown MongoDB client role: {role}")
+        options = {
+            "serverSelectionTimeoutMS": 5000,
+            "connectTimeoutMS": config.DB_CONNECTION_TIMEOUT,
+        }
+        options.update(self.profiles[role])
+        if not options.get("compressors"):
+            options.pop("compressors", None)
+        elif "zlib" in options["compressors"].split(","):
+            options.setdefault("zlibCompressionLevel", config.MONGO_ZLIB_COMPRESSION_LEVEL)
+        if options.get("readPreference", "primary") == "primary":
+            # Staleness bounds and tags only apply to secondary reads
+            options.pop("maxStalenessSeconds", None)
+            options.pop("readPreferenceTags", None)
+        return options
+
+    def get_client(self, uri: Optional[str] = None, role: str = "query") -> pymongo.MongoClient:
+        """Return the shared client for (uri, role), creating it on first use."""
+        uri = uri or config.MONGODB_URI
+        key = (uri, role)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                listener = PoolStatsListener()
+                client = pymongo.MongoClient(uri, event_listeners=[listener], **self.client_options(role))
+                self._clients[key] = client
+                self._listeners[key] = listener
+                self.logger.info(f"Created MongoDB client for role '{role}'")
+            return client
+
+    def warm(self, roles: Optional[List[str]] = None, uri: Optional[str] = None) -> Dict[str, bool]:
+        """
+        Create and ping the clients for the given roles so the first request
+        does not pay for server selection and the initial handshake. Pools
+        then keep `minPoolSize` connections open in the background.
+        """
+        results = {}
+        for role in roles or list(self.profiles):
+            try:
+                self.get_client(uri, role).admin.command('ping')
+                results[role] = True
+            except Exception as e:
+                self.logger.warning(f"Could not warm MongoDB client for role '{role}': {str(e)}")
+                results[role] = False
+        return results
+
+    def pool_stats(self) -> List[Dict[str, Any]]:
+        """Pool utilization for every registered client (credentials omitted)."""
+        with self._lock:
+            entries = list(self._listeners.items())
+        stats = []
+        for (uri, role), listener in entries:
+            options = self.client_options(role)
+            max_pool = options.get("maxPoolSize", 100)
+            snapshot = listener.snapshot()
+            snapshot.update({
+                "role": role,
+                "hosts": _hosts_for(uri),
+                "read_preference": options.get("readPreference", "primary"),
+                "max_pool_size": max_pool,
+                "utilization": snapshot["checked_out"] / max_pool if max_pool else 0.0
+            })
+            stats.append(snapshot)
+        return stats
+
+    def close_client(self, uri: Optional[str] = None, role: str = "query") -> None:
+        key = (uri or config.MONGODB_URI, role)
+        with self._lock:
+            client = self._clients.pop(key, None)
+            self._listeners.pop(key, None)
+        if client is not None:
+            client.close()
+
+    def close_all(self) -> None:
+        with self._lock:
+            clients = list(self._clients.values())
+            self._clients.clear()
+            self._listeners.clear()
+        for client in clients:
+            client.close()
+
+
+def _hosts_for(uri: str) -> List[str]:
+    try:
+        if uri.startswith("mongodb+srv://"):
+            # Avoid a DNS lookup just to report stats
+            return [uri.split("@")[-1].split("/")[0].split("?")[0]]
+        return [f"{host}:{port}" for host, port in uri_parser.parse_uri(uri)["nodelist"]]
+    except Exception:
+        return []
+
+
+client_registry = MongoClientRegistry()
@@ -82,45 +82,37 @@
 
 # src/nlp_processor.py
 import json
+import logging
 import re
 from datetime import datetime
 from bson import ObjectId
 from typing import Dict, Any, Optional
-from langchain_groq import ChatGroq
 from config.settings import config
 from src.database_manager import DatabaseManager
+from src.deadline import DeadlineExceeded, current_deadline
+from src.admission import Overloaded, current_priority, llm_admission, llm_breaker, recent_intents
+from src.llm_backends import LLMBackend, create_backend
+from src.value_dictionary import (
+    US_STATES, ValueDictionaryStore, asks_for_count, describe_matches, resolve_without_llm, state_matcher
+)
 
-US_STATES = {
-    "alabama": "AL", "alaska": "AK", "arizona": "AZ", "arkansas": "AR",
-    "california": "CA", "colorado": "CO", "connecticut": "CT", "delaware": "DE",
-    "florida": "FL", "georgia": "GA", "hawaii": "HI", "idaho": "ID",
-    "illinois": "IL", "indiana": "IN", "iowa": "IA", "kansas": "KS",
-    "kentucky": "KY", "louisiana": "LA", "maine": "ME", "maryland": "MD",
-    "massachusetts": "MA", "michigan": "MI", "minnesota": "MN", "mississippi": "MS",
-    "missouri": "MO", "montana": "MT", "nebraska": "NE", "nevada": "NV",
-    "new hampshire": "NH", "new jersey": "NJ", "new mexico": "NM", "new york": "NY",
-    "north carolina": "NC", "north dakota": "ND", "ohio": "OH", "oklahoma": "OK",
-    "oregon": "OR", "pennsylvania": "PA", "rhode island": "RI", "south carolina": "SC",
-    "south dakota": "SD", "tennessee": "TN", "texas": "TX", "utah": "UT",
-    "vermont": "VT", "virginia": "VA", "washington": "WA", "west virginia": "WV",
-    "wisconsin": "WI", "wyoming": "WY"
-}
+logger = logging.getLogger(__name__)
+
+# Matches longest names first, so "west virginia" is not read as "virginia"
+STATE_MATCHER = state_matcher()
 
 def extract_state_from_text(user_text: str):
-    user_text_lower = user_text.lower()
-    for state in US_STATES:
-        if state in user_text_lower:
-            return state
-    return None
+    matches = STATE_MATCHER.match(user_text)
+    if not matches:
+        return None
+    return next(name for name, code in US_STATES.items() if code == matches[0].value)
 
 class NLPProcessor:
-    def __init__(self, db_manager: DatabaseManager):
+    def __init__(self, db_manager: DatabaseManager, llm_backend: Optional[LLMBackend] = None):
         self.db_manager = db_manager
-        self.llm = ChatGroq(
-            model=config.MODEL_NAME,
-            temperature=config.GROQ_TEMPERATURE,
-            api_key=config.GROQ_API_KEY
-        )
+        self.value_dictionaries = ValueDictionaryStore(db_manager)
+        # config.LLM_BACKEND decides unless a backend is passed in (tests, benchmarks)
+        self.llm = llm_backend if llm_backend is not None else create_backend()
 
     def _json_serial(self, obj):
         if isinstance(obj, (datetime, ObjectId)):
@@ -131,13 +123,26 @@ class NLPProcessor:
             return [self._json_serial(item) for item in obj]
         return obj
 
+    def _format_value_hints(self, simplified_fields: Dict[str, Dict[str, Any]]) -> str:
+        """Numeric ranges and common values of low-cardinality fields, for the prompt."""
+        hints = []
+        for field_name, info in simplified_fields.items():
+            if info.get("min") is not None:
+                hints.append(f"{field_name}: {info['min']} to {info['max']}")
+            elif info.get("sample_values") and (info.get("distinct_estimate") or 0) <= config.PROMPT_HINT_MAX_DISTINCT:
+                values = ", ".join(json.dumps(self._json_serial(v), default=str) for v in info["sample_values"])
+                hints.append(f"{field_name}: {values}")
+        if not hints:
+            return ""
+        return "Known values (ranges or most common): " + "; ".join(hints) + "\n"
+
     def parse_query(
         self,
         user_text: str,
         collection_name: str,
         session_context: Optional[Dict[str, Any]] = None
     ) -> Dict[str, Any]:
-        schema = self.db_manager.extract_schema(collection_name)
+        schema = self.db_manager.get_schema(collection_name)
         if 'error' in schema:
             return {
                 "query_type": "error",
@@ -148,17 +153,35 @@ class NLPProcessor:
         for field_name, field_info in schema.get('fields', {}).items():
             simplified_fields[field_name] = {
                 "types": list(field_info.get("type", []))[:3],
-                "sample_values": field_info.get("sample_values", [])[:1]
+                "sample_values": field_info.get("sample_values", [])[:3],
+                "distinct_estimate": field_info.get("distinct_estimate"),
+                "min": field_info.get("min"),
+                "max": field_info.get("max")
             }
             if len(simplified_fields) >= 15:
                 break
+        value_hints = self._format_value_hints(simplified_fields)
+
+        # --- Value dictionary: exact field/value pairs, answered without the LLM when possible ---
+        value_matches = []
+        matcher = None
+        try:
+            matcher = self.value_dictionaries.get(collection_name)
+            if config.VALUE_DICT_FAST_PATH:
+                resolved = resolve_without_llm(user_text, collection_name, matcher)
+                if resolved is not None:
+                    return resolved
+            value_matches = matcher.match(user_text)
+        except Exception as e:
+            logger.warning(f"Value dictionary unavailable for {collection_name}: {str(e)}")
+
         sample_doc = self._get_sample_document(collection_name)
-        sample_doc_str = json.dumps(self._json_serial(sample_doc), indent=2)
+        sample_doc_str = json.dumps(self._json_serial(sample_doc), indent=2, default=str)
 
         # --- State validation logic ---
         if re.search(r"customers\s+(in|from|living in|residing in)\s", user_text.lower()):
             state_name = extract_state_from_text(user_text)
-            if state_name is None:
+            if state_name is None and not value_matches:
                 return {
                     "query_type": "error",
                     "error_type": "impossible",
@@ -183,6 +206,8 @@ class NLPProcessor:
             f"User question: '{user_text}'\n"
             f"Collection: {collection_name}\n"
             f"Available fields: {', '.join(simplified_fields.keys())}\n"
+            f"{value_hints}"
+            f"{describe_matches(value_matches)}"
             f"Data format example: {sample_doc_str}\n"
             "Instructions:\n"
             "- Always output ONLY a single JSON object with keys: query_type, filter, projection, pipeline, or error_type as appropriate. DO NOT return Python code, explanations, or extra text.\n"
@@ -212,10 +237,14 @@ class NLPProcessor:
             "- If the question is ambiguous and cannot be resolved, return: {\"query_type\": \"error\", \"error_type\": \"ambiguous\"}\n"
         )
 
+        deadline = current_deadline()
+        if not llm_breaker.allow():
+            return self._answer_without_llm(user_text, collection_name, matcher, session_context,
+                                            "LLM provider is failing", llm_breaker.retry_after())
         try:
-            response = self.llm.invoke(prompt)
+            response = self._invoke_llm(prompt, deadline)
             content = response.content.strip()
-            print("LLM raw output:", content)
+            logger.info("LLM response received", extra={"collection": collection_name, "payload": content})
             if '```json' in content:
                 match = re.search(r'```json(.*?)```', content, re.DOTALL)
                 if match:
@@ -225,19 +254,90 @@ class NLPProcessor:
                 if match:
                     content = match.group(1).strip()
             if not content or not content.startswith("{"):
+                logger.warning("LLM returned no valid JSON", extra={"collection": collection_name, "payload": content})
                 return {
                     "query_type": "error",
                     "error_type": "processing",
                     "error_message": f"LLM returned no valid JSON: {content[:100]}"
                 }
-            return json.loads(content)
+            intent = json.loads(content)
+            if isinstance(intent, dict) and intent.get("query_type") == "find" and asks_for_count(user_text):
+                # Only the number of rows is wanted; optimize_intent() runs this as a count
+                intent["count_only"] = True
+            if not session_context and isinstance(intent, dict) and intent.get("query_type") != "error":
+                recent_intents.remember(collection_name, user_text, intent)
+            return intent
+        except Overloaded as e:
+            return self._answer_without_llm(user_text, collection_name, matcher, session_context,
+                                            str(e), e.retry_after)
+        except DeadlineExceeded as e:
+            return {"query_type": "error", "error_type": e.error_type, "error_message": str(e)}
         except Exception as e:
+            if deadline is not None and (deadline.expired() or "timeout" in type(e).__name__.lower()):
+                return {
+                    "query_type": "error",
+                    "error_type": "cancelled" if deadline.cancelled else "timeout",
+                    "error_message": f"LLM call exceeded the request deadline: {str(e)}"
+                }
             return {
                 "query_type": "error",
                 "error_type": "processing",
                 "error_message": f"LLM processing failed: {str(e)}"
             }
 
+    def _invoke_llm(self, prompt: str, deadline):
+        """
+        One LLM call under admission control, with the remaining request
+        budget as its HTTP timeout. Provider errors within the budget feed the
+        circuit breaker; calls that end any other way, including timeouts of
+        a client's own short deadline, release its half-open probe.
+        """
+        settled = False
+        try:
+            with llm_admission.slot(current_priority(), deadline):
+                try:
+                    if deadline is None:
+                        response = self.llm.invoke(prompt)
+                    else:
+                        deadline.check()
+                        response = self.llm.invoke(prompt, timeout=deadline.remaining())
+                except DeadlineExceeded:
+                    raise
+                except Exception:
+                    if deadline is None or not deadline.expired():
+                        llm_breaker.record_failure()
+                        settled = True
+                    raise
+            llm_breaker.record_success()
+            settled = True
+            return response
+        finally:
+            if not settled:
+                llm_breaker.record_abandoned()
+
+    def _answer_without_llm(self, user_text: str, collection_name: str, matcher,
+                            session_context: Optional[Dict[str, Any]], reason: str,
+                            retry_after: float) -> Dict[str, Any]:
+        """
+        Intent for a question the LLM cannot take right now: the value
+        dictionary fast path, else the intent last generated for the same
+        stand-alone question, else an "overloaded" error with a retry hint.
+        """
+        if matcher is not None:
+            resolved = resolve_without_llm(user_text, collection_name, matcher)
+            if resolved is not None:
+                return resolved
+        if not session_context:
+            cached = recent_intents.get(collection_name, user_text)
+            if cached is not None:
+                return cached
+        return {
+            "query_type": "error",
+            "error_type": "overloaded",
+            "error_message": f"Too busy to answer right now: {reason}",
+            "retry_after": max(int(retry_after), 1)
+        }
+
     def execute_intent(self, collection_name: str, intent: Dict[str, Any]) -> Dict[str, Any]:
         return self.db_manager.execute_query(
             collection_name=collection_name,
@@ -0,0 +1,189 @@
+# src/profiling.py
+import html
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from typing import Dict, Any, Callable, Iterator, List, Optional, Tuple
+from config.settings import config
+
+Stack = Tuple[str, ...]
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+def _stack_of(frame, max_depth: int) -> Stack:
+    """Root-first frame labels, truncated at `max_depth` frames from the leaf."""
+    labels = []
+    while frame is not None and len(labels) < max_depth:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    return tuple(reversed(labels))
+
+
+class StackSampler:
+    """
+    Statistical profiler for selected threads.
+
+    A request picked by `should_sample()` registers the thread doing its
+    work; while any thread is registered, a daemon thread reads their
+    current stacks every `interval` seconds and counts them in time buckets
+    of `bucket_seconds`, kept for `retention` seconds. Nothing runs while
+    no request is being profiled, so the cost is proportional to the sample
+    rate.
+    """
+
+    def __init__(self, sample_rate: Optional[float] = None, interval: Optional[float] = None,
+                 bucket_seconds: Optional[int] = None, retention: Optional[int] = None,
+                 max_depth: Optional[int] = None):
+        self.sample_rate = config.PROFILE_SAMPLE_RATE if sample_rate is None else sample_rate
+        self.interval = (config.PROFILE_INTERVAL_MS / 1000.0) if interval is None else interval
+        self.bucket_seconds = bucket_seconds or config.PROFILE_BUCKET_SECONDS
+        self.retention = retention or config.PROFILE_RETENTION_SECONDS
+        self.max_depth = max_depth or config.PROFILE_MAX_DEPTH
+        self._buckets: "deque[Tuple[int, Counter]]" = deque()
+        self._targets: Dict[int, int] = {}  # thread id -> nesting depth
+        self._lock = threading.Lock()
+        self._active = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.profiled_requests = 0
+        self.samples = 0
+
+    def should_sample(self) -> bool:
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def _ensure_thread(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+            self._thread.start()
+
+    @contextmanager
+    def profile_thread(self) -> Iterator[None]:
+        """Sample the calling thread until the block exits."""
+        ident = threading.get_ident()
+        with self._lock:
+            self._targets[ident] = self._targets.get(ident, 0) + 1
+            self.profiled_requests += 1
+            self._ensure_thread()
+            self._active.set()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._targets[ident] -= 1
+                if not self._targets[ident]:
+                    del self._targets[ident]
+                if not self._targets:
+                    self._active.clear()
+
+    def profiled(self, func: Callable[[], Any]) -> Callable[[], Any]:
+        """`func`, sampled in whichever thread ends up calling it."""
+        def run():
+            with self.profile_thread():
+                return func()
+        return run
+
+    def _run(self) -> None:
+        while True:
+            self._active.wait()
+            with self._lock:
+                targets = list(self._targets)
+            frames = sys._current_frames()
+            now = time.time()
+            for ident in targets:
+                frame = frames.get(ident)
+                if frame is not None:
+                    self.record(_stack_of(frame, self.max_depth), now)
+            del frames
+            time.sleep(self.interval)
+
+    def record(self, stack: Stack, at: Optional[float] = None, count: int = 1) -> None:
+        at = time.time() if at is None else at
+        bucket = int(at // self.bucket_seconds) * self.bucket_seconds
+        with self._lock:
+            if not self._buckets or self._buckets[-1][0] != bucket:
+                self._buckets.append((bucket, Counter()))
+            self._buckets[-1][1][stack] += count
+            self.samples += count
+            while self._buckets and self._buckets[0][0] < at - self.retention:
+                self._buckets.popleft()
+
+    def stacks(self, window: float, now: Optional[float] = None) -> Counter:
+        """Stack counts from buckets overlapping the last `window` seconds."""
+        now = time.time() if now is None else now
+        merged: Counter = Counter()
+        with self._lock:
+            for bucket, counts in self._buckets:
+                if bucket + self.bucket_seconds > now - window:
+                    merged.update(counts)
+        return merged
+
+    def collapsed(self, window: float, now: Optional[float] = None) -> str:
+        """Brendan Gregg's collapsed-stack format: "root;child;leaf count" per line."""
+        counts = self.stacks(window, now)
+        return "\n".join(f"{';'.join(stack)} {count}" for stack, count in sorted(counts.items()))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"sample_rate": self.sample_rate, "profiled_requests": self.profiled_requests,
+                    "samples": self.samples, "profiling_now": len(self._targets)}
+
+
+def _color(name: str) -> str:
+    # Stable warm colors per function, as in the classic flamegraph palette
+    value = (sum(ord(c) * (i + 1) for i, c in enumerate(name)) % 1000) / 1000.0
+    return f"rgb({205 + int(50 * value)},{int(230 * (1 - value))},{int(55 * value)})"
+
+
+def render_flamegraph(counts: Counter, title: str = "Flame graph", width: int = 1200, row_height: int = 16) -> str:
+    """Self-contained SVG flame graph (root at the bottom) of stack counts."""
+    root: Dict[str, Any] = {"count": 0, "children": {}}
+    depth = 0
+    for stack, count in counts.items():
+        node = root
+        node["count"] += count
+        for label in stack:
+            node = node["children"].setdefault(label, {"count": 0, "children": {}})
+            node["count"] += count
+        depth = max(depth, len(stack))
+    total = root["count"]
+    header = 2 * row_height
+    height = header + (depth + 1) * row_height
+    parts: List[str] = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+        f'font-family="Verdana" font-size="11">',
+        f'<rect width="{width}" height="{height}" fill="#ffffff"/>',
+        f'<text x="{width / 2}" y="{row_height}" text-anchor="middle" font-size="14">'
+        f'{html.escape(title)} ({total} samples)</text>'
+    ]
+
+    def draw(node: Dict[str, Any], x: float, level: int) -> None:
+        for label, child in sorted(node["children"].items()):
+            w = child["count"] / total * width
+            if w >= 0.5:
+                y = height - (level + 1) * row_height
+                tip = f"{label} ({child['count']} samples, {100.0 * child['count'] / total:.2f}%)"
+                parts.append(f'<g><title>{html.escape(tip)}</title>'
+                             f'<rect x="{x:.2f}" y="{y}" width="{w:.2f}" height="{row_height - 1}" '
+                             f'fill="{_color(label)}" rx="2"/>')
+                chars = int(w / 7)
+                if chars >= 3:
+                    text = label if len(label) <= chars else label[:chars - 2] + ".."
+                    parts.append(f'<text x="{x + 3:.2f}" y="{y + row_height - 4}">{html.escape(text)}</text>')
+                parts.append('</g>')
+                draw(child, x, level + 1)
+            x += w
+
+    if total:
+        draw(root, 0.0, 0)
+    parts.append('</svg>')
+    return "\n".join(parts)
+
+
+profiler = StackSampler()
@@ -0,0 +1,145 @@
+# src/projection.py
+import copy
+import re
+from typing import Dict, Any, List, Optional, Iterable
+from config.settings import config
+from src.value_dictionary import normalize_tokens
+
+# Questions that explicitly ask for whole documents get no default projection
+_FULL_DOCUMENT = re.compile(r"\b(all (the )?(details|fields|info|information|data)|everything|full|complete|entire)\b",
+                            re.IGNORECASE)
+
+
+def _top_level(field_name: str) -> str:
+    return field_name.split("[]")[0].split(".")[0]
+
+
+def _path(field_name: str) -> str:
+    """Profiler field name ("a[].b") as a projection path ("a.b")."""
+    return field_name.replace("[]", "")
+
+
+def _filter_fields(query_filter: Any) -> List[str]:
+    fields = []
+    if isinstance(query_filter, dict):
+        for key, condition in query_filter.items():
+            if key in ("$and", "$or", "$nor") and isinstance(condition, list):
+                for clause in condition:
+                    fields.extend(_filter_fields(clause))
+            elif not key.startswith("$"):
+                fields.append(key)
+    return fields
+
+
+def _sort_fields(sort: Any) -> List[str]:
+    if isinstance(sort, dict):
+        return list(sort)
+    if isinstance(sort, str):
+        return [sort]
+    if isinstance(sort, (list, tuple)):
+        return [item[0] for item in sort if isinstance(item, (list, tuple)) and item]
+    return []
+
+
+def bulky_fields(schema_fields: Dict[str, Dict[str, Any]], max_nested: Optional[int] = None) -> set:
+    """
+    Top-level fields too large to ship by default: arrays of sub-documents
+    and objects with many nested fields (e.g. customers.tier_and_details).
+    """
+    max_nested = config.PROJECTION_MAX_NESTED_FIELDS if max_nested is None else max_nested
+    nested: Dict[str, int] = {}
+    bulky = set()
+    for name in schema_fields:
+        top = _top_level(name)
+        if name.startswith(f"{top}[]."):
+            bulky.add(top)
+        if name != top and name != f"{top}[]":
+            nested[top] = nested.get(top, 0) + 1
+    bulky.update(top for top, count in nested.items() if count > max_nested)
+    return bulky
+
+
+def question_fields(question: str, schema_fields: Dict[str, Dict[str, Any]],
+                    bulky: Optional[set] = None) -> List[str]:
+    """
+    Schema fields named in the question ("their emails" -> email). Bulky
+    fields are matched on any word of their own name ("tiers" ->
+    tier_and_details), never on the fields nested inside them.
+    """
+    tokens = set(normalize_tokens(question))
+    bulky = bulky or set()
+    mentioned = []
+    for name in schema_fields:
+        top = _top_level(name)
+        if top in bulky:
+            matched = top if any(token in tokens for token in normalize_tokens(top)) else None
+        else:
+            leaf_tokens = normalize_tokens(_path(name).split(".")[-1])
+            matched = _path(name) if leaf_tokens and all(token in tokens for token in leaf_tokens) else None
+        if matched and matched not in mentioned:
+            mentioned.append(matched)
+    return mentioned
+
+
+def infer_projection(question: str, intent: Dict[str, Any], schema: Dict[str, Any],
+                     render_fields: Optional[Iterable[str]] = None,
+                     budget: Optional[int] = None) -> Optional[Dict[str, int]]:
+    """
+    Inclusion projection for a find intent that did not specify one.
+
+    Fields the query filters or sorts on, fields named in the question and
+    fields the client renders are always included; the rest of the field
+    budget is filled with the most frequent small top-level fields. Bulky
+    nested fields are only returned when asked for by name. Returns None
+    when whole documents should be returned.
+    """
+    budget = config.PROJECTION_FIELD_BUDGET if budget is None else budget
+    fields = schema.get("fields") or {}
+    if not fields or _FULL_DOCUMENT.search(question or ""):
+        return None
+    render_fields = config.PROJECTION_RENDER_FIELDS if render_fields is None else list(render_fields)
+    top_levels = {_top_level(name) for name in fields}
+    bulky = bulky_fields(fields)
+
+    required = []
+    for path in (_filter_fields(intent.get("filter")) + _sort_fields(intent.get("sort"))
+                 + question_fields(question, fields, bulky)
+                 + [f for f in render_fields if _top_level(f) in top_levels]):
+        if path != "_id" and not any(path == kept or path.startswith(kept + ".") for kept in required):
+            required = [kept for kept in required if not kept.startswith(path + ".")] + [path]
+
+    filler = sorted(
+        (name for name in fields if name == _top_level(name) and name not in bulky and name != "_id"),
+        key=lambda name: -fields[name].get("frequency", 0)
+    )
+    selected = list(required)
+    for name in filler:
+        if len(selected) >= budget:
+            break
+        if not any(name == kept or kept.startswith(name + ".") for kept in selected):
+            selected.append(name)
+    return {path: 1 for path in selected} if selected else None
+
+
+def apply_projection(intent: Dict[str, Any], question: str, schema: Dict[str, Any],
+                     override: Optional[Dict[str, Any]] = None,
+                     render_fields: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+    """
+    Find intent with its projection settled: a caller's `override` wins
+    ({} meaning whole documents), then a projection the LLM chose, then
+    the inferred default.
+    """
+    if intent.get("query_type") != "find":
+        return intent
+    if override is not None:
+        intent = copy.deepcopy(intent)
+        intent["projection"] = override
+        return intent
+    if intent.get("projection") or not config.PROJECTION_INFERENCE:
+        return intent
+    projection = infer_projection(question, intent, schema, render_fields)
+    if projection is None:
+        return intent
+    intent = copy.deepcopy(intent)
+    intent["projection"] = projection
+    return intent
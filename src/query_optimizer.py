@@ -0,0 +1,227 @@
+# src/query_optimizer.py
+import copy
+import hashlib
+import json
+from typing import Dict, Any, List, Optional, Set
+
+# Stages that reshape each document one-to-one without dropping or reordering them
+_ONE_TO_ONE_STAGES = ("$project", "$addFields", "$set", "$unset")
+_LOGICAL = ("$and", "$or", "$nor")
+_SCALARS = (str, int, float, bool, type(None))
+
+
+def _merge_filters(filters: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """AND several filters together, keeping top-level keys flat where they don't collide."""
+    merged: Dict[str, Any] = {}
+    extra: List[Dict[str, Any]] = []
+    for query_filter in filters:
+        for key, condition in query_filter.items():
+            if key == "$and":
+                extra.extend(condition)
+            elif key in merged:
+                extra.append({key: condition})
+            else:
+                merged[key] = condition
+    if extra:
+        merged = normalize_filter(dict(merged, **{"$and": extra}))
+    return merged
+
+
+def normalize_filter(query_filter: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Canonical form of a filter: nested $and flattened into the top level
+    where keys don't collide, single-clause $and/$or unwrapped, empty
+    clauses dropped, and {"f": {"$eq": scalar}} written as {"f": scalar}.
+    """
+    if not isinstance(query_filter, dict):
+        return query_filter or {}
+    result: Dict[str, Any] = {}
+    pending_and: List[Dict[str, Any]] = []
+    for key, condition in query_filter.items():
+        if key in _LOGICAL and isinstance(condition, list):
+            clauses = [normalize_filter(c) if isinstance(c, dict) else c for c in condition]
+            if key == "$and":
+                pending_and.extend(c for c in clauses if c != {})
+                continue
+            if key == "$or" and len(clauses) == 1 and isinstance(clauses[0], dict):
+                pending_and.append(clauses[0])
+                continue
+            result[key] = clauses
+        elif (isinstance(condition, dict) and list(condition) == ["$eq"]
+              and isinstance(condition["$eq"], _SCALARS)):
+            result[key] = condition["$eq"]
+        else:
+            result[key] = condition
+    leftover = []
+    for clause in pending_and:
+        if isinstance(clause, dict) and not any(key in result for key in clause):
+            result.update(clause)
+        else:
+            leftover.append(clause)
+    if leftover:
+        result["$and"] = leftover
+    return result
+
+
+def _filter_fields(query_filter: Dict[str, Any]) -> Optional[Set[str]]:
+    """Top-level field paths a filter reads, or None if it uses whole-document operators."""
+    fields: Set[str] = set()
+    for key, condition in query_filter.items():
+        if key in _LOGICAL and isinstance(condition, list):
+            for clause in condition:
+                nested = _filter_fields(clause) if isinstance(clause, dict) else None
+                if nested is None:
+                    return None
+                fields |= nested
+        elif key.startswith("$"):
+            return None  # $expr, $text, $where, ... depend on the whole document
+        else:
+            fields.add(key)
+    return fields
+
+
+def _overlaps(path: str, others: Set[str]) -> bool:
+    return any(path == other or path.startswith(other + ".") or other.startswith(path + ".")
+               for other in others)
+
+
+def _match_can_precede(stage: Dict[str, Any], match: Dict[str, Any]) -> bool:
+    """Whether `match` filters the same documents before `stage` as after it."""
+    fields = _filter_fields(match)
+    if fields is None:
+        return False
+    name, spec = next(iter(stage.items()))
+    if name == "$sort":
+        return True
+    if name == "$project":
+        if not isinstance(spec, dict):
+            return False
+        values = [v for k, v in spec.items() if k != "_id"]
+        if any(not isinstance(v, (bool, int)) for v in values) or not isinstance(spec.get("_id", 1), (bool, int)):
+            return False  # Computed fields rename or rewrite values
+        if any(values) and not all(values):
+            return False
+        excluded = {k for k, v in spec.items() if not v}
+        if values and all(values):
+            kept = {k for k, v in spec.items() if v}
+            if spec.get("_id", 1):
+                kept.add("_id")
+            return all(any(f == k or f.startswith(k + ".") for k in kept) for f in fields)
+        return not any(_overlaps(f, excluded) for f in fields)
+    if name in ("$addFields", "$set"):
+        return isinstance(spec, dict) and not any(_overlaps(f, set(spec)) for f in fields)
+    if name == "$unset":
+        removed = {spec} if isinstance(spec, str) else set(spec)
+        return not any(_overlaps(f, removed) for f in fields)
+    return False
+
+
+def _is_noop(stage: Dict[str, Any]) -> bool:
+    name, spec = next(iter(stage.items()))
+    return ((name == "$match" and spec == {})
+            or (name == "$skip" and spec == 0)
+            or (name in ("$addFields", "$set") and spec == {})
+            or (name == "$unset" and spec == []))
+
+
+def optimize_pipeline(pipeline: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Equivalent pipeline with filtering moved toward the source: no-op
+    stages dropped, $match stages pushed ahead of $sort and of
+    projections that don't touch their fields, adjacent $match/$limit/$skip
+    merged, and $limit moved ahead of one-to-one reshaping stages.
+    """
+    stages = [copy.deepcopy(stage) for stage in pipeline
+              if isinstance(stage, dict) and len(stage) == 1]
+    if len(stages) != len(pipeline):
+        return copy.deepcopy(pipeline)  # Malformed stages are left for the server to reject
+
+    changed = True
+    while changed:
+        changed = False
+        stages = [stage for stage in stages if not _is_noop(stage)]
+        for i in range(len(stages) - 1):
+            (first, first_spec), = stages[i].items()
+            (second, second_spec), = stages[i + 1].items()
+            if first == second == "$match":
+                stages[i:i + 2] = [{"$match": _merge_filters([first_spec, second_spec])}]
+            elif first == second == "$limit":
+                stages[i:i + 2] = [{"$limit": min(first_spec, second_spec)}]
+            elif first == second == "$skip":
+                stages[i:i + 2] = [{"$skip": first_spec + second_spec}]
+            elif second == "$match" and first in _ONE_TO_ONE_STAGES + ("$sort",) \
+                    and _match_can_precede(stages[i], second_spec):
+                stages[i], stages[i + 1] = stages[i + 1], stages[i]
+            elif second == "$limit" and first in _ONE_TO_ONE_STAGES:
+                stages[i], stages[i + 1] = stages[i + 1], stages[i]
+            else:
+                continue
+            changed = True
+            break
+    for stage in stages:
+        if "$match" in stage:
+            stage["$match"] = normalize_filter(stage["$match"])
+    return stages
+
+
+def optimize_intent(intent: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Canonical, equivalent form of an LLM intent: keys the query type does
+    not use are dropped, filters are normalized, pipelines optimized, and
+    aggregations that only count matching documents become count intents,
+    as do finds tagged "count_only" (the caller only takes the number of
+    rows). Their row limit is dropped: it capped the rows, not the count.
+    """
+    intent = copy.deepcopy(intent)
+    query_type = str(intent.get("query_type", "find")).strip().lower()
+    intent["query_type"] = query_type
+    if query_type == "error":
+        return intent
+
+    if query_type == "aggregate" and isinstance(intent.get("pipeline"), list):
+        pipeline = optimize_pipeline(intent["pipeline"])
+        intent["pipeline"] = pipeline
+        # [{$match}, {$count: name}] is a count_documents() call; like $count it returns no row for zero
+        if pipeline and "$count" in pipeline[-1] and isinstance(pipeline[-1]["$count"], str) \
+                and all("$match" in stage for stage in pipeline[:-1]) and len(pipeline) <= 2:
+            counted = {"query_type": "count",
+                       "filter": pipeline[0]["$match"] if len(pipeline) == 2 else {},
+                       "count_stage": True}
+            if pipeline[-1]["$count"] != "count":
+                counted["count_field"] = pipeline[-1]["$count"]
+            intent, query_type = counted, "count"
+
+    if query_type == "find" and intent.pop("count_only", False):
+        intent, query_type = {"query_type": "count", "filter": intent.get("filter")}, "count"
+
+    if query_type in ("find", "count", "distinct"):
+        intent["filter"] = normalize_filter(intent.get("filter"))
+        intent.pop("pipeline", None)
+    if query_type in ("count", "distinct"):
+        for key in ("projection", "sort", "limit"):
+            intent.pop(key, None)
+    if query_type == "find":
+        if not intent.get("projection"):
+            intent.pop("projection", None)
+        if not intent.get("sort"):
+            intent.pop("sort", None)
+    if query_type == "aggregate":
+        intent.pop("filter", None)
+        intent.pop("projection", None)
+    return intent
+
+
+def count_rows(intent: Dict[str, Any], count: int) -> List[Dict[str, Any]]:
+    """Result rows of a count intent. One rewritten from a $count pipeline keeps its empty result for zero."""
+    if count == 0 and intent.get("count_stage"):
+        return []
+    return [{intent.get("count_field", "count"): count}]
+
+
+def intent_key(collection_name: str, intent: Dict[str, Any]) -> str:
+    """Cache key shared by all intents with the same canonical form."""
+    canonical = optimize_intent(intent)
+    canonical.pop("resolved_by", None)  # How the intent was produced does not change its result
+    body = {"collection": collection_name, "intent": canonical}
+    encoded = json.dumps(body, sort_keys=True, default=str)
+    return hashlib.sha1(encoded.encode("utf-8")).hexdigest()
@@ -0,0 +1,502 @@
+# src/result_cache.py
+import copy
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+from config.settings import config
+from src.query_optimizer import optimize_intent
+
+
+class UnsupportedPredicate(Exception):
+    """The intent uses an operator that cannot be evaluated in-process."""
+
+
+_MISSING = object()
+
+
+def _type_class(value: Any) -> Optional[str]:
+    """Coarse BSON comparison class; values only compare within a class."""
+    if value is None:
+        return "null"
+    if isinstance(value, bool):
+        return "bool"
+    if isinstance(value, (int, float)):
+        return "number"
+    if isinstance(value, str):
+        return "string"
+    if isinstance(value, datetime):
+        return "date"
+    if isinstance(value, dict):
+        return "object"
+    if isinstance(value, list):
+        return "array"
+    return None
+
+
+# BSON sort order for mixed types (missing and null sort first)
+_SORT_RANK = {"null": 1, "number": 2, "string": 3, "object": 4, "array": 5, "bool": 8, "date": 9}
+
+
+def _resolve(doc: Any, path: str) -> List[Any]:
+    """
+    Values a dotted path reaches in a document. Arrays met along the way
+    fan out over their elements, as in MongoDB; a missing path yields [].
+    """
+    values = [doc]
+    for part in path.split("."):
+        next_values = []
+        for value in values:
+            if isinstance(value, dict):
+                if part in value:
+                    next_values.append(value[part])
+            elif isinstance(value, list):
+                if part.isdigit() and int(part) < len(value):
+                    next_values.append(value[int(part)])
+                else:
+                    next_values.extend(item[part] for item in value
+                                       if isinstance(item, dict) and part in item)
+        values = next_values
+    return values
+
+
+def _candidates(doc: Dict[str, Any], path: str) -> List[Any]:
+    """Resolved values plus the elements of any array values."""
+    candidates = []
+    for value in _resolve(doc, path):
+        candidates.append(value)
+        if isinstance(value, list):
+            candidates.extend(value)
+    return candidates
+
+
+def _equals(left: Any, right: Any) -> bool:
+    return _type_class(left) == _type_class(right) and left == right
+
+
+def _compare(left: Any, op: str, right: Any) -> bool:
+    if _type_class(right) in ("null", "object", "array", None):
+        raise UnsupportedPredicate(f"{op} on {type(right).__name__} is not evaluated in-process")
+    if _type_class(left) != _type_class(right):
+        return False
+    if op == "$gt":
+        return left > right
+    if op == "$gte":
+        return left >= right
+    if op == "$lt":
+        return left < right
+    return left <= right
+
+
+def _compile_regex(pattern: Any, options: str = "") -> "re.Pattern":
+    if not isinstance(pattern, str):
+        raise UnsupportedPredicate("$regex must be a string")
+    flags = 0
+    for option in options or "":
+        if option == "i":
+            flags |= re.IGNORECASE
+        elif option == "m":
+            flags |= re.MULTILINE
+        elif option == "s":
+            flags |= re.DOTALL
+        elif option == "x":
+            flags |= re.VERBOSE
+        else:
+            raise UnsupportedPredicate(f"Unsupported regex option: {option}")
+    try:
+        return re.compile(pattern, flags)
+    except re.error as e:
+        raise UnsupportedPredicate(f"Regex not supported in-process: {e}")
+
+
+def _match_value_equals(candidates: List[Any], value: Any) -> bool:
+    if value is None:
+        return not candidates or any(c is None for c in candidates)
+    return any(_equals(c, value) for c in candidates)
+
+
+def _match_operators(candidates: List[Any], condition: Dict[str, Any]) -> bool:
+    for op, operand in condition.items():
+        if op == "$options":
+            if "$regex" not in condition:
+                raise UnsupportedPredicate("$options without $regex")
+            continue
+        if op == "$eq":
+            ok = _match_value_equals(candidates, operand)
+        elif op == "$ne":
+            ok = not _match_value_equals(candidates, operand)
+        elif op in ("$gt", "$gte", "$lt", "$lte"):
+            ok = any(_compare(c, op, operand) for c in candidates)
+        elif op in ("$in", "$nin"):
+            if not isinstance(operand, list):
+                raise UnsupportedPredicate(f"{op} needs an array")
+            if any(not isinstance(item, (str, int, float, bool, type(None), datetime)) for item in operand):
+                raise UnsupportedPredicate(f"{op} with non-scalar values")
+            ok = any(_match_value_equals(candidates, item) for item in operand)
+            if op == "$nin":
+                ok = not ok
+        elif op == "$exists":
+            ok = bool(candidates) == bool(operand)
+        elif op == "$regex":
+            regex = _compile_regex(operand, condition.get("$options", ""))
+            ok = any(isinstance(c, str) and regex.search(c) for c in candidates)
+        elif op == "$size":
+            ok = any(isinstance(c, list) and len(c) == operand for c in candidates)
+        elif op == "$all":
+            if not isinstance(operand, list):
+                raise UnsupportedPredicate("$all needs an array")
+            ok = all(_match_value_equals(candidates, item) for item in operand)
+        elif op == "$not":
+            if not isinstance(operand, dict):
+                raise UnsupportedPredicate("$not needs an operator expression")
+            ok = not _match_operators(candidates, operand)
+        else:
+            raise UnsupportedPredicate(f"Operator {op} is not evaluated in-process")
+        if not ok:
+            return False
+    return True
+
+
+def _find_limit(intent: Dict[str, Any]) -> Optional[int]:
+    """The limit a find intent runs with (DB_QUERY_LIMIT when absent or null); None when it is not an integer."""
+    limit = intent.get("limit")
+    if limit is None:
+        return config.DB_QUERY_LIMIT
+    if isinstance(limit, bool) or not isinstance(limit, int):
+        return None
+    return limit
+
+
+def matches(doc: Dict[str, Any], query_filter: Dict[str, Any]) -> bool:
+    """
+    Evaluate a MongoDB filter against one document. Covers the comparison,
+    set, regex and logical operators the prompt produces; anything else
+    raises UnsupportedPredicate so the caller can go to MongoDB instead.
+    """
+    for key, condition in (query_filter or {}).items():
+        if key in ("$and", "$or", "$nor"):
+            if not isinstance(condition, list) or not condition:
+                raise UnsupportedPredicate(f"{key} needs a non-empty array")
+            results = (matches(doc, clause) for clause in condition)
+            if key == "$and":
+                ok = all(results)
+            elif key == "$or":
+                ok = any(results)
+            else:
+                ok = not any(results)
+        elif key.startswith("$"):
+            raise UnsupportedPredicate(f"Operator {key} is not evaluated in-process")
+        elif isinstance(condition, dict) and condition and all(k.startswith("$") for k in condition):
+            ok = _match_operators(_candidates(doc, key), condition)
+        elif isinstance(condition, dict) and any(k.startswith("$") for k in condition):
+            raise UnsupportedPredicate(f"Mixed operators and fields for {key}")
+        else:
+            ok = _match_value_equals(_candidates(doc, key), condition)
+        if not ok:
+            return False
+    return True
+
+
+def _projection_mode(projection: Optional[Dict[str, Any]]) -> Tuple[Optional[bool], Dict[str, Any]]:
+    """(True for inclusion, False for exclusion, None for full documents), fields."""
+    fields = {k: v for k, v in (projection or {}).items() if k != "_id"}
+    if any(not isinstance(v, (bool, int)) for v in fields.values()):
+        raise UnsupportedPredicate("Projection operators are not evaluated in-process")
+    if not fields:
+        return None, fields
+    if all(fields.values()):
+        return True, fields
+    if not any(fields.values()):
+        return False, fields
+    raise UnsupportedPredicate("Projection mixes inclusion and exclusion")
+
+
+def _include_path(source: Any, target: Dict[str, Any], parts: List[str]) -> None:
+    head = parts[0]
+    if isinstance(source, list):
+        raise UnsupportedPredicate("Projection through arrays is not evaluated in-process")
+    if not isinstance(source, dict) or head not in source:
+        return
+    if len(parts) == 1:
+        target[head] = copy.deepcopy(source[head])
+    elif isinstance(source[head], dict):
+        child = target.setdefault(head, {})
+        _include_path(source[head], child, parts[1:])
+    elif isinstance(source[head], list):
+        raise UnsupportedPredicate("Projection through arrays is not evaluated in-process")
+
+
+def _exclude_path(target: Dict[str, Any], parts: List[str]) -> None:
+    if len(parts) == 1:
+        target.pop(parts[0], None)
+    elif isinstance(target.get(parts[0]), dict):
+        _exclude_path(target[parts[0]], parts[1:])
+    elif isinstance(target.get(parts[0]), list):
+        raise UnsupportedPredicate("Projection through arrays is not evaluated in-process")
+
+
+def project(doc: Dict[str, Any], projection: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Apply an inclusion or exclusion projection the way find() does."""
+    mode, fields = _projection_mode(projection)
+    keep_id = bool((projection or {}).get("_id", 1))
+    if mode is True:
+        result = {"_id": doc["_id"]} if keep_id and "_id" in doc else {}
+        for path in fields:
+            _include_path(doc, result, path.split("."))
+        return result
+    result = copy.deepcopy(doc)
+    if not keep_id:
+        result.pop("_id", None)
+    if mode is False:
+        for path in fields:
+            _exclude_path(result, path.split("."))
+    return result
+
+
+def _sort_spec(sort: Any) -> List[Tuple[str, int]]:
+    if isinstance(sort, dict):
+        items = list(sort.items())
+    elif isinstance(sort, str):
+        items = [(sort, 1)]
+    elif isinstance(sort, (list, tuple)):
+        items = [tuple(item) for item in sort]
+    else:
+        raise UnsupportedPredicate("Unrecognized sort specification")
+    spec = []
+    for field, direction in items:
+        if direction not in (1, -1):
+            raise UnsupportedPredicate("Only ascending/descending sorts are evaluated in-process")
+        spec.append((field, direction))
+    return spec
+
+
+def _sort_key(doc: Dict[str, Any], field: str) -> Tuple[int, Any]:
+    values = _resolve(doc, field)
+    if not values:
+        return (1, 0)
+    if len(values) > 1 or isinstance(values[0], list):
+        raise UnsupportedPredicate("Sorting on array fields is not evaluated in-process")
+    value = values[0]
+    kind = _type_class(value)
+    if kind not in _SORT_RANK or kind == "object":
+        raise UnsupportedPredicate(f"Cannot sort on {type(value).__name__} in-process")
+    return (_SORT_RANK[kind], 0 if value is None else value)
+
+
+def sort_documents(docs: List[Dict[str, Any]], sort: Any) -> List[Dict[str, Any]]:
+    ordered = list(docs)
+    for field, direction in reversed(_sort_spec(sort)):
+        ordered.sort(key=lambda doc: _sort_key(doc, field), reverse=direction == -1)
+    return ordered
+
+
+def filter_narrows(previous: Optional[Dict[str, Any]], current: Optional[Dict[str, Any]]) -> bool:
+    """
+    True when every document matching `current` also matches `previous`,
+    judged syntactically: `current` repeats each of the previous conditions
+    (possibly with extra operators or inside an $and) and may add more.
+    """
+    previous = previous or {}
+    current = current or {}
+    if not previous or previous == current:
+        return True
+    clauses = [current]
+    if isinstance(current.get("$and"), list):
+        clauses.extend(c for c in current["$and"] if isinstance(c, dict))
+
+    def covered(key: str, condition: Any) -> bool:
+        for clause in clauses:
+            if key not in clause:
+                continue
+            candidate = clause[key]
+            if candidate == condition:
+                return True
+            if (isinstance(condition, dict) and isinstance(candidate, dict) and condition
+                    and all(k.startswith("$") for k in condition)
+                    and all(candidate.get(k, _MISSING) == v for k, v in condition.items())):
+                return True
+        return False
+
+    if list(previous) == ["$and"] and isinstance(previous["$and"], list):
+        return all(filter_narrows(clause, current) for clause in previous["$and"])
+    return all(covered(key, condition) for key, condition in previous.items())
+
+
+def _referenced_fields(query_filter: Any) -> List[str]:
+    fields = []
+    if isinstance(query_filter, dict):
+        for key, condition in query_filter.items():
+            if key in ("$and", "$or", "$nor") and isinstance(condition, list):
+                for clause in condition:
+                    fields.extend(_referenced_fields(clause))
+            elif not key.startswith("$"):
+                fields.append(key)
+    return fields
+
+
+def _fields_available(projection: Optional[Dict[str, Any]], fields: List[str]) -> bool:
+    """Whether rows stored under `projection` still carry every field in `fields`."""
+    mode, projected = _projection_mode(projection)
+    for field in fields:
+        if field.split(".")[0] == "_id":
+            # Cached ids were stringified and no longer compare like ObjectIds
+            return False
+        if mode is True and not any(field == p or field.startswith(p + ".") for p in projected):
+            return False
+        if mode is False and any(field == p or field.startswith(p + ".") or p.startswith(field + ".")
+                                 for p in projected):
+            return False
+    return True
+
+
+class SessionResultCache:
+    """
+    The last complete find() result per session. Follow-up intents whose
+    filter equals or narrows the cached one (different projection, a count,
+    a distinct, or extra predicates) are answered from these rows in-process
+    instead of querying MongoDB again. Entries expire after `ttl` seconds so
+    drill-downs never read data older than that.
+    """
+
+    def __init__(self, ttl: Optional[float] = None, max_rows: Optional[int] = None,
+                 max_sessions: Optional[int] = None):
+        self.ttl = config.RESULT_CACHE_TTL if ttl is None else ttl
+        self.max_rows = config.RESULT_CACHE_MAX_ROWS if max_rows is None else max_rows
+        self.max_sessions = config.RESULT_CACHE_MAX_SESSIONS if max_sessions is None else max_sessions
+        self._sessions: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _session(self, session_id: str) -> Dict[str, Any]:
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = self._sessions[session_id] = {"last_intent": None, "result": None}
+        self._sessions.move_to_end(session_id)
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+        return session
+
+    def context(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Previous turn's intent in the shape parse_query() expects."""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            intent = session and session["last_intent"]
+        if not intent:
+            return None
+        return {
+            "last_filter": intent.get("filter") or {},
+            "last_query_type": intent.get("query_type"),
+            "last_projection": intent.get("projection") or {}
+        }
+
+    def remember(self, session_id: str, collection_name: str, intent: Dict[str, Any],
+                 rows: Optional[List[Dict[str, Any]]] = None) -> None:
+        """
+        Record the turn's intent as context for the next one and, for a
+        find() result from MongoDB that came back under its limit (so it is
+        the complete match set), keep the rows for reuse.
+        """
+        intent = optimize_intent(intent)
+        with self._lock:
+            session = self._session(session_id)
+            session["last_intent"] = copy.deepcopy(intent)
+            if rows is None or intent.get("query_type") != "find":
+                return
+            limit = _find_limit(intent)
+            if limit is None:
+                return
+            complete = limit <= 0 or len(rows) < limit
+            if complete and len(rows) <= self.max_rows:
+                session["result"] = {
+                    "collection": collection_name,
+                    "filter": copy.deepcopy(intent.get("filter") or {}),
+                    "projection": copy.deepcopy(intent.get("projection") or {}),
+                    "rows": copy.deepcopy(rows),
+                    "stored_at": time.monotonic()
+                }
+
+    def answer(self, session_id: str, collection_name: str,
+               intent: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
+        """
+        Result rows for `intent` computed from the cached result set, or
+        None when MongoDB has to be queried.
+        """
+        intent = optimize_intent(intent)
+        with self._lock:
+            session = self._sessions.get(session_id)
+            cached = session and session["result"]
+        try:
+            rows = self._evaluate(cached, collection_name, intent) if cached else None
+        except UnsupportedPredicate:
+            rows = None
+        with self._lock:
+            if rows is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return rows
+
+    def _evaluate(self, cached: Dict[str, Any], collection_name: str,
+                  intent: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
+        if cached["collection"] != collection_name or time.monotonic() - cached["stored_at"] > self.ttl:
+            return None
+        query_type = intent.get("query_type")
+        if query_type not in ("find", "count", "distinct"):
+            return None
+        query_filter = intent.get("filter") or {}
+        if not filter_narrows(cached["filter"], query_filter):
+            return None
+
+        needed = _referenced_fields(query_filter)
+        if query_type == "find":
+            mode, fields = _projection_mode(intent.get("projection"))
+            needed += [field for field, _ in _sort_spec(intent["sort"])] if intent.get("sort") else []
+            if mode is True:
+                needed += list(fields)
+            elif _projection_mode(cached["projection"])[0] is not None:
+                return None  # Full documents requested but only a subset is cached
+            if (intent.get("projection") or {}).get("_id", 1) and not cached["projection"].get("_id", 1):
+                return None
+        elif query_type == "distinct":
+            if not intent.get("field"):
+                return None
+            needed.append(intent["field"])
+        if not _fields_available(cached["projection"], needed):
+            return None
+
+        matched = [doc for doc in cached["rows"] if matches(doc, query_filter)]
+        if query_type == "count":
+            return [{"count": len(matched)}]
+        if query_type == "distinct":
+            return [_distinct(matched, intent["field"])]
+        if intent.get("sort"):
+            matched = sort_documents(matched, intent["sort"])
+        limit = _find_limit(intent)
+        if limit is None:
+            raise UnsupportedPredicate(f"limit {intent['limit']!r} is not an integer")
+        if limit > 0:
+            matched = matched[:limit]
+        return [project(doc, intent.get("projection")) for doc in matched]
+
+    def invalidate(self, session_id: str) -> None:
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"sessions": len(self._sessions), "hits": self.hits, "misses": self.misses}
+
+
+def _distinct(docs: List[Dict[str, Any]], field: str) -> Dict[str, Any]:
+    values = []
+    for doc in docs:
+        for value in _resolve(doc, field):
+            for item in (value if isinstance(value, list) else [value]):
+                if isinstance(item, (dict, list)):
+                    raise UnsupportedPredicate("distinct over documents is not evaluated in-process")
+                if not any(_equals(item, seen) for seen in values):
+                    values.append(item)
+    return {"field": field, "distinct_values": values, "count": len(values)}
@@ -0,0 +1,83 @@
+# src/result_digest.py
+import hashlib
+import json
+import logging
+import zlib
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+from bson import Binary, ObjectId
+from config.settings import config
+
+
+def _encode(row: Any) -> bytes:
+    return json.dumps(row, sort_keys=True, separators=(",", ":"), default=str).encode("utf-8")
+
+
+def digest_results(rows: List[Any], preview_rows: Optional[int] = None,
+                   preview_bytes: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Compact description of a result set for analytics events: row count,
+    encoded size, a hash that is equal for equal results (same rows, same
+    order), and the leading rows that fit in `preview_rows` and
+    `preview_bytes`.
+    """
+    preview_rows = config.ANALYTICS_PREVIEW_ROWS if preview_rows is None else preview_rows
+    preview_bytes = config.ANALYTICS_PREVIEW_BYTES if preview_bytes is None else preview_bytes
+    hasher = hashlib.sha256()
+    size = 0
+    preview: List[Any] = []
+    preview_size = 0
+    previewing = True
+    for row in rows:
+        encoded = _encode(row)
+        hasher.update(encoded)
+        hasher.update(b"\n")
+        size += len(encoded)
+        if previewing and len(preview) < preview_rows and preview_size + len(encoded) <= preview_bytes:
+            preview.append(row)
+            preview_size += len(encoded)
+        else:
+            previewing = False  # The preview is always a prefix of the results
+    return {
+        "count": len(rows),
+        "bytes": size,
+        "hash": hasher.hexdigest(),
+        "preview": preview,
+        "preview_truncated": len(preview) < len(rows)
+    }
+
+
+class ResultPayloadStore:
+    """
+    Full result sets, zlib-compressed, in a side collection whose TTL index
+    removes them after `ttl` seconds. Events reference them by `payload_id`.
+    Payloads still over `max_bytes` compressed are not stored.
+    """
+
+    def __init__(self, collection, ttl: Optional[int] = None, max_bytes: Optional[int] = None):
+        self.collection = collection
+        self.ttl = ttl or config.ANALYTICS_PAYLOAD_TTL
+        self.max_bytes = max_bytes or config.ANALYTICS_PAYLOAD_MAX_BYTES
+        self.logger = logging.getLogger(__name__)
+        try:
+            self.collection.create_index("created_at", expireAfterSeconds=self.ttl)
+        except Exception as e:
+            self.logger.warning(f"Could not create TTL index on {self.collection.name}: {str(e)}")
+
+    def save(self, rows: List[Any], result_hash: str) -> Optional[ObjectId]:
+        data = zlib.compress(b"[" + b",".join(_encode(row) for row in rows) + b"]")
+        if len(data) > self.max_bytes:
+            self.logger.warning(f"Result payload of {len(data)} compressed bytes not stored")
+            return None
+        return self.collection.insert_one({
+            "created_at": datetime.utcnow(),
+            "hash": result_hash,
+            "encoding": "zlib+json",
+            "data": Binary(data)
+        }).inserted_id
+
+    def load(self, payload_id: ObjectId) -> Optional[List[Any]]:
+        document = self.collection.find_one({"_id": payload_id})
+        if document is None:
+            return None
+        return json.loads(zlib.decompress(document["data"]))
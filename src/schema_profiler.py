@@ -0,0 +1,181 @@
+# src/schema_profiler.py
+import hashlib
+import math
+from typing import Dict, Any, List, Optional, Iterable, Tuple
+from config.settings import config
+
+
+def _value_key(value: Any) -> bytes:
+    return f"{type(value).__name__}:{value}".encode("utf-8", "replace")
+
+
+class HyperLogLog:
+    """
+    Fixed-size distinct-count sketch. With the default precision (2^10
+    registers, 1KB) the standard error is about 3%.
+    """
+
+    def __init__(self, precision: int = 10):
+        self.precision = precision
+        self.m = 1 << precision
+        self.registers = bytearray(self.m)
+        self.alpha = 0.7213 / (1 + 1.079 / self.m)
+
+    def add(self, value: Any) -> None:
+        x = int.from_bytes(hashlib.blake2b(_value_key(value), digest_size=8).digest(), "big")
+        index = x >> (64 - self.precision)
+        remainder = x & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - remainder.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def count(self) -> int:
+        estimate = self.alpha * self.m * self.m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * self.m and zeros:
+            # Linear counting is more accurate for small cardinalities
+            estimate = self.m * math.log(self.m / zeros)
+        return int(round(estimate))
+
+
+class TopK:
+    """
+    Space-Saving heavy hitters: bounded memory, approximate top-k counts.
+    Each entry remembers the count it inherited on eviction so ranking uses
+    the guaranteed (lower-bound) count rather than the overestimate.
+    """
+
+    def __init__(self, k: int = 5, capacity: Optional[int] = None):
+        self.k = k
+        self.capacity = capacity or k * 8
+        self.counts: Dict[Tuple[str, Any], int] = {}
+        self.errors: Dict[Tuple[str, Any], int] = {}
+
+    def add(self, value: Any) -> None:
+        # Keyed by type too, so True and 1 (equal and same hash) are counted apart
+        key = (type(value).__name__, value)
+        if key in self.counts:
+            self.counts[key] += 1
+        elif len(self.counts) < self.capacity:
+            self.counts[key] = 1
+            self.errors[key] = 0
+        else:
+            evicted = min(self.counts, key=self.counts.get)
+            inherited = self.counts.pop(evicted)
+            del self.errors[evicted]
+            self.counts[key] = inherited + 1
+            self.errors[key] = inherited
+
+    def top(self) -> List[Dict[str, Any]]:
+        guaranteed = {key: count - self.errors[key] for key, count in self.counts.items()}
+        ranked = sorted(guaranteed.items(), key=lambda item: item[1], reverse=True)[:self.k]
+        return [{"value": value, "count": count} for (_, value), count in ranked]
+
+
+class FieldProfile:
+    """Bounded per-field statistics: types, presence, distinct, top-k, min/max."""
+
+    # Long free text is counted but not kept as a value hint
+    MAX_HINT_LENGTH = 100
+
+    def __init__(self, top_k: int):
+        self.types = set()
+        self.count = 0
+        self.values = 0
+        self.distinct = HyperLogLog()
+        self.top_values = TopK(top_k)
+        self.min = None
+        self.max = None
+
+    def add_value(self, value: Any) -> None:
+        self.types.add(type(value).__name__)
+        if value is None:
+            return
+        self.values += 1
+        self.distinct.add(value)
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            if self.min is None or value < self.min:
+                self.min = value
+            if self.max is None or value > self.max:
+                self.max = value
+        if not isinstance(value, str) or len(value) <= self.MAX_HINT_LENGTH:
+            try:
+                self.top_values.add(value)
+            except TypeError:
+                pass  # Unhashable scalar types are only counted
+
+    def summary(self, documents: int) -> Dict[str, Any]:
+        info = {
+            "type": sorted(self.types),
+            "count": self.count,
+            "frequency": self.count / documents if documents else 0.0
+        }
+        if self.values:
+            top_values = self.top_values.top()
+            info["distinct_estimate"] = min(self.distinct.count(), self.values)
+            info["top_values"] = top_values
+            info["sample_values"] = [entry["value"] for entry in top_values]
+        if self.min is not None:
+            info["min"] = self.min
+            info["max"] = self.max
+        return info
+
+
+class SchemaProfiler:
+    """
+    Streaming schema profiler. Documents are walked iteratively (no
+    recursion), every array element is inspected up to `array_cap`, and each
+    field keeps fixed-size sketches, so profiling cost grows linearly with
+    the sample and memory stays bounded per field.
+
+    Field names follow the extractor's convention: nested keys are joined
+    with '.', and array elements live under '<field>[]'.
+    """
+
+    def __init__(self, array_cap: Optional[int] = None, top_k: Optional[int] = None):
+        self.array_cap = array_cap or config.SCHEMA_ARRAY_ELEMENT_CAP
+        self.top_k = top_k or config.SCHEMA_TOP_K
+        self.documents = 0
+        self.fields: Dict[str, FieldProfile] = {}
+
+    def _field(self, name: str) -> FieldProfile:
+        profile = self.fields.get(name)
+        if profile is None:
+            profile = self.fields[name] = FieldProfile(self.top_k)
+        return profile
+
+    def add(self, doc: Dict[str, Any]) -> None:
+        self.documents += 1
+        seen = set()
+        stack = [(key, value) for key, value in reversed(list(doc.items())) if key != "_id"]
+        while stack:
+            name, value = stack.pop()
+            profile = self._field(name)
+            if name not in seen:
+                # Presence is counted once per document, however many elements match
+                seen.add(name)
+                profile.count += 1
+
+            if isinstance(value, dict):
+                profile.types.add("object")
+                stack.extend((f"{name}.{key}", child) for key, child in reversed(list(value.items()))
+                             if key != "_id")
+            elif isinstance(value, list):
+                profile.types.add("array")
+                element_name = f"{name}[]"
+                for element in reversed(value[:self.array_cap]):
+                    if isinstance(element, dict):
+                        stack.extend((f"{element_name}.{key}", child)
+                                     for key, child in reversed(list(element.items())) if key != "_id")
+                    else:
+                        stack.append((element_name, element))
+            else:
+                profile.add_value(value)
+
+    def add_many(self, docs: Iterable[Dict[str, Any]]) -> "SchemaProfiler":
+        for doc in docs:
+            self.add(doc)
+        return self
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        return {name: profile.summary(self.documents) for name, profile in self.fields.items()}
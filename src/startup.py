@@ -0,0 +1,112 @@
+# src/startup.py
+import threading
+import time
+import logging
+from datetime import datetime
+from typing import Dict, Any, List, Callable, Optional
+from config.settings import config
+
+
+class StartupState:
+    """
+    Thread-safe record of startup progress, reported by the readiness
+    endpoint while services come up in the background.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.phase = "starting"
+        self.ready = False
+        self.connect_attempts = 0
+        self.last_error: Optional[str] = None
+        self.warmup: Dict[str, str] = {}
+        self.started_at = datetime.utcnow()
+        self.ready_at: Optional[datetime] = None
+
+    def set_phase(self, phase: str) -> None:
+        with self._lock:
+            self.phase = phase
+
+    def record_attempt(self, error: Optional[str] = None) -> None:
+        with self._lock:
+            self.connect_attempts += 1
+            self.last_error = error
+
+    def fail(self, error: str) -> None:
+        with self._lock:
+            self.phase = "failed"
+            self.last_error = error
+
+    def mark_ready(self) -> None:
+        with self._lock:
+            self.ready = True
+            self.ready_at = datetime.utcnow()
+
+    def set_warmup(self, collection_name: str, status: str) -> None:
+        with self._lock:
+            self.warmup[collection_name] = status
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            done = sum(1 for status in self.warmup.values() if status != "pending")
+            return {
+                "ready": self.ready,
+                "phase": self.phase,
+                "connect_attempts": self.connect_attempts,
+                "last_error": self.last_error,
+                "warmup": {
+                    "completed": done,
+                    "total": len(self.warmup),
+                    "collections": dict(self.warmup)
+                },
+                "started_at": self.started_at.isoformat(),
+                "ready_at": self.ready_at.isoformat() if self.ready_at else None
+            }
+
+
+def connect_with_retries(db_manager, state: StartupState, max_attempts: Optional[int] = None,
+                         base_delay: Optional[float] = None, max_delay: Optional[float] = None,
+                         sleep: Callable[[float], None] = time.sleep) -> bool:
+    """
+    Call db_manager.connect() with capped exponential backoff so a MongoDB
+    blip during startup delays readiness instead of killing the process.
+    max_attempts=0 retries forever.
+    """
+    max_attempts = config.STARTUP_MAX_ATTEMPTS if max_attempts is None else max_attempts
+    delay = config.STARTUP_RETRY_BASE_DELAY if base_delay is None else base_delay
+    max_delay = config.STARTUP_RETRY_MAX_DELAY if max_delay is None else max_delay
+
+    attempt = 0
+    while True:
+        attempt += 1
+        if db_manager.connect():
+            state.record_attempt()
+            return True
+        state.record_attempt(f"MongoDB connection attempt {attempt} failed")
+        if max_attempts and attempt >= max_attempts:
+            return False
+        sleep(delay)
+        delay = min(delay * 2, max_delay)
+
+
+def warm_collections(db_manager, collections: List[str], state: StartupState,
+                     max_workers: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Extract schemas for all collections in one parallel pass and cache a
+    sample document for each, recording per-collection progress.
+    """
+    logger = logging.getLogger(__name__)
+    for collection_name in collections:
+        state.set_warmup(collection_name, "pending")
+
+    def on_complete(collection_name: str, schema: Dict[str, Any]) -> None:
+        try:
+            db_manager.get_sample_document(collection_name)
+            state.set_warmup(collection_name, "failed" if "error" in schema else "done")
+        except Exception as e:
+            logger.warning(f"Warm-up failed for {collection_name}: {str(e)}")
+            state.set_warmup(collection_name, "failed")
+
+    result = db_manager.extract_schemas(collections, max_workers=max_workers, on_complete=on_complete)
+    logger.info(f"Warmed {len(collections)} collections in {result['total_seconds']:.2f}s")
+    return result
@@ -0,0 +1,314 @@
+# src/value_dictionary.py
+import json
+import re
+import threading
+import time
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Iterable, Tuple
+from config.settings import config
+
+US_STATES = {
+    "alabama": "AL", "alaska": "AK", "arizona": "AZ", "arkansas": "AR",
+    "california": "CA", "colorado": "CO", "connecticut": "CT", "delaware": "DE",
+    "florida": "FL", "georgia": "GA", "hawaii": "HI", "idaho": "ID",
+    "illinois": "IL", "indiana": "IN", "iowa": "IA", "kansas": "KS",
+    "kentucky": "KY", "louisiana": "LA", "maine": "ME", "maryland": "MD",
+    "massachusetts": "MA", "michigan": "MI", "minnesota": "MN", "mississippi": "MS",
+    "missouri": "MO", "montana": "MT", "nebraska": "NE", "nevada": "NV",
+    "new hampshire": "NH", "new jersey": "NJ", "new mexico": "NM", "new york": "NY",
+    "north carolina": "NC", "north dakota": "ND", "ohio": "OH", "oklahoma": "OK",
+    "oregon": "OR", "pennsylvania": "PA", "rhode island": "RI", "south carolina": "SC",
+    "south dakota": "SD", "tennessee": "TN", "texas": "TX", "utah": "UT",
+    "vermont": "VT", "virginia": "VA", "washington": "WA", "west virginia": "WV",
+    "wisconsin": "WI", "wyoming": "WY"
+}
+
+
+def _stem(token: str) -> str:
+    # Plural-insensitive matching ("derivatives" ~ "derivative", "commodities" ~ "commodity")
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    return token[:-1] if len(token) > 3 and token.endswith("s") and not token.endswith("ss") else token
+
+
+# Words a question may contain around the values without changing its meaning,
+# used to decide whether the no-LLM path explains the whole question
+_FILLER_WORDS = {
+    "how", "many", "count", "number", "of", "show", "list", "find", "get", "display", "give",
+    "me", "all", "the", "are", "is", "there", "in", "from", "with", "who", "which", "that",
+    "have", "has", "a", "an", "whose", "for", "living", "residing", "located", "based",
+    "or", "and", "s", "do", "does", "we", "please", "any", "every", "total"
+}
+_FILLER_WORDS = {_stem(word) for word in _FILLER_WORDS}
+_COUNT_PREFIX = re.compile(r"^\s*(how many|count|number of|total number of)\b", re.IGNORECASE)
+_FIND_PREFIX = re.compile(r"^\s*(show|list|find|get|display|give)\b", re.IGNORECASE)
+
+
+def normalize_tokens(text: str) -> List[str]:
+    """Lowercase word tokens, with camelCase and snake_case split apart."""
+    text = re.sub(r"([a-z0-9])([A-Z])", r"\1 \2", str(text))
+    return [_stem(token) for token in re.findall(r"[a-z0-9]+", text.lower())]
+
+
+@dataclass
+class ValueMatch:
+    field: str
+    value: Any
+    predicate: Any
+    phrase: str
+    start: int
+    end: int
+
+
+class ValueMatcher:
+    """
+    Token trie over the normalized phrases of known field values. A scan
+    finds the longest phrase starting at each token, so matching costs
+    O(tokens x longest phrase) no matter how many values are loaded.
+    """
+
+    _TERMINAL = "\0"
+
+    def __init__(self):
+        self.root: Dict[str, Any] = {}
+        self.size = 0
+
+    def add(self, phrase: str, field: str, value: Any, predicate: Any = None) -> None:
+        tokens = normalize_tokens(phrase)
+        if not tokens or all(token in _FILLER_WORDS or len(token) < 2 for token in tokens):
+            return  # Would match ordinary words in every question
+        node = self.root
+        for token in tokens:
+            node = node.setdefault(token, {})
+        entries = node.setdefault(self._TERMINAL, [])
+        entry = (field, value, value if predicate is None else predicate)
+        if entry not in entries:
+            entries.append(entry)
+            self.size += 1
+
+    def extend(self, other: "ValueMatcher") -> "ValueMatcher":
+        stack = [(other.root, [])]
+        while stack:
+            node, tokens = stack.pop()
+            for token, child in node.items():
+                if token == self._TERMINAL:
+                    for field, value, predicate in child:
+                        self.add(" ".join(tokens), field, value, predicate)
+                else:
+                    stack.append((child, tokens + [token]))
+        return self
+
+    def match(self, text: str) -> List[ValueMatch]:
+        """Non-overlapping longest matches, left to right."""
+        tokens = normalize_tokens(text)
+        matches = []
+        position = 0
+        while position < len(tokens):
+            node, longest = self.root, None
+            for end in range(position, len(tokens)):
+                node = node.get(tokens[end])
+                if node is None:
+                    break
+                if self._TERMINAL in node:
+                    longest = (end + 1, node[self._TERMINAL])
+            if longest is None:
+                position += 1
+                continue
+            end, entries = longest
+            phrase = " ".join(tokens[position:end])
+            matches.extend(ValueMatch(field, value, predicate, phrase, position, end)
+                           for field, value, predicate in entries)
+            position = end
+        return matches
+
+
+def predicates_for(matches: Iterable[ValueMatch]) -> Dict[str, Any]:
+    """
+    Filter for a set of matches: values of different fields are ANDed,
+    several values of one field are alternatives ($in, or $or for
+    operator predicates).
+    """
+    by_field: Dict[str, List[Any]] = {}
+    for match in matches:
+        predicates = by_field.setdefault(match.field, [])
+        if match.predicate not in predicates:
+            predicates.append(match.predicate)
+    clauses = []
+    for field, predicates in by_field.items():
+        if len(predicates) == 1:
+            clauses.append({field: predicates[0]})
+        elif all(not isinstance(p, dict) for p in predicates):
+            clauses.append({field: {"$in": predicates}})
+        else:
+            clauses.append({"$or": [{field: p} for p in predicates]})
+    query_filter: Dict[str, Any] = {}
+    for clause in clauses:
+        if any(key in query_filter for key in clause):
+            query_filter.setdefault("$and", []).append(clause)
+        else:
+            query_filter.update(clause)
+    return query_filter
+
+
+def describe_matches(matches: List[ValueMatch]) -> str:
+    """Prompt line listing the exact field/value pairs found in the question."""
+    if not matches:
+        return ""
+    pairs = [f"'{match.phrase}' -> {json.dumps({match.field: match.predicate}, default=str)}" for match in matches]
+    return "Values recognized in the question (use these exact field/value filters): " + "; ".join(pairs) + "\n"
+
+
+def asks_for_count(text: str) -> bool:
+    """Whether a question only wants the number of matching documents ("how many ...", "count ...")."""
+    return bool(_COUNT_PREFIX.match(text))
+
+
+def resolve_without_llm(text: str, collection_name: str, matcher: ValueMatcher) -> Optional[Dict[str, Any]]:
+    """
+    Intent for simple "how many ..." / "show ..." questions that the value
+    dictionary explains completely: every word is a known value, the
+    collection name, a matched field's name, or filler. Anything else
+    (numbers, comparisons, references to earlier turns, ambiguous values)
+    returns None and goes to the LLM.
+    """
+    if asks_for_count(text):
+        query_type = "count"
+    elif _FIND_PREFIX.match(text):
+        query_type = "find"
+    else:
+        return None
+    matches = matcher.match(text)
+    if not matches:
+        return None
+    spans: Dict[Tuple[int, int], set] = {}
+    for match in matches:
+        spans.setdefault((match.start, match.end), set()).add(match.field)
+    if any(len(fields) > 1 for fields in spans.values()):
+        return None  # Same phrase names values of different fields
+
+    allowed = set(_FILLER_WORDS) | set(normalize_tokens(collection_name))
+    for match in matches:
+        allowed.update(normalize_tokens(match.field.replace(".", " ")))
+    covered = {i for start, end in spans for i in range(start, end)}
+    tokens = normalize_tokens(text)
+    if any(i not in covered and token not in allowed for i, token in enumerate(tokens)):
+        return None
+
+    intent = {"query_type": query_type, "filter": predicates_for(matches), "resolved_by": "value_dictionary"}
+    if query_type == "find":
+        intent.update({"projection": {}, "pipeline": []})
+    return intent
+
+
+def state_matcher() -> ValueMatcher:
+    """US state names mapped onto the address regex the prompt uses."""
+    matcher = ValueMatcher()
+    for name, code in US_STATES.items():
+        matcher.add(name, "address", code, {"$regex": f"\\b{code}\\b", "$options": "i"})
+    return matcher
+
+
+# Hand-maintained dictionaries merged into the scanned ones
+SEED_DICTIONARIES = {
+    "customers": state_matcher
+}
+
+
+class ValueDictionaryStore:
+    """
+    Per-collection value dictionaries. Low-cardinality string fields (by
+    the profiler's distinct estimate) are scanned with distinct(); the
+    values are stored compactly, one document per collection in
+    `value_dictionaries`, and loaded into a ValueMatcher that is rebuilt
+    after `ttl` seconds.
+    """
+
+    def __init__(self, db_manager, ttl: Optional[float] = None):
+        self.db_manager = db_manager
+        self.ttl = config.VALUE_DICT_TTL if ttl is None else ttl
+        self._matchers: Dict[str, Tuple[float, ValueMatcher]] = {}
+        self._lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+
+    @property
+    def _store(self):
+        return self.db_manager.db[config.VALUE_DICTIONARY_COLLECTION]
+
+    def _candidate_fields(self, schema: Dict[str, Any]) -> List[Tuple[str, Dict[str, Any]]]:
+        fields = []
+        for name, info in schema.get("fields", {}).items():
+            if "str" not in info.get("type", []) or name == "_id":
+                continue
+            distinct = info.get("distinct_estimate")
+            if distinct is None or distinct > config.VALUE_DICT_MAX_DISTINCT:
+                continue
+            if info.get("frequency", 0) < config.VALUE_DICT_MIN_FREQUENCY:
+                continue
+            fields.append((name.replace("[]", ""), info))
+        fields.sort(key=lambda item: -item[1].get("frequency", 0))
+        return fields[:config.VALUE_DICT_MAX_FIELDS]
+
+    def _usable(self, value: Any) -> bool:
+        return (isinstance(value, str) and 0 < len(value) <= config.VALUE_DICT_MAX_VALUE_LENGTH
+                and re.search(r"[A-Za-z]", value) is not None)
+
+    def scan(self, collection_name: str) -> List[Dict[str, Any]]:
+        """Distinct values of the collection's low-cardinality string fields."""
+        schema = self.db_manager.get_schema(collection_name)
+        collection = self.db_manager.sampling_collection(collection_name)
+        entries = []
+        for field, info in self._candidate_fields(schema):
+            try:
+                values = collection.distinct(field)
+            except Exception as e:
+                self.logger.warning(f"distinct({field}) failed on {collection_name}: {str(e)}")
+                values = []
+            if not values or len(values) > config.VALUE_DICT_MAX_DISTINCT:
+                # The sample underestimated cardinality; keep only the frequent values
+                values = [entry["value"] for entry in info.get("top_values", [])]
+            values = [value for value in values if self._usable(value)]
+            if values:
+                entries.append({"field": field, "values": values})
+        return entries
+
+    def build(self, collection_name: str) -> ValueMatcher:
+        """Scan the collection, store its dictionary and return the matcher."""
+        entries = self.scan(collection_name)
+        self._store.replace_one(
+            {"_id": collection_name},
+            {"_id": collection_name, "fields": entries, "built_at": datetime.utcnow()},
+            upsert=True
+        )
+        return self._remember(collection_name, entries)
+
+    def _remember(self, collection_name: str, entries: List[Dict[str, Any]]) -> ValueMatcher:
+        matcher = ValueMatcher()
+        for entry in entries:
+            for value in entry["values"]:
+                matcher.add(value, entry["field"], value)
+        seed = SEED_DICTIONARIES.get(collection_name)
+        if seed is not None:
+            matcher.extend(seed())
+        with self._lock:
+            self._matchers[collection_name] = (time.monotonic(), matcher)
+        return matcher
+
+    def get(self, collection_name: str) -> ValueMatcher:
+        """Matcher for a collection: in-process, then stored, then freshly scanned."""
+        with self._lock:
+            cached = self._matchers.get(collection_name)
+        if cached is not None and time.monotonic() - cached[0] < self.ttl:
+            return cached[1]
+        stored = self._store.find_one({"_id": collection_name})
+        if stored is not None and (datetime.utcnow() - stored["built_at"]).total_seconds() < self.ttl:
+            return self._remember(collection_name, stored["fields"])
+        return self.build(collection_name)
+
+    def warm(self, collections: Iterable[str]) -> None:
+        for collection_name in collections:
+            try:
+                self.get(collection_name)
+            except Exception as e:
+                self.logger.warning(f"Could not load value dictionary for {collection_name}: {str(e)}")
@@ -0,0 +1,225 @@
+# src/world_model.py
+import difflib
+import hashlib
+import json
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Any, Callable, List, Optional, Tuple
+from pymongo import ASCENDING, DESCENDING
+from config.settings import config
+from src.value_dictionary import normalize_tokens
+
+# Outcomes that say something lasting about the data; timeouts, overload and
+# malformed LLM output are transient and never learned
+LEARNED_ERROR_TYPES = ("impossible", "ambiguous")
+
+
+def schema_fingerprint(schema: Dict[str, Any]) -> Optional[str]:
+    """
+    Hash of the field names a collection reliably has. Rare fields are left
+    out, so resampling the same data does not change the fingerprint.
+    """
+    fields = schema.get("fields") if isinstance(schema, dict) else None
+    if not fields:
+        return None
+    names = sorted(name for name, info in fields.items()
+                   if info.get("frequency", 1.0) >= config.WORLD_MODEL_FIELD_MIN_FREQUENCY)
+    return hashlib.sha1(json.dumps(names).encode("utf-8")).hexdigest()[:16]
+
+
+def question_pattern(question: str) -> str:
+    """Questions that differ only in case, punctuation or word endings share a pattern."""
+    return " ".join(normalize_tokens(question))
+
+
+def suggest(error_type: str, question: str, schema: Dict[str, Any]) -> str:
+    """A hint pointing at fields the collection does have, closest to the question's words first."""
+    fields = schema.get("fields", {}) if isinstance(schema, dict) else {}
+    top_level = sorted((name for name in fields if "." not in name and not name.endswith("[]")),
+                       key=lambda name: -fields[name].get("frequency", 0.0))
+    by_token = {token: name for name in top_level for token in normalize_tokens(name)}
+    close = []
+    for token in normalize_tokens(question):
+        for match in difflib.get_close_matches(token, list(by_token), n=1, cutoff=0.75):
+            if by_token[match] not in close:
+                close.append(by_token[match])
+    hint = f"Closest fields: {', '.join(close)}." if close else \
+        f"Available fields include: {', '.join(top_level[:8])}."
+    if error_type == "ambiguous":
+        return f"Say which field or value you mean. {hint}"
+    return f"This collection has no data for that. {hint}"
+
+
+class WorldModel:
+    """
+    Known-unanswerable questions, learned from "impossible" and "ambiguous"
+    outcomes in the events log. Each ai_response carries the question it
+    answered; responses logged without one are not learned from.
+
+    A question pattern seen failing `min_failures` times for a collection
+    is answered from the store, with its error and a suggestion, before any
+    schema or LLM work. Entries belong to the collection's schema
+    fingerprint: a schema change drops them, and a TTL index drops entries
+    not seen again for `ttl` seconds. Answers given from the store are not
+    learned again, so entries age out and the LLM gets another try.
+    """
+
+    def __init__(self, db, events, schema_source: Callable[[str], Dict[str, Any]],
+                 min_failures: Optional[int] = None, ttl: Optional[int] = None,
+                 lookback_hours: Optional[float] = None):
+        self.gaps = db[config.WORLD_MODEL_COLLECTION]
+        self.state = db[config.WORLD_MODEL_STATE_COLLECTION]
+        self.events = events
+        self.schema_source = schema_source
+        self.min_failures = min_failures or config.WORLD_MODEL_MIN_FAILURES
+        self.ttl = ttl or config.WORLD_MODEL_TTL
+        self.lookback = timedelta(hours=config.WORLD_MODEL_LOOKBACK_HOURS if lookback_hours is None
+                                  else lookback_hours)
+        self._known: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.logger = logging.getLogger(__name__)
+        self.hits = 0
+        try:
+            self.gaps.create_index([("collection", ASCENDING), ("fingerprint", ASCENDING), ("pattern", ASCENDING)],
+                                   unique=True)
+            self.gaps.create_index("last_seen", expireAfterSeconds=self.ttl)
+        except Exception as e:
+            self.logger.warning(f"Could not create world model indexes: {str(e)}")
+
+    def observe_schema(self, collection_name: str, now: datetime) -> Optional[str]:
+        """Current fingerprint of a collection; on a change, forget what was learned for the old one."""
+        schema = self.schema_source(collection_name)
+        fingerprint = schema_fingerprint(schema)
+        if fingerprint is None:
+            return None
+        state = self.state.find_one({"_id": collection_name})
+        if state is None or state["fingerprint"] != fingerprint:
+            # The first time, recent history is assumed to match the current schema
+            since = now - self.lookback if state is None else now
+            self.state.replace_one({"_id": collection_name},
+                                   {"fingerprint": fingerprint, "learned_until": since}, upsert=True)
+            dropped = self.gaps.delete_many({"collection": collection_name,
+                                             "fingerprint": {"$ne": fingerprint}}).deleted_count
+            if state is not None:
+                self.logger.info(f"Schema of {collection_name} changed; dropped {dropped} known gaps")
+        return fingerprint
+
+    def record(self, collection_name: str, fingerprint: str, question: str, intent: Dict[str, Any],
+               seen_at: datetime, schema: Dict[str, Any]) -> None:
+        error_type = intent.get("error_type")
+        self.gaps.update_one(
+            {"collection": collection_name, "fingerprint": fingerprint, "pattern": question_pattern(question)},
+            {"$inc": {"failures": 1},
+             "$max": {"last_seen": seen_at},
+             "$min": {"first_seen": seen_at},
+             "$set": {"error_type": error_type,
+                      "error_message": intent.get("error_message") or f"The question is {error_type}.",
+                      "suggestion": suggest(error_type, question, schema)},
+             "$push": {"examples": {"$each": [question], "$slice": -3}}},
+            upsert=True)
+
+    def learn(self, collections: Optional[List[str]] = None, now: Optional[datetime] = None) -> Dict[str, int]:
+        """Fold new failure events into the store, then reload the known gaps. Returns events learned per collection."""
+        now = now or datetime.utcnow()
+        learned = {}
+        for collection_name in collections or config.COLLECTIONS:
+            fingerprint = self.observe_schema(collection_name, now)
+            if fingerprint is None:
+                continue
+            schema = self.schema_source(collection_name)
+            since = self.state.find_one({"_id": collection_name})["learned_until"]
+            cursor = self.events.find(
+                {"type": "ai_response", "collection": collection_name, "response_success": False,
+                 "intent.error_type": {"$in": list(LEARNED_ERROR_TYPES)},
+                 "intent.resolved_by": {"$ne": "world_model"},
+                 "question": {"$type": "string"},
+                 "timestamp": {"$gt": since, "$lte": now}},
+                {"question": 1, "timestamp": 1, "intent": 1}
+            ).sort("timestamp", ASCENDING).limit(config.WORLD_MODEL_MAX_EVENTS)
+            count = 0
+            last = now
+            for event in cursor:
+                count += 1
+                last = event["timestamp"]
+                self.record(collection_name, fingerprint, event["question"], event["intent"], event["timestamp"], schema)
+            # A full page leaves the rest for the next round
+            self.state.update_one({"_id": collection_name},
+                                  {"$set": {"learned_until": last if count >= config.WORLD_MODEL_MAX_EVENTS else now}})
+            learned[collection_name] = count
+        self.reload()
+        return learned
+
+    def reload(self) -> int:
+        """Load the known gaps of every collection's current fingerprint into memory."""
+        known = {}
+        for state in self.state.find():
+            for entry in self.gaps.find({"collection": state["_id"], "fingerprint": state["fingerprint"],
+                                         "failures": {"$gte": self.min_failures}}):
+                known[(entry["collection"], entry["pattern"])] = entry
+        with self._lock:
+            self._known = known
+        return len(known)
+
+    def lookup(self, collection_name: str, question: str, has_context: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        The cached error intent for a known-unanswerable question, or None.
+        Ambiguity can be resolved by conversation context, so ambiguous
+        entries only apply to questions asked without one.
+        """
+        with self._lock:
+            entry = self._known.get((collection_name, question_pattern(question)))
+            if entry is None or (has_context and entry["error_type"] == "ambiguous"):
+                return None
+            self.hits += 1
+        return {
+            "query_type": "error",
+            "error_type": entry["error_type"],
+            "error_message": f"{entry['error_message']} {entry['suggestion']}",
+            "suggestion": entry["suggestion"],
+            "resolved_by": "world_model"
+        }
+
+    def gaps_report(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """Current-schema entries, most failures first, including those still below the threshold."""
+        current = {state["_id"]: state["fingerprint"] for state in self.state.find()}
+        entries = self.gaps.find({}, {"_id": 0}).sort([("failures", DESCENDING), ("last_seen", DESCENDING)])
+        report = []
+        for entry in entries:
+            if current.get(entry["collection"]) != entry["fingerprint"]:
+                continue
+            entry["active"] = entry["failures"] >= self.min_failures
+            report.append(entry)
+            if len(report) >= limit:
+                break
+        return report
+
+    def start(self, interval: Optional[float] = None) -> None:
+        """Learn from new events every `interval` seconds on a daemon thread."""
+        interval = config.WORLD_MODEL_REFRESH_INTERVAL if interval is None else interval
+
+        def run():
+            while not self._stop.is_set():
+                try:
+                    self.learn()
+                except Exception as e:
+                    self.logger.warning(f"World model refresh failed: {str(e)}")
+                self._stop.wait(interval)
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=run, name="world-model", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            by_collection: Dict[str, int] = {}
+            for collection_name, _ in self._known:
+                by_collection[collection_name] = by_collection.get(collection_name, 0) + 1
+            return {"known_gaps": len(self._known), "by_collection": by_collection, "hits": self.hits}
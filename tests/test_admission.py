@@ -0,0 +1,221 @@
+# tests/test_admission.py
+import sys
+import os
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.admission import AdmissionController, CircuitBreaker, Overloaded, RecentIntents
+from src.deadline import Deadline, deadline_scope
+import src.nlp_processor as nlp_module
+from src.nlp_processor import NLPProcessor
+
+
+def _wait_for_queue(controller, size):
+    for _ in range(200):
+        if controller.stats()["queued"] == size:
+            return
+        time.sleep(0.005)
+    raise AssertionError(f"queue never reached {size}")
+
+
+def test_interactive_callers_are_served_before_batch():
+    controller = AdmissionController(max_concurrent=1, max_queue=10, max_wait={"interactive": 5, "batch": 5})
+    order = []
+
+    def call(priority):
+        with controller.slot(priority):
+            order.append(priority)
+
+    with controller.slot("interactive"):
+        batch = threading.Thread(target=call, args=("batch",))
+        batch.start()
+        _wait_for_queue(controller, 1)
+        interactive = threading.Thread(target=call, args=("interactive",))
+        interactive.start()
+        _wait_for_queue(controller, 2)
+    batch.join()
+    interactive.join()
+    assert order == ["interactive", "batch"]
+    assert controller.stats()["active"] == 0
+
+
+def test_callers_are_shed_by_queue_size_and_expected_wait():
+    controller = AdmissionController(max_concurrent=1, max_queue=1, max_wait={"interactive": 0.1, "batch": 10})
+    controller.service_time = 0.05
+    with controller.slot("interactive"):
+        # Expected wait fits, but nothing frees the slot in time
+        with pytest.raises(Overloaded) as waited:
+            with controller.slot("interactive"):
+                pass
+        assert waited.value.retry_after >= 1
+
+        controller.service_time = 2.0
+        # Two seconds expected, a tenth of a second allowed: turned away without queueing
+        started = time.monotonic()
+        with pytest.raises(Overloaded):
+            with controller.slot("interactive"):
+                pass
+        assert time.monotonic() - started < 0.05
+        # ... and the same holds for what is left of the request deadline
+        with pytest.raises(Overloaded):
+            with controller.slot("batch", Deadline(500)):
+                pass
+
+        waiter = threading.Thread(target=lambda: controller.slot("batch").__enter__())
+        waiter.start()
+        _wait_for_queue(controller, 1)
+        with pytest.raises(Overloaded, match="full"):
+            with controller.slot("batch"):
+                pass
+    waiter.join()
+    assert controller.stats()["shed"] == 4
+
+
+def test_circuit_breaker_opens_and_probes():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert not breaker.allow() and breaker.stats()["state"] == "open"
+    time.sleep(0.06)
+    assert breaker.allow()       # one probe
+    assert not breaker.allow()   # ... at a time
+    breaker.record_failure()
+    assert breaker.stats()["state"] == "open"
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.allow() and breaker.stats()["state"] == "closed"
+
+
+class FlakyLLM:
+    def __init__(self):
+        self.calls = 0
+        self.failing = False
+
+    def invoke(self, prompt, timeout=None):
+        self.calls += 1
+        if self.failing:
+            raise RuntimeError("Error code: 503 - service unavailable")
+
+        class Response:
+            content = '{"query_type": "count", "filter": {"balance": {"$gt": 5}}}'
+        return Response()
+
+
+def _processor(llm):
+    class FakeDatabaseManager:
+        def get_schema(self, collection_name):
+            return {"fields": {"balance": {"type": ["int"]}}}
+
+        def get_sample_document(self, collection_name):
+            return {"balance": 10}
+
+    class NoDictionaries:
+        def get(self, collection_name):
+            raise LookupError("not built")
+
+    processor = NLPProcessor.__new__(NLPProcessor)
+    processor.db_manager, processor.value_dictionaries, processor.llm = (
+        FakeDatabaseManager(), NoDictionaries(), llm)
+    return processor
+
+
+def test_open_circuit_falls_back_to_recent_intents(monkeypatch):
+    monkeypatch.setattr(nlp_module, "llm_breaker", CircuitBreaker(failure_threshold=2, reset_timeout=60))
+    monkeypatch.setattr(nlp_module, "llm_admission", AdmissionController(max_concurrent=2))
+    monkeypatch.setattr(nlp_module, "recent_intents", RecentIntents())
+    llm = FlakyLLM()
+    processor = _processor(llm)
+
+    question = "How many accounts have a balance over 5?"
+    assert processor.parse_query(question, "accounts")["query_type"] == "count"
+    llm.failing = True
+    for _ in range(2):
+        assert processor.parse_query("Accounts opened this week", "accounts")["error_type"] == "processing"
+    calls = llm.calls
+
+    # The provider is no longer called; a repeat of a known question is still answered
+    cached = processor.parse_query("how many ACCOUNTS have a balance over 5", "accounts")
+    assert cached["query_type"] == "count" and cached["resolved_by"] == "recent_intent"
+    unknown = processor.parse_query("Accounts opened this week", "accounts")
+    assert unknown["error_type"] == "overloaded" and unknown["retry_after"] >= 1
+    # Follow-ups depend on the conversation, so they never reuse a stand-alone intent
+    follow_up = processor.parse_query(question, "accounts", session_context={"last_filter": {"limit": 1}})
+    assert follow_up["error_type"] == "overloaded"
+    assert llm.calls == calls
+
+
+def test_shed_probe_does_not_wedge_the_breaker(monkeypatch):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    admission = AdmissionController(max_concurrent=1, max_queue=0)
+    monkeypatch.setattr(nlp_module, "llm_breaker", breaker)
+    monkeypatch.setattr(nlp_module, "llm_admission", admission)
+    monkeypatch.setattr(nlp_module, "recent_intents", RecentIntents())
+    llm = FlakyLLM()
+    processor = _processor(llm)
+
+    llm.failing = True
+    assert processor.parse_query("Accounts opened this week", "accounts")["error_type"] == "processing"
+    assert breaker.stats()["state"] == "open"
+    time.sleep(0.06)
+    with admission.slot("interactive"):
+        # The probe is shed before reaching the provider
+        assert processor.parse_query("Accounts opened this week", "accounts")["error_type"] == "overloaded"
+    assert breaker.stats()["state"] == "half_open"
+
+    # ... and the next caller gets to probe instead
+    llm.failing = False
+    assert processor.parse_query("Accounts opened this week", "accounts")["query_type"] == "count"
+    assert breaker.stats()["state"] == "closed"
+
+
+def test_short_client_deadlines_do_not_open_the_breaker(monkeypatch):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    monkeypatch.setattr(nlp_module, "llm_breaker", breaker)
+    monkeypatch.setattr(nlp_module, "llm_admission", AdmissionController(max_concurrent=2))
+    monkeypatch.setattr(nlp_module, "recent_intents", RecentIntents())
+
+    class SlowLLM:
+        def invoke(self, prompt, timeout=None):
+            time.sleep(timeout)
+            raise TimeoutError("Request timed out.")
+
+    processor = _processor(SlowLLM())
+    for _ in range(4):
+        with deadline_scope(Deadline(20)):
+            assert processor.parse_query("Accounts opened this week", "accounts")["error_type"] == "timeout"
+    assert breaker.stats() == {"state": "closed", "consecutive_failures": 0}
+
+
+def test_query_endpoint_returns_429_when_shed(monkeypatch):
+    from fastapi.testclient import TestClient
+    import app as agent_app
+    from src.result_cache import SessionResultCache
+
+    class ShedNLPProcessor:
+        def parse_query(self, user_text, collection_name, session_context=None):
+            return {"query_type": "error", "error_type": "overloaded", "error_message": "Too busy",
+                    "retry_after": 7}
+
+    class FakeConversationManager:
+        session_id = "default-session"
+
+        def add_user_message_to_analytics(self, text, collection=None, session_id=None):
+            pass
+
+        def add_ai_message_to_analytics(self, text, intent, success_flag, exec_time, session_id=None,
+                                        collection=None, results=None, question=None):
+            pass
+
+    monkeypatch.setattr(agent_app, "nlp_processor", ShedNLPProcessor())
+    monkeypatch.setattr(agent_app, "conv_manager", FakeConversationManager())
+    monkeypatch.setattr(agent_app, "result_cache", SessionResultCache())
+    monkeypatch.setattr(agent_app.startup_state, "ready", True)
+
+    response = TestClient(agent_app.app).post("/query", json={"collection": "accounts", "query_text": "How many?"})
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "7"
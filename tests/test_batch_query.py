@@ -0,0 +1,92 @@
+# tests/test_batch_query.py
+import sys
+import os
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from fastapi.testclient import TestClient
+import app as agent_app
+
+
+class FakeDatabaseManager:
+    def __init__(self):
+        self.schema_requests = []
+
+    def get_schemas(self, collections):
+        self.schema_requests.append(list(collections))
+        return {name: {"fields": {}} for name in collections}
+
+
+class FakeNLPProcessor:
+    def __init__(self):
+        self.parsed = []
+        self.lock = threading.Lock()
+
+    def parse_query(self, user_text, collection_name, session_context=None):
+        time.sleep(0.2)
+        with self.lock:
+            self.parsed.append(user_text)
+        if "unicorns" in user_text:
+            return {"query_type": "error", "error_type": "impossible", "error_message": "No such field"}
+        return {"query_type": "count", "filter": {}}
+
+    def execute_intent(self, collection_name, intent):
+        time.sleep(0.1)
+        return {"success": True, "data": [{"count": len(collection_name)}], "execution_time_seconds": 0.1}
+
+
+class FakeConversationManager:
+    session_id = "default-session"
+
+    def add_user_message_to_analytics(self, text, collection=None, session_id=None):
+        pass
+
+    def add_ai_message_to_analytics(self, text, intent, success_flag, exec_time, session_id=None,
+                                    collection=None, results=None, question=None):
+        pass
+
+    def save_interaction_to_memory(self, user_input, ai_output):
+        raise AssertionError("batch items should not be written to conversation memory")
+
+
+def test_batch_runs_items_concurrently(monkeypatch):
+    fake_db, fake_nlp = FakeDatabaseManager(), FakeNLPProcessor()
+    monkeypatch.setattr(agent_app, "db_manager", fake_db)
+    monkeypatch.setattr(agent_app, "nlp_processor", fake_nlp)
+    monkeypatch.setattr(agent_app, "conv_manager", FakeConversationManager())
+    monkeypatch.setattr(agent_app.startup_state, "ready", True)
+
+    items = [
+        {"collection": "customers", "query_text": "How many customers are there?"},
+        {"collection": "transactions", "query_text": "How many transactions are there?"},
+        {"collection": "customers", "query_text": "Show customers who like unicorns"},
+        {"collection": "accounts", "query_text": "How many accounts are there?"},
+        {"collection": "customers", "query_text": "How many customers are there?"},
+    ]
+    started = time.perf_counter()
+    response = TestClient(agent_app.app).post("/query/batch", json={"items": items})
+    elapsed = time.perf_counter() - started
+
+    assert response.status_code == 200
+    body = response.json()
+    results = body["results"]
+    assert [r["index"] for r in results] == [0, 1, 2, 3, 4]
+    assert results[0]["data"] == [{"count": 9}]
+    assert results[2]["error_type"] == "impossible"
+    assert results[4]["data"] == results[0]["data"]
+    # Schemas are requested once for the distinct collections
+    assert fake_db.schema_requests == [["customers", "transactions", "customers", "accounts", "customers"]]
+    # The duplicate question is parsed once
+    assert len(fake_nlp.parsed) == 4
+    # Four 0.3s items finish in roughly the time of one
+    assert elapsed < 0.9
+
+
+def test_batch_rejects_empty_and_oversized(monkeypatch):
+    monkeypatch.setattr(agent_app.startup_state, "ready", True)
+    client = TestClient(agent_app.app)
+    assert client.post("/query/batch", json={"items": []}).status_code == 422
+    monkeypatch.setattr(agent_app.config, "BATCH_MAX_ITEMS", 1)
+    items = [{"collection": "customers", "query_text": "q"}] * 2
+    assert client.post("/query/batch", json={"items": items}).status_code == 413
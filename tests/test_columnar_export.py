@@ -0,0 +1,155 @@
+# tests/test_columnar_export.py
+import sys
+import os
+import io
+from collections import Counter
+from datetime import datetime
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+pa = pytest.importorskip("pyarrow")
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+from src.columnar_export import arrow_type, infer_schema, stream_export
+from src.database_manager import DatabaseManager
+
+SCHEMA = {"fields": {
+    "name": {"type": ["str"]},
+    "balance": {"type": ["int"]},
+    "active": {"type": ["bool", "NoneType"]},
+    "birthdate": {"type": ["datetime"]},
+    "accounts": {"type": ["list"]},
+    "accounts[]": {"type": ["int"]},
+    "tier_and_details": {"type": ["dict"]},
+    "tier_and_details.tier": {"type": ["str"]},
+}}
+
+
+def _customers(n):
+    return [{"name": f"customer {i}", "balance": i * 10, "active": i % 2 == 0, "birthdate": datetime(1990, 1, 1 + i % 28),
+             "accounts": list(range(i % 4)), "tier_and_details": {"t1": {"tier": "Gold"}}} for i in range(n)]
+
+
+def test_arrow_types_follow_the_extracted_schema():
+    assert arrow_type(["int", "float"]) == pa.float64()
+    assert arrow_type(["list"], ["int"]) == pa.list_(pa.int64())
+    assert arrow_type(["list"], ["dict"]) == pa.string()
+    assert arrow_type(["list"], ["int"], nested=False) == pa.string()
+    assert arrow_type(["str", "int"]) == pa.string()
+
+    schema = infer_schema(SCHEMA, [{"name": "a", "balance": 1.5, "total": 3}])
+    assert schema.field("balance").type == pa.float64()   # Widened by what the batch holds
+    assert schema.field("birthdate").type == pa.timestamp("ms")
+    assert schema.field("tier_and_details").type == pa.string()
+    assert schema.field("total").type == pa.int64()        # Not in the collection schema
+    assert "tier_and_details.tier" not in schema.names
+    assert infer_schema(SCHEMA, [], projection={"name": 1, "_id": 0}).names == ["name"]
+
+
+def test_streams_decode_in_every_format():
+    rows = _customers(10)
+    batches = [rows[:4], rows[4:8], rows[8:]]
+
+    arrow = pa.ipc.open_stream(b"".join(stream_export(iter(batches), "arrow", SCHEMA))).read_all()
+    assert arrow.num_rows == 10 and arrow.column("accounts").to_pylist()[3] == [0, 1, 2]
+    assert arrow.column("tier_and_details").to_pylist()[0] == '{"t1": {"tier": "Gold"}}'
+
+    chunks = list(stream_export(iter(batches), "parquet", SCHEMA))
+    assert len(chunks) == 4  # One per batch, then the footer
+    parquet = pq.ParquetFile(io.BytesIO(b"".join(chunks)))
+    assert parquet.num_row_groups == 3 and parquet.read().column("balance").to_pylist() == [r["balance"] for r in rows]
+
+    csv = pa_csv.read_csv(io.BytesIO(b"".join(stream_export(iter(batches), "csv", SCHEMA))))
+    assert csv.num_rows == 10 and csv.column("accounts").to_pylist()[3] == "[0, 1, 2]"
+
+    # No rows still gives a readable, typed file
+    empty = pa.ipc.open_stream(b"".join(stream_export(iter([]), "arrow", SCHEMA))).read_all()
+    assert empty.num_rows == 0 and empty.schema.field("balance").type == pa.int64()
+
+
+def test_later_values_widen_or_are_counted():
+    def export(batches):
+        coerced = Counter()
+        column = pa.ipc.open_stream(b"".join(stream_export(iter(batches), "arrow", coerced=coerced))).read_all()
+        return column.column("amount"), coerced
+
+    # Types are fixed from the first batch: mixed numbers there widen to float64
+    amount, coerced = export([[{"amount": 10}, {"amount": 12.75}], [{"amount": 11}, {"amount": "n/a"}]])
+    assert amount.to_pylist() == [10.0, 12.75, 11.0, None] and coerced == {"amount": 1}
+    # Only ints in the first batch: 13.0 still fits losslessly, the rest is counted
+    amount, coerced = export([[{"amount": 10}, {"amount": 11}], [{"amount": 12.75}, {"amount": 13.0}],
+                              [{"amount": "n/a"}]])
+    assert amount.to_pylist() == [10, 11, None, 13, None] and coerced == {"amount": 2}
+
+
+def test_iter_query_reads_cursor_in_batches():
+    mongomock = pytest.importorskip("mongomock")
+    manager = DatabaseManager("mongodb://unused", "sample_analytics")
+    manager.db = mongomock.MongoClient().sample_analytics
+    manager.db.customers.insert_many(_customers(25))
+
+    batches = list(manager.iter_query("customers", "find", {"filter": {"active": True}}, batch_size=5))
+    assert [len(batch) for batch in batches] == [5, 5, 3]
+    assert isinstance(batches[0][0]["_id"], str)
+    capped = manager.iter_query("customers", "find", {"filter": {}}, batch_size=10, max_rows=12)
+    assert sum(len(batch) for batch in capped) == 12
+    pipeline = [{"$group": {"_id": "$active", "n": {"$sum": 1}}}]
+    assert sum(len(b) for b in manager.iter_query("customers", "aggregate", {"pipeline": pipeline})) == 2
+    assert list(manager.iter_query("customers", "count", {"filter": {"active": False}})) == [[{"count": 12}]]
+
+
+def test_export_endpoint(monkeypatch):
+    mongomock = pytest.importorskip("mongomock")
+    from fastapi.testclient import TestClient
+    import app as agent_app
+
+    class FakeNLPProcessor:
+        def parse_query(self, user_text, collection_name, session_context=None):
+            if "nonsense" in user_text:
+                return {"query_type": "error", "error_type": "impossible", "error_message": "Cannot answer"}
+            return {"query_type": "find", "filter": {"balance": {"$gte": 100}}, "limit": 0}
+
+    class FakeConversationManager:
+        session_id = "default-session"
+
+        def __init__(self):
+            self.logged = []
+
+        def add_user_message_to_analytics(self, text, collection=None, session_id=None):
+            pass
+
+        def add_ai_message_to_analytics(self, text, intent, success_flag, exec_time, session_id=None,
+                                        collection=None, results=None, question=None):
+            self.logged.append((text, success_flag))
+
+    manager = DatabaseManager("mongodb://unused", "sample_analytics")
+    manager.db = mongomock.MongoClient().sample_analytics
+    manager.db.customers.insert_many(_customers(40))
+    manager.get_schema = lambda collection_name: SCHEMA
+    conversations = FakeConversationManager()
+    monkeypatch.setattr(agent_app, "db_manager", manager)
+    monkeypatch.setattr(agent_app, "nlp_processor", FakeNLPProcessor())
+    monkeypatch.setattr(agent_app, "conv_manager", conversations)
+    monkeypatch.setattr(agent_app.startup_state, "ready", True)
+    monkeypatch.setattr(agent_app.config, "EXPORT_BATCH_SIZE", 8)
+    client = TestClient(agent_app.app)
+
+    request = {"collection": "customers", "query_text": "Customers with a balance of at least 100", "format": "parquet"}
+    response = client.post("/query/export", json=request, headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/vnd.apache.parquet"
+    assert "content-encoding" not in response.headers  # Parquet is compressed already
+    assert 'filename="customers.parquet"' in response.headers["content-disposition"]
+    parquet = pq.ParquetFile(io.BytesIO(response.content))
+    assert parquet.metadata.num_rows == 30 and parquet.num_row_groups == 4
+    assert conversations.logged[-1] == ("Exported 30 rows as parquet", True)
+
+    projected = client.post("/query/export", json=dict(request, format="arrow", projection={"name": 1, "_id": 0}))
+    assert pa.ipc.open_stream(projected.content).read_all().column_names == ["name"]
+
+    csv = client.post("/query/export", json=dict(request, format="csv"))
+    assert csv.headers["content-type"].startswith("text/csv") and csv.text.count("\n") == 31
+
+    assert client.post("/query/export", json=dict(request, query_text="nonsense")).status_code == 422
+    assert client.post("/query/export", json=dict(request, format="xlsx")).status_code == 422
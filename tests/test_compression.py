@@ -0,0 +1,95 @@
+# tests/test_compression.py
+import sys
+import os
+import json
+import zlib
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.compression import CompressionMiddleware, available_encodings, negotiate
+from src.mongo_clients import MongoClientRegistry
+
+
+def test_negotiation_follows_q_values_then_server_preference():
+    preference = ["zstd", "br", "gzip"]
+    assert negotiate("gzip, deflate, br, zstd", preference) == "zstd"
+    assert negotiate("gzip;q=1.0, zstd;q=0.5", preference) == "gzip"
+    assert negotiate("zstd;q=0, gzip", preference) == "gzip"
+    assert negotiate("*", preference) == "zstd"
+    assert negotiate("identity", preference) is None
+    assert negotiate("", preference) is None
+
+
+def _client(**options):
+    from fastapi import FastAPI
+    from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+    from fastapi.testclient import TestClient
+
+    app = FastAPI()
+    rows = [{"name": f"customer {i}", "active": True} for i in range(200)]
+
+    @app.get("/query")
+    def query(n: int = 200):
+        return {"data": rows[:n]}
+
+    @app.get("/query/stream")
+    def stream():
+        return StreamingResponse((f"{i},customer {i}\n" for i in range(2000)), media_type="text/csv")
+
+    @app.get("/query/encoded")
+    def encoded():
+        return Response(zlib.compress(b"x" * 5000), headers={"Content-Encoding": "deflate"})
+
+    @app.get("/health")
+    def health():
+        return PlainTextResponse("ok " * 1000)
+
+    app.add_middleware(CompressionMiddleware, paths=["/query"], minimum_size=500, **options)
+    return TestClient(app), rows
+
+
+def test_query_responses_are_compressed_above_threshold():
+    client, rows = _client(encodings=["gzip"])
+    large = client.get("/query", headers={"Accept-Encoding": "gzip"})
+    assert large.headers["content-encoding"] == "gzip" and "Accept-Encoding" in large.headers["vary"]
+    assert int(large.headers["content-length"]) < len(large.content) / 3
+    assert large.json()["data"] == rows
+
+    small = client.get("/query", params={"n": 2}, headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in small.headers
+    assert "content-encoding" not in client.get("/health", headers={"Accept-Encoding": "gzip"}).headers
+    assert "content-encoding" not in client.get("/query", headers={"Accept-Encoding": "identity"}).headers
+
+    streamed = client.get("/query/stream", headers={"Accept-Encoding": "gzip"})
+    assert streamed.headers["content-encoding"] == "gzip" and "content-length" not in streamed.headers
+    assert streamed.text.splitlines()[1999] == "1999,customer 1999"
+
+    # Already-encoded bodies pass through untouched
+    encoded = client.get("/query/encoded", headers={"Accept-Encoding": "gzip"})
+    assert encoded.headers["content-encoding"] == "deflate"
+
+
+def test_zstd_is_preferred_when_available():
+    if "zstd" not in available_encodings():
+        pytest.skip("zstandard is not installed")
+    import zstandard
+    client, rows = _client()
+    response = client.get("/query", headers={"Accept-Encoding": "gzip, zstd"})
+    assert response.headers["content-encoding"] == "zstd"
+    body = response.content
+    if body.startswith(b"\x28\xb5\x2f\xfd"):  # Frame magic: the HTTP client left it encoded
+        body = zstandard.ZstdDecompressor().decompressobj().decompress(body)
+    assert json.loads(body)["data"] == rows
+
+
+def test_wire_compressors_come_from_config(monkeypatch):
+    from config.settings import config
+    profiles = {"query": {"maxPoolSize": 5, "compressors": "zstd,zlib"}, "analytics": {"compressors": ""}}
+    monkeypatch.setattr(config, "MONGO_ZLIB_COMPRESSION_LEVEL", 4)
+    registry = MongoClientRegistry(profiles)
+    assert registry.client_options("query")["compressors"] == "zstd,zlib"
+    assert registry.client_options("query")["zlibCompressionLevel"] == 4
+    assert "zlibCompressionLevel" not in registry.client_options("analytics")
+    assert "compressors" in config.MONGO_POOL_PROFILES["query"]
+    assert config.MONGO_POOL_PROFILES["query"]["compressors"] == config.MONGO_COMPRESSORS
@@ -0,0 +1,177 @@
+# tests/test_deadline.py
+import sys
+import os
+import asyncio
+import time
+from functools import partial
+
+from pymongo.errors import ExecutionTimeout
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from config.settings import config
+from src.deadline import Deadline, deadline_scope, max_time_kwargs
+from src.database_manager import DatabaseManager
+from src.nlp_processor import NLPProcessor
+
+
+def test_deadline_from_header_and_config(monkeypatch):
+    monkeypatch.setattr(config, "REQUEST_DEADLINE_MS", 5000)
+    monkeypatch.setattr(config, "REQUEST_DEADLINE_MAX_MS", 60000)
+    assert Deadline.from_header(None).budget_ms == 5000
+    assert Deadline.from_header("1500").budget_ms == 1500
+    assert Deadline.from_header("not-a-number").budget_ms == 5000
+    assert Deadline.from_header("900000").budget_ms == 60000
+    assert Deadline.from_header("0").budget_ms == 5000
+    assert Deadline.from_header("-5").budget_ms == 5000
+    monkeypatch.setattr(config, "REQUEST_DEADLINE_MS", 0)
+    assert Deadline.from_header(None) is None
+
+
+def test_remaining_budget_becomes_max_time_ms():
+    assert max_time_kwargs() == {}
+    with deadline_scope(Deadline(2000)):
+        assert 1900 <= max_time_kwargs()["maxTimeMS"] <= 2000
+    cancelled = Deadline(2000)
+    cancelled.cancel()
+    assert cancelled.expired() and cancelled.max_time_ms() == 1
+
+
+class RecordingCollection:
+    def __init__(self, error=None):
+        self.calls, self.error = [], error
+
+    def count_documents(self, query_filter, **kwargs):
+        self.calls.append(kwargs)
+        if self.error:
+            raise self.error
+        return 3
+
+
+def _manager(collection):
+    manager = DatabaseManager("mongodb://unused", "sample_analytics")
+    manager.db = {"customers": collection}
+    return manager
+
+
+def test_queries_run_with_max_time_and_report_timeouts():
+    collection = RecordingCollection()
+    with deadline_scope(Deadline(1000)):
+        result = _manager(collection).execute_query("customers", "count", {"filter": {"active": True}})
+    assert result["data"] == [{"count": 3}]
+    assert 0 < collection.calls[0]["maxTimeMS"] <= 1000
+
+    slow = RecordingCollection(ExecutionTimeout("operation exceeded time limit"))
+    with deadline_scope(Deadline(1000)):
+        result = _manager(slow).execute_query("customers", "count", {"filter": {"active": True}})
+    assert result["success"] is False and result["error_type"] == "timeout"
+
+    # Nothing is sent once the budget is gone
+    unused = RecordingCollection()
+    with deadline_scope(Deadline(0)):
+        result = _manager(unused).execute_query("customers", "count", {"filter": {"active": True}})
+    assert result["error_type"] == "timeout" and unused.calls == []
+
+
+def test_llm_call_gets_the_remaining_budget():
+    class APITimeoutError(Exception):
+        pass
+
+    class SlowLLM:
+        def __init__(self):
+            self.timeouts = []
+
+        def invoke(self, prompt, timeout=None):
+            self.timeouts.append(timeout)
+            raise APITimeoutError("Request timed out.")
+
+    class FakeDatabaseManager:
+        def get_schema(self, collection_name):
+            return {"fields": {"balance": {"type": ["int"]}}}
+
+        def get_sample_document(self, collection_name):
+            return {"balance": 10}
+
+    class NoDictionaries:
+        def get(self, collection_name):
+            raise LookupError("not built")
+
+    processor = NLPProcessor.__new__(NLPProcessor)
+    processor.db_manager, processor.value_dictionaries, processor.llm = (
+        FakeDatabaseManager(), NoDictionaries(), SlowLLM())
+    with deadline_scope(Deadline(3000)):
+        intent = processor.parse_query("Accounts with a balance over 5", "accounts")
+    assert intent["error_type"] == "timeout"
+    assert 0 < processor.llm.timeouts[0] <= 3.0
+
+
+class FakeConversationManager:
+    session_id = "default-session"
+
+    def __init__(self):
+        self.logged = []
+
+    def add_user_message_to_analytics(self, text, collection=None, session_id=None):
+        pass
+
+    def add_ai_message_to_analytics(self, text, intent, success_flag, exec_time, session_id=None,
+                                    collection=None, results=None, question=None):
+        self.logged.append(intent)
+
+    def save_interaction_to_memory(self, user_input, ai_output):
+        pass
+
+
+class SlowNLPProcessor:
+    def __init__(self):
+        self.executed = []
+
+    def parse_query(self, user_text, collection_name, session_context=None):
+        time.sleep(0.3)
+        return {"query_type": "count", "filter": {}}
+
+    def execute_intent(self, collection_name, intent):
+        self.executed.append(intent)
+        return {"success": True, "data": [{"count": 1}], "execution_time_seconds": 0.01}
+
+
+def test_query_endpoint_stops_at_the_deadline(monkeypatch):
+    from fastapi.testclient import TestClient
+    import app as agent_app
+    from src.result_cache import SessionResultCache
+
+    fake_nlp, conv = SlowNLPProcessor(), FakeConversationManager()
+    monkeypatch.setattr(agent_app, "nlp_processor", fake_nlp)
+    monkeypatch.setattr(agent_app, "conv_manager", conv)
+    monkeypatch.setattr(agent_app, "result_cache", SessionResultCache())
+    monkeypatch.setattr(agent_app.startup_state, "ready", True)
+
+    client = TestClient(agent_app.app)
+    body = {"session_id": "s1", "collection": "customers", "query_text": "How many customers?"}
+    late = client.post("/query", json=body, headers={"X-Request-Deadline-Ms": "100"}).json()
+    assert late["error_type"] == "timeout" and late["data"] == []
+    assert fake_nlp.executed == []
+    assert conv.logged[-1]["error_type"] == "timeout"
+
+    on_time = client.post("/query", json=body, headers={"X-Request-Deadline-Ms": "5000"}).json()
+    assert on_time["data"] == [{"count": 1}] and on_time["error"] is None
+
+
+def test_disconnect_cancels_pending_stages(monkeypatch):
+    import app as agent_app
+    from src.result_cache import SessionResultCache
+
+    fake_nlp, conv = SlowNLPProcessor(), FakeConversationManager()
+    monkeypatch.setattr(agent_app, "nlp_processor", fake_nlp)
+    monkeypatch.setattr(agent_app, "conv_manager", conv)
+    monkeypatch.setattr(agent_app, "result_cache", SessionResultCache())
+
+    class GoneRequest:
+        async def is_disconnected(self):
+            return True
+
+    deadline = Deadline(10000)
+    answer = asyncio.run(agent_app._cancel_on_disconnect(GoneRequest(), deadline, partial(
+        agent_app._answer_query, "customers", "How many customers?", "s1", deadline=deadline)))
+    assert deadline.cancelled
+    assert answer["error_type"] == "cancelled"
+    assert fake_nlp.executed == []
@@ -0,0 +1,128 @@
+# tests/test_derived_fields.py
+import sys
+import os
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.derived_fields import DerivedFieldManager, extract_state_code, state_code_for_predicate
+from src.database_manager import DatabaseManager
+
+mongomock = pytest.importorskip("mongomock")
+
+ADDRESSES = [
+    "3216 Paula Crest Apt. 432\nSouth Courtneyton, CA 01538",
+    "8892 Hunt Roads\nWest Christine, TX 06295-5932",
+    "USNV Tucker\nFPO AA 58034",
+    "Unit 0171 Box 0837\nDPO AP 25542",
+    "411 Cable Car Lane\nSan Francisco, CA 94108",
+    "Calle Mayor 5, Madrid",
+]
+IN_CA = {"address": {"$regex": "\\bCA\\b", "$options": "i"}}
+
+
+@pytest.fixture
+def db(monkeypatch):
+    # mongomock predates the `sort` argument newer pymongo passes for UpdateOne in bulk_write
+    add_update = mongomock.collection.BulkOperationBuilder.add_update
+    monkeypatch.setattr(mongomock.collection.BulkOperationBuilder, "add_update",
+                        lambda self, *args, sort=None, **kwargs: add_update(self, *args, **kwargs))
+
+    database = mongomock.MongoClient().sample_analytics
+    database.customers.insert_many([{"name": f"c{i}", "address": address} for i, address in enumerate(ADDRESSES)])
+    return database
+
+
+def test_extract_state_code():
+    assert [extract_state_code(address) for address in ADDRESSES] == ["CA", "TX", "AA", "AP", "CA", None]
+    assert extract_state_code(None) is None
+
+
+def test_state_code_for_predicate():
+    assert state_code_for_predicate({"$regex": "\\bca\\b", "$options": "i"}) == "CA"
+    assert state_code_for_predicate({"$regex": "\\bTX\\b"}) == "TX"
+    assert state_code_for_predicate({"$regex": "CA"}) is None
+    assert state_code_for_predicate({"$regex": "\\bCA\\b", "$options": "m"}) is None
+    assert state_code_for_predicate("CA") is None
+
+
+def test_reconcile_backfills_and_rewrite_waits_for_it(db):
+    manager = DerivedFieldManager(db)
+    field = manager.fields[0]
+    assert manager.rewrite("customers", {"filter": IN_CA}) == {"filter": IN_CA}
+
+    manager.ensure_index(field)
+    assert manager.reconcile(field, batch_size=2) == {"scanned": 6, "updated": 6}
+    assert manager.reconcile(field) == {"scanned": 6, "updated": 0}
+    assert "state_code_1" in db.customers.index_information()
+
+    manager._mark_ready(field, "change_stream")
+    assert manager.rewrite("customers", {"filter": IN_CA}) == {"filter": {"state_code": "CA"}}
+    assert manager.rewrite("transactions", {"filter": IN_CA}) == {"filter": IN_CA}
+    assert db.customers.count_documents({"state_code": "CA"}) == db.customers.count_documents(IN_CA) == 2
+
+
+def test_rewrite_handles_logical_operators_and_pipelines(db):
+    manager = DerivedFieldManager(db)
+    manager._mark_ready(manager.fields[0], "change_stream")
+    tx = {"address": {"$regex": "\\bTX\\b", "$options": "i"}}
+    assert manager.rewrite_filter("customers", {"$or": [IN_CA, tx]}) == {
+        "$or": [{"state_code": "CA"}, {"state_code": "TX"}]}
+    assert manager.rewrite_filter("customers", {"address": {"$regex": "Madrid"}}) == {"address": {"$regex": "Madrid"}}
+
+    pipeline = [{"$match": IN_CA}, {"$group": {"_id": "$address"}}, {"$match": IN_CA}]
+    rewritten = manager.rewrite("customers", {"pipeline": pipeline})["pipeline"]
+    assert rewritten[0] == {"$match": {"state_code": "CA"}}
+    assert rewritten[2] == {"$match": IN_CA}  # After $group, address means something else
+    assert pipeline[0] == {"$match": IN_CA}  # The caller's intent is not modified
+
+
+def test_periodic_rewrite_still_finds_documents_not_yet_reconciled(db):
+    manager = DerivedFieldManager(db)
+    field = manager.fields[0]
+    manager.reconcile(field)
+    manager._mark_ready(field, "periodic")
+    rewritten = manager.rewrite_filter("customers", dict(IN_CA, name={"$ne": "x"}))
+    assert rewritten == {"$or": [{"state_code": "CA"}, {"state_code": {"$exists": False}, **IN_CA}],
+                         "name": {"$ne": "x"}}
+    # An existing $or is kept alongside, not overwritten
+    tx = {"address": {"$regex": "\\bTX\\b"}}
+    both = manager.rewrite_filter("customers", {"address": IN_CA["address"], "$or": [{"name": "c0"}, {"name": "new"}]})
+    assert both["$or"][0] == {"state_code": "CA"} and both["$and"] == [{"$or": [{"name": "c0"}, {"name": "new"}]}]
+    assert manager.rewrite_filter("customers", {"$or": [tx]})["$or"][0]["$or"][0] == {"state_code": "TX"}
+
+    db.customers.insert_one({"name": "new", "address": "1 Market St\nSan Francisco, CA 94105"})
+    assert db.customers.count_documents(rewritten) == db.customers.count_documents(IN_CA) == 3
+    assert db.customers.count_documents(both) == 2
+
+
+def test_background_maintenance_falls_back_to_periodic_reconcile(db):
+    manager = DerivedFieldManager(db, interval=0.05)
+    manager.start()
+    try:
+        deadline = time.time() + 5
+        while not manager.ready and time.time() < deadline:
+            time.sleep(0.01)
+        assert manager.status() == {"customers.state_code": "periodic"}
+        db.customers.insert_one({"name": "new", "address": "1 Main St\nReno, NV 89501"})
+        deadline = time.time() + 5
+        while db.customers.count_documents({"state_code": "NV"}) == 0 and time.time() < deadline:
+            time.sleep(0.01)
+        assert db.customers.count_documents({"state_code": "NV"}) == 1
+    finally:
+        manager.stop()
+
+
+def test_execute_query_runs_rewritten_filter(db):
+    derived = DerivedFieldManager(db)
+    derived.reconcile(derived.fields[0])
+    derived._mark_ready(derived.fields[0], "periodic")
+    manager = DatabaseManager("mongodb://unused", "sample_analytics")
+    manager.db = db
+    manager.derived_fields = derived
+
+    # A document whose derived field says CA is found through state_code, not the regex
+    db.customers.update_one({"name": "c1"}, {"$set": {"state_code": "CA"}})
+    result = manager.execute_query("customers", "count", {"query_type": "count", "filter": IN_CA})
+    assert result["data"] == [{"count": 3}]
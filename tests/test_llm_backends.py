@@ -0,0 +1,132 @@
+# tests/test_llm_backends.py
+import sys
+import os
+import json
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.deadline import Deadline, deadline_scope
+from src.llm_backends import (
+    FaultInjectingBackend, LLMBackend, LLMResponse, LLMTimeout, RecordingBackend, ReplayBackend, ReplayMiss,
+    load_recordings
+)
+import src.nlp_processor as nlp_module
+from src.admission import AdmissionController, CircuitBreaker, RecentIntents
+from src.nlp_processor import NLPProcessor
+
+
+def _prompt(question, sample="{}"):
+    return f"You are an expert.\nUser question: '{question}'\nCollection: accounts\nData format example: {sample}\n"
+
+
+class ScriptedBackend(LLMBackend):
+    model = "scripted"
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+
+    def invoke(self, prompt, timeout=None):
+        time.sleep(self.delay)
+        return LLMResponse(content='{"query_type": "count", "filter": {"limit": 10000}}')
+
+
+def test_backend_without_invoke_fails_at_construction():
+    class Incomplete(LLMBackend):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_recordings_replay_offline(tmp_path):
+    path = str(tmp_path / "calls" / "llm.jsonl")
+    recorder = RecordingBackend(ScriptedBackend(delay=0.02), path)
+    recorder.invoke(_prompt("How many accounts have a limit of 10000?"))
+    recorded = load_recordings(path)
+    assert recorded[0]["latency"] >= 0.02 and recorded[0]["model"] == "scripted"
+
+    replay = ReplayBackend(path, latency="none")
+    expected = recorded[0]["response"]
+    assert replay.invoke(_prompt("How many accounts have a limit of 10000?")).content == expected
+    # A different sampled example document still matches on the question
+    assert replay.invoke(_prompt("how many accounts have a limit of 10000?", '{"x": 1}')).content == expected
+    with pytest.raises(ReplayMiss):
+        replay.invoke(_prompt("Show accounts with commodities"))
+
+
+def test_replay_latency_modes_and_timeouts():
+    recordings = [{"prompt_hash": "-", "question_key": "accounts\nslow one", "response": "{}", "latency": 0.05}]
+    recorded = ReplayBackend(latency="recorded", recordings=recordings)
+    started = time.perf_counter()
+    recorded.invoke(_prompt("Slow one"))
+    assert time.perf_counter() - started >= 0.05
+    with pytest.raises(LLMTimeout):
+        recorded.invoke(_prompt("Slow one"), timeout=0.01)
+    assert ReplayBackend(latency="recorded", speedup=100, recordings=recordings)._lookup(_prompt("Slow one"))["delay"] \
+        == pytest.approx(0.0005)
+
+    delays = [ReplayBackend(latency="synthetic", synthetic_latency=(0.4, 1.2), seed=7,
+                            recordings=recordings)._lookup(_prompt("Slow one"))["delay"] for _ in range(2)]
+    assert delays[0] == delays[1]  # Seeded
+    synthetic = ReplayBackend(latency="synthetic", synthetic_latency=(0.4, 1.2), seed=1, recordings=recordings)
+    samples = sorted(synthetic._lookup(_prompt("Slow one"))["delay"] for _ in range(2000))
+    assert samples[1000] == pytest.approx(0.4, rel=0.15)
+    assert samples[1900] == pytest.approx(1.2, rel=0.25)
+
+
+def test_fault_injection():
+    malformed = FaultInjectingBackend(ScriptedBackend(), malformed_rate=1.0, timeout_rate=0.0, seed=3)
+    for _ in range(8):
+        content = malformed.invoke("prompt").content
+        with pytest.raises(ValueError):
+            json.loads(content)
+    assert malformed.injected["malformed"] == 8
+
+    hanging = FaultInjectingBackend(ScriptedBackend(), malformed_rate=0.0, timeout_rate=1.0, timeout_seconds=5)
+    started = time.perf_counter()
+    with pytest.raises(LLMTimeout):
+        hanging.invoke("prompt", timeout=0.02)
+    assert time.perf_counter() - started < 1
+
+    clean = FaultInjectingBackend(ScriptedBackend(), malformed_rate=0.0, timeout_rate=0.0)
+    assert clean.invoke("prompt").content.startswith("{")
+
+
+class FakeDatabaseManager:
+    def get_schema(self, collection_name):
+        return {"fields": {"limit": {"type": ["int"]}}}
+
+    def get_sample_document(self, collection_name):
+        return {"limit": 10000}
+
+
+class NoDictionaries:
+    def get(self, collection_name):
+        raise LookupError("not built")
+
+
+def _processor(backend):
+    processor = NLPProcessor(FakeDatabaseManager(), llm_backend=backend)
+    processor.value_dictionaries = NoDictionaries()
+    return processor
+
+
+def test_pipeline_runs_on_replayed_and_faulty_backends(monkeypatch, tmp_path):
+    monkeypatch.setattr(nlp_module, "llm_breaker", CircuitBreaker(failure_threshold=100))
+    monkeypatch.setattr(nlp_module, "llm_admission", AdmissionController(max_concurrent=2))
+    monkeypatch.setattr(nlp_module, "recent_intents", RecentIntents())
+    path = str(tmp_path / "llm.jsonl")
+    question = "How many accounts have a limit of 10000?"
+
+    expected = _processor(RecordingBackend(ScriptedBackend(), path)).parse_query(question, "accounts")
+    assert expected == {"query_type": "count", "filter": {"limit": 10000}}
+    assert _processor(ReplayBackend(path, latency="none")).parse_query(question, "accounts") == expected
+
+    broken = FaultInjectingBackend(ReplayBackend(path, latency="none"), malformed_rate=1.0, timeout_rate=0.0)
+    assert _processor(broken).parse_query(question, "accounts")["error_type"] == "processing"
+
+    stalled = FaultInjectingBackend(ReplayBackend(path, latency="none"), malformed_rate=0.0, timeout_rate=1.0)
+    with deadline_scope(Deadline(50)):
+        assert _processor(stalled).parse_query(question, "accounts")["error_type"] == "timeout"
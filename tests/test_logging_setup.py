@@ -0,0 +1,90 @@
+# tests/test_logging_setup.py
+import sys
+import os
+import io
+import json
+import logging
+import queue
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.logging_setup import (
+    ContextFilter, NonBlockingQueueHandler, configure_logging, log_context, payload_sampled, shutdown_logging
+)
+
+
+@pytest.fixture
+def json_logs():
+    root = logging.getLogger()
+    level = root.level
+    stream = io.StringIO()
+    configure_logging(level="INFO", fmt="json", stream=stream)
+
+    def read():
+        shutdown_logging()  # Flushes the queue
+        return [json.loads(line) for line in stream.getvalue().splitlines()]
+    yield read
+    shutdown_logging()
+    root.setLevel(level)
+
+
+def test_json_records_carry_context_and_extras(json_logs):
+    logger = logging.getLogger("tests.logging")
+    logger.info("outside")
+    with log_context(session_id="s-1", request_id="r-1"):
+        logger.info("answered %s", "query", extra={"collection": "accounts"})
+        with log_context(request_id="r-2"):
+            logger.debug("not at INFO")
+            try:
+                raise ValueError("bad intent")
+            except ValueError:
+                logger.exception("failed")
+
+    outside, answered, failed = json_logs()
+    assert outside["message"] == "outside" and "session_id" not in outside
+    assert answered["message"] == "answered query" and answered["level"] == "INFO"
+    assert (answered["session_id"], answered["request_id"], answered["collection"]) == ("s-1", "r-1", "accounts")
+    assert answered["logger"] == "tests.logging"
+    assert (failed["session_id"], failed["request_id"]) == ("s-1", "r-2")
+    assert "ValueError: bad intent" in failed["exc_info"]
+
+
+def test_payloads_are_sampled_per_request_and_truncated():
+    def filtered(level, payload, request_id, rate):
+        record = logging.LogRecord("t", level, __file__, 1, "LLM response received", None, None)
+        record.payload = payload
+        with log_context(request_id=request_id):
+            ContextFilter(sample_rate=rate, max_chars=10).filter(record)
+        return record
+
+    assert not hasattr(filtered(logging.INFO, "{}", "r-1", 0.0), "payload")
+    assert filtered(logging.WARNING, "{}", "r-1", 0.0).payload == "{}"
+    long = filtered(logging.INFO, "x" * 50, "r-1", 1.0)
+    assert long.payload == "x" * 10 and long.payload_truncated == 50
+
+    # The same request is either always or never sampled, at about the configured rate
+    with log_context(request_id="r-7"):
+        assert len({payload_sampled(0.5) for _ in range(20)}) == 1
+    kept = 0
+    for i in range(2000):
+        with log_context(request_id=f"req-{i}"):
+            kept += payload_sampled(0.1)
+    assert 120 < kept < 280
+
+
+def test_full_queue_drops_instead_of_blocking():
+    handler = NonBlockingQueueHandler(queue.Queue(maxsize=1))
+    for i in range(3):
+        handler.handle(logging.LogRecord("t", logging.INFO, __file__, 1, "message %d", (i,), None))
+    assert handler.dropped == 2
+    assert handler.queue.get_nowait().msg == "message 0"
+
+
+def test_responses_echo_request_id():
+    from fastapi.testclient import TestClient
+    import app as agent_app
+
+    client = TestClient(agent_app.app)
+    assert client.get("/health", headers={"X-Request-ID": "abc"}).headers["X-Request-ID"] == "abc"
+    assert len(client.get("/health").headers["X-Request-ID"]) == 32
@@ -0,0 +1,110 @@
+# tests/test_materializer.py
+import sys
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.materializer import Materializer, find_hot_intents, intent_signature
+from src.database_manager import DatabaseManager
+
+mongomock = pytest.importorskip("mongomock")
+
+IN_CA = {"address": {"$regex": "\\bCA\\b", "$options": "i"}}
+BY_TIER = [{"$group": {"_id": "$tier", "customers": {"$sum": 1}}}, {"$sort": {"_id": 1}}]
+
+
+class MergingDatabase:
+    """mongomock database whose aggregate() applies a trailing $merge stage."""
+
+    def __init__(self, db):
+        self.db = db
+        self.pipelines = []
+
+    def __getitem__(self, name):
+        outer = self
+        collection = self.db[name]
+
+        class Collection:
+            def aggregate(self, pipeline):
+                outer.pipelines.append(pipeline)
+                merge = pipeline[-1]["$merge"]
+                for doc in collection.aggregate(pipeline[:-1]):
+                    outer.db[merge["into"]].replace_one({"_id": doc["_id"]}, doc, upsert=True)
+                return iter([])
+
+        return Collection()
+
+
+@pytest.fixture
+def databases():
+    client = mongomock.MongoClient()
+    db = client.sample_analytics
+    db.customers.insert_many([
+        {"name": f"c{i}", "address": "Fresno, CA" if i % 2 else "Austin, TX", "tier": ["gold", "silver"][i % 2]}
+        for i in range(10)
+    ])
+    now = datetime.utcnow()
+    events = [
+        {"collection": "customers", "intent": {"query_type": "count", "filter": IN_CA}, "n": 6},
+        {"collection": "customers", "intent": {"query_type": "aggregate", "pipeline": BY_TIER}, "n": 5},
+        {"collection": "customers", "intent": {"query_type": "count", "filter": {}}, "n": 9},
+        {"collection": "customers", "intent": {"query_type": "count", "filter": {"tier": "gold"}}, "n": 2},
+        {"collection": "customers", "intent": {"query_type": "find", "filter": {}}, "n": 9},
+    ]
+    for event in events:
+        for _ in range(event["n"]):
+            db.events.insert_one({"type": "ai_response", "timestamp": now, "response_success": True,
+                                  "collection": event["collection"], "intent": event["intent"]})
+    db.events.insert_one({"type": "ai_response", "timestamp": now - timedelta(days=3), "response_success": True,
+                          "collection": "customers", "intent": {"query_type": "count", "filter": {"tier": "gold"}}})
+    return db
+
+
+def test_find_hot_intents(databases):
+    hot = find_hot_intents(databases.events, datetime.utcnow() - timedelta(hours=24), min_hits=5)
+    assert [(entry["intent"]["query_type"], entry["hits"]) for entry in hot] == [("count", 6), ("aggregate", 5)]
+    assert hot[0]["intent"]["filter"] == IN_CA
+
+
+def test_refresh_and_lookup(databases):
+    merging = MergingDatabase(databases)
+    materializer = Materializer(databases, databases.events, refresh_db=merging, max_age=60)
+    assert materializer.refresh_hot() == {"hot": 2, "refreshed": 2}
+    assert all(pipeline[-1]["$merge"]["on"] == "_id" for pipeline in merging.pipelines)
+
+    count = {"query_type": "count", "filter": IN_CA}
+    assert materializer.lookup("customers", count) == [{"count": 5}]
+    assert materializer.lookup("customers", {"query_type": "aggregate", "pipeline": BY_TIER}) == [
+        {"_id": "gold", "customers": 5}, {"_id": "silver", "customers": 5}]
+    # Cold intents never touch the summary collections
+    assert materializer.lookup("customers", {"query_type": "count", "filter": {"tier": "gold"}}) is None
+
+    key = intent_signature("customers", count)
+    databases.materialized_counts.update_one(
+        {"_id": key}, {"$set": {"refreshed_at": datetime.utcnow() - timedelta(minutes=5)}})
+    assert materializer.lookup("customers", count) is None
+    assert materializer.stats() == {"hot_intents": 2, "hits": 2, "misses": 1}
+
+
+def test_empty_results_are_materialized(databases):
+    materializer = Materializer(databases, databases.events, refresh_db=MergingDatabase(databases))
+    nobody = {"query_type": "count", "filter": {"address": "Nowhere"}}
+    assert materializer.refresh("customers", nobody)
+    assert materializer.lookup("customers", nobody) == [{"count": 0}]
+
+
+def test_execute_query_uses_materializations_and_metadata_counts(databases):
+    manager = DatabaseManager("mongodb://unused", "sample_analytics")
+    manager.db = databases
+    manager.materializer = Materializer(databases, databases.events, refresh_db=MergingDatabase(databases))
+    manager.materializer.refresh("customers", {"query_type": "count", "filter": IN_CA})
+    databases.customers.insert_one({"name": "late", "address": "Oakland, CA"})
+
+    served = manager.execute_query("customers", "count", {"filter": IN_CA})
+    assert served["source"] == "materialized" and served["data"] == [{"count": 5}]
+
+    live = manager.execute_query("customers", "count", {"filter": {"tier": "gold"}})
+    assert live["source"] == "mongodb" and live["data"] == [{"count": 5}]
+    assert manager.execute_query("customers", "count", {"filter": {}})["data"] == [{"count": 11}]
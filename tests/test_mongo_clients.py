@@ -0,0 +1,116 @@
+# tests/test_mongo_clients.py
+import sys
+import os
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.mongo_clients import MongoClientRegistry, PoolStatsListener
+
+URI = "mongodb://localhost:27017"
+
+
+def test_roles_get_separate_tuned_clients():
+    registry = MongoClientRegistry()
+    try:
+        query_client = registry.get_client(URI, "query")
+        assert registry.get_client(URI, "query") is query_client
+        assert registry.get_client(URI, "etl") is not query_client
+
+        options = registry.client_options("query")
+        assert options["maxPoolSize"] == query_client.options.pool_options.max_pool_size
+        assert options["minPoolSize"] == query_client.options.pool_options.min_pool_size
+        assert "compressors" not in registry.client_options("analytics")
+    finally:
+        registry.close_all()
+
+
+def test_unknown_role_is_rejected():
+    registry = MongoClientRegistry()
+    try:
+        registry.get_client(URI, "reporting")
+    except ValueError as e:
+        assert "reporting" in str(e)
+    else:
+        raise AssertionError("expected ValueError")
+
+
+def test_pool_stats_reports_utilization():
+    registry = MongoClientRegistry()
+    try:
+        registry.get_client(URI, "analytics")
+        listener = registry._listeners[(URI, "analytics")]
+        listener.connection_created(None)
+        listener.connection_check_out_started(None)
+        listener.connection_checked_out(None)
+
+        stats = registry.pool_stats()
+        assert len(stats) == 1
+        assert stats[0]["role"] == "analytics"
+        assert stats[0]["hosts"] == ["localhost:27017"]
+        assert stats[0]["checked_out"] == 1
+        assert stats[0]["waiting"] == 0
+        assert stats[0]["utilization"] == 1 / stats[0]["max_pool_size"]
+    finally:
+        registry.close_all()
+
+
+def test_listener_tracks_waits_and_failures():
+    listener = PoolStatsListener()
+    listener.connection_check_out_started(None)
+    listener.connection_check_out_started(None)
+    listener.connection_check_out_failed(None)
+    snapshot = listener.snapshot()
+    assert snapshot["max_waiting"] == 2
+    assert snapshot["waiting"] == 1
+    assert snapshot["checkout_failures"] == 1
+
+
+def test_background_roles_prefer_secondaries():
+    registry = MongoClientRegistry()
+    try:
+        assert registry.get_client(URI, "query").read_preference.mode == 0  # primary
+        for role in ("analytics", "etl", "sampling"):
+            preference = registry.get_client(URI, role).read_preference.document
+            assert preference["mode"] == "secondaryPreferred"
+            assert preference["maxStalenessSeconds"] >= 90
+            assert preference["tags"][-1] == {}  # Any secondary when no tagged one is available
+    finally:
+        registry.close_all()
+
+    # Staleness and tags are dropped when a role is switched back to the primary
+    pinned = MongoClientRegistry({"etl": {"readPreference": "primary", "maxStalenessSeconds": 120,
+                                          "readPreferenceTags": ["workload:analytics", ""]}})
+    assert "maxStalenessSeconds" not in pinned.client_options("etl")
+    assert "readPreferenceTags" not in pinned.client_options("etl")
+
+
+@pytest.mark.skipif(not os.getenv("MONGODB_RS_URI"), reason="set MONGODB_RS_URI to a replica set, e.g. "
+                    "mongod --replSet rs0 plus rs.initiate() -> mongodb://localhost:27017/?replicaSet=rs0")
+def test_etl_reads_route_through_secondary_preference_on_a_replica_set():
+    from pymongo import MongoClient, monitoring
+
+    class Commands(monitoring.CommandListener):
+        def __init__(self):
+            self.events = []
+
+        def started(self, event):
+            self.events.append(event)
+
+        def succeeded(self, event):
+            pass
+
+        def failed(self, event):
+            pass
+
+    commands = Commands()
+    registry = MongoClientRegistry()
+    client = MongoClient(os.environ["MONGODB_RS_URI"], event_listeners=[commands], **registry.client_options("etl"))
+    try:
+        # A single-member set has no secondary, so the read falls back to the primary
+        client.rs_read_routing_test.events.find_one({})
+        find = next(event for event in commands.events if event.command_name == "find")
+        assert find.command["$readPreference"]["mode"] == "secondaryPreferred"
+        assert find.command["$readPreference"]["maxStalenessSeconds"] >= 90
+    finally:
+        client.close()
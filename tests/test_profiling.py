@@ -0,0 +1,113 @@
+# tests/test_profiling.py
+import sys
+import os
+import threading
+import time
+import xml.etree.ElementTree as ET
+from collections import Counter
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.profiling import StackSampler, render_flamegraph
+
+
+def _busy_spin(seconds):
+    end = time.perf_counter() + seconds
+    total = 0
+    while time.perf_counter() < end:
+        total += 1
+    return total
+
+
+def test_samples_only_profiled_threads():
+    sampler = StackSampler(sample_rate=1.0, interval=0.002)
+    other = threading.Thread(target=_busy_spin, args=(0.2,))
+    other.start()
+    sampler.profiled(lambda: _busy_spin(0.2))()
+    other.join()
+
+    stacks = sampler.stacks(60)
+    assert sampler.stats()["profiled_requests"] == 1 and sampler.stats()["profiling_now"] == 0
+    assert sum(stacks.values()) >= 10
+    # Every sample comes from the profiled thread, root first
+    assert all(any(label.endswith(":<lambda>") for label in stack) for stack in stacks)
+    assert any(stack[-1] == "test_profiling.py:_busy_spin" for stack in stacks)
+
+    # Idle once no request is profiled
+    time.sleep(0.02)
+    samples = sampler.samples
+    time.sleep(0.05)
+    assert sampler.samples == samples
+
+
+def test_sample_rate():
+    assert not any(StackSampler(sample_rate=0.0).should_sample() for _ in range(1000))
+    assert all(StackSampler(sample_rate=1.0).should_sample() for _ in range(1000))
+
+
+def test_time_window_and_collapsed_output():
+    sampler = StackSampler(bucket_seconds=10, retention=600)
+    now = 10_000.0
+    sampler.record(("app.py:handle", "nlp_processor.py:parse_query"), at=now - 500, count=3)
+    sampler.record(("app.py:handle", "nlp_processor.py:parse_query"), at=now - 5, count=2)
+    sampler.record(("app.py:handle", "database_manager.py:sanitize"), at=now - 5)
+
+    assert sampler.collapsed(60, now=now).splitlines() == [
+        "app.py:handle;database_manager.py:sanitize 1",
+        "app.py:handle;nlp_processor.py:parse_query 2",
+    ]
+    assert sampler.stacks(600, now=now)[("app.py:handle", "nlp_processor.py:parse_query")] == 5
+
+    # Buckets past retention are dropped
+    sampler.record(("app.py:handle",), at=now + 200)
+    assert sampler.stacks(10_000, now=now + 200)[("app.py:handle", "nlp_processor.py:parse_query")] == 2
+
+
+def test_flamegraph_svg():
+    counts = Counter({("app.py:handle", "nlp.py:parse<query>"): 3, ("app.py:handle", "db.py:run"): 1})
+    root = ET.fromstring(render_flamegraph(counts, "test"))
+    titles = [el.text for el in root.iter("{http://www.w3.org/2000/svg}title")]
+    assert "app.py:handle (4 samples, 100.00%)" in titles
+    assert "nlp.py:parse<query> (3 samples, 75.00%)" in titles
+    frames = [el for el in root.iter("{http://www.w3.org/2000/svg}rect") if el.get("rx")]
+    assert len(frames) == 3
+    # Empty profiles still render
+    ET.fromstring(render_flamegraph(Counter()))
+
+
+def test_profile_endpoint(monkeypatch):
+    from fastapi.testclient import TestClient
+    import app as agent_app
+    from src.result_cache import SessionResultCache
+
+    class SlowNLPProcessor:
+        def parse_query(self, user_text, collection_name, session_context=None):
+            _busy_spin(0.1)
+            return {"query_type": "error", "error_type": "processing", "error_message": "No intent"}
+
+    class FakeConversationManager:
+        session_id = "default-session"
+
+        def add_user_message_to_analytics(self, text, collection=None, session_id=None):
+            pass
+
+        def add_ai_message_to_analytics(self, text, intent, success_flag, exec_time, session_id=None,
+                                        collection=None, results=None, question=None):
+            pass
+
+    sampler = StackSampler(sample_rate=1.0, interval=0.002)
+    monkeypatch.setattr(agent_app, "profiler", sampler)
+    monkeypatch.setattr(agent_app, "nlp_processor", SlowNLPProcessor())
+    monkeypatch.setattr(agent_app, "conv_manager", FakeConversationManager())
+    monkeypatch.setattr(agent_app, "result_cache", SessionResultCache())
+    monkeypatch.setattr(agent_app.startup_state, "ready", True)
+
+    client = TestClient(agent_app.app)
+    assert client.post("/query", json={"collection": "accounts", "query_text": "Anything?"}).status_code == 200
+
+    collapsed = client.get("/admin/profile", params={"format": "collapsed", "seconds": 60})
+    assert "app.py:_answer_query" in collapsed.text and "test_profiling.py:_busy_spin" in collapsed.text
+    svg = client.get("/admin/profile")
+    assert svg.headers["content-type"].startswith("image/svg+xml")
+    ET.fromstring(svg.text)
+    assert client.get("/admin/profile", params={"format": "stats"}).json()["profiled_requests"] == 1
+    assert client.get("/admin/profile", params={"format": "pdf"}).status_code == 400
@@ -0,0 +1,129 @@
+# tests/test_projection.py
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.projection import apply_projection, bulky_fields, infer_projection
+from src.schema_profiler import SchemaProfiler
+
+
+def _customers(n=30):
+    for i in range(n):
+        doc = {
+            "username": f"user{i}",
+            "name": f"Customer {i}",
+            "address": f"{i} Main St\nSpringfield, {['CA', 'TX'][i % 2]} 9{i:04d}",
+            "birthdate": f"19{50 + i}-01-01",
+            "email": f"user{i}@example.com",
+            "accounts": [100000 + i, 200000 + i],
+            "active": bool(i % 2),
+            # Keyed by a generated id, like sample_analytics.customers
+            "tier_and_details": {f"{i:032x}{k}": {"tier": "Gold", "id": f"{i}-{k}", "active": True,
+                                                  "benefits": ["lounge"]} for k in range(3)},
+        }
+        if i % 3 == 0:
+            doc["nickname"] = f"nick{i}"
+        yield doc
+
+
+SCHEMA = {"fields": SchemaProfiler().add_many(_customers()).summary()}
+
+
+def test_bulky_nested_fields_are_detected():
+    bulky = bulky_fields(SCHEMA["fields"])
+    assert bulky == {"tier_and_details"}
+    # Arrays of sub-documents are bulky, arrays of scalars are not
+    assert bulky_fields({"items": {}, "items[]": {}, "items[].sku": {}, "tags": {}, "tags[]": {}}) == {"items"}
+
+
+def test_default_projection_keeps_filter_question_and_render_fields():
+    intent = {"query_type": "find", "filter": {"address": {"$regex": "\\bCA\\b"}}, "sort": {"birthdate": -1}}
+    projection = infer_projection("List customers in CA by birthdate with their emails", intent, SCHEMA)
+    for field in ("address", "birthdate", "email", "name"):
+        assert projection[field] == 1
+    assert "tier_and_details" not in projection
+    assert "_id" not in projection
+    assert len(projection) <= 8
+
+
+def test_budget_caps_filler_but_not_required_fields():
+    intent = {"query_type": "find", "filter": {"active": True, "email": {"$exists": True}}}
+    projection = infer_projection("active customers", intent, SCHEMA, budget=3)
+    assert set(projection) == {"active", "email", "name"}
+    # Filler prefers fields present on every document
+    projection = infer_projection("customers", {"query_type": "find", "filter": {}}, SCHEMA, budget=7)
+    assert "nickname" not in projection and "tier_and_details" not in projection
+
+
+def test_bulky_fields_are_returned_when_named():
+    projection = infer_projection("Show customer tiers", {"query_type": "find", "filter": {}}, SCHEMA)
+    assert projection["tier_and_details"] == 1
+    assert not any(path.startswith("tier_and_details.") for path in projection)
+
+
+def test_whole_documents_when_asked_for():
+    assert infer_projection("Show all details for user7", {"query_type": "find", "filter": {}}, SCHEMA) is None
+    assert infer_projection("customers", {"query_type": "find", "filter": {}}, {}) is None
+
+
+def test_apply_projection_precedence():
+    question = "customers in CA"
+    llm_chosen = {"query_type": "find", "filter": {}, "projection": {"username": 1}}
+    assert apply_projection(llm_chosen, question, SCHEMA) == llm_chosen
+    assert apply_projection(llm_chosen, question, SCHEMA, override={})["projection"] == {}
+    assert apply_projection(llm_chosen, question, SCHEMA, override={"email": 1})["projection"] == {"email": 1}
+    count = {"query_type": "count", "filter": {}}
+    assert apply_projection(count, question, SCHEMA) is count
+    inferred = apply_projection({"query_type": "find", "filter": {}}, question, SCHEMA,
+                                render_fields=["username"])
+    assert inferred["projection"]["username"] == 1
+
+
+def test_query_endpoint_applies_projection(monkeypatch):
+    from fastapi.testclient import TestClient
+    import app as agent_app
+    from src.result_cache import SessionResultCache
+
+    class FakeDatabaseManager:
+        def get_schema(self, collection_name):
+            return SCHEMA
+
+    class FakeNLPProcessor:
+        def __init__(self):
+            self.executed = []
+
+        def parse_query(self, user_text, collection_name, session_context=None):
+            return {"query_type": "find", "filter": {"active": True}}
+
+        def execute_intent(self, collection_name, intent):
+            self.executed.append(intent)
+            return {"success": True, "data": [], "execution_time_seconds": 0.01}
+
+    class FakeConversationManager:
+        session_id = "default-session"
+
+        def add_user_message_to_analytics(self, text, collection=None, session_id=None):
+            pass
+
+        def add_ai_message_to_analytics(self, text, intent, success_flag, exec_time, session_id=None,
+                                        collection=None, results=None, question=None):
+            pass
+
+        def save_interaction_to_memory(self, user_input, ai_output):
+            pass
+
+    fake_nlp = FakeNLPProcessor()
+    monkeypatch.setattr(agent_app, "db_manager", FakeDatabaseManager())
+    monkeypatch.setattr(agent_app, "nlp_processor", fake_nlp)
+    monkeypatch.setattr(agent_app, "conv_manager", FakeConversationManager())
+    monkeypatch.setattr(agent_app, "result_cache", SessionResultCache())
+    monkeypatch.setattr(agent_app.startup_state, "ready", True)
+
+    client = TestClient(agent_app.app)
+    body = {"collection": "customers", "query_text": "Active customers"}
+    client.post("/query", json=dict(body, session_id="a", render_fields=["username"]))
+    client.post("/query", json=dict(body, session_id="b", projection={}))
+
+    assert {"active", "username"} <= set(fake_nlp.executed[0]["projection"])
+    assert "tier_and_details" not in fake_nlp.executed[0]["projection"]
+    assert fake_nlp.executed[1]["projection"] == {}
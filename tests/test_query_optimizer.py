@@ -0,0 +1,117 @@
+# tests/test_query_optimizer.py
+import sys
+import os
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.query_optimizer import intent_key, normalize_filter, optimize_intent, optimize_pipeline
+from src.database_manager import DatabaseManager
+
+mongomock = pytest.importorskip("mongomock")
+
+
+@pytest.fixture
+def db():
+    database = mongomock.MongoClient().sample_analytics
+    database.accounts.insert_many([
+        {"account_id": i, "limit": [5000, 10000, 10000][i % 3], "products": ["Brokerage", "Commodity"][:1 + i % 2],
+         "owner": {"tier": ["gold", "silver"][i % 2]}, "score": i % 7}
+        for i in range(40)
+    ])
+    return database
+
+
+def _same_results(db, raw, optimized):
+    assert list(db.accounts.aggregate(raw)) == list(db.accounts.aggregate(optimized))
+
+
+@pytest.mark.parametrize("pipeline,expected", [
+    # Adjacent $match stages merge, and a $match {} disappears
+    ([{"$match": {"limit": 10000}}, {"$match": {}}, {"$match": {"score": {"$gt": 2}}}],
+     [{"$match": {"limit": 10000, "score": {"$gt": 2}}}]),
+    # $match moves ahead of a projection that keeps its fields
+    ([{"$project": {"account_id": 1, "limit": 1}}, {"$match": {"limit": 5000}}],
+     [{"$match": {"limit": 5000}}, {"$project": {"account_id": 1, "limit": 1}}]),
+    # ... and ahead of $sort and $addFields that don't touch them
+    ([{"$sort": {"account_id": -1}}, {"$addFields": {"double": {"$multiply": ["$score", 2]}}},
+      {"$match": {"owner.tier": "gold"}}],
+     [{"$match": {"owner.tier": "gold"}}, {"$sort": {"account_id": -1}},
+      {"$addFields": {"double": {"$multiply": ["$score", 2]}}}]),
+    # $limit moves toward the source past one-to-one stages; adjacent limits and skips merge
+    ([{"$sort": {"account_id": 1}}, {"$project": {"account_id": 1}}, {"$limit": 10}, {"$limit": 5},
+      {"$skip": 1}, {"$skip": 0}, {"$skip": 2}],
+     [{"$sort": {"account_id": 1}}, {"$limit": 5}, {"$project": {"account_id": 1}}, {"$skip": 3}]),
+])
+def test_pipeline_rewrites_are_equivalent(db, pipeline, expected):
+    optimized = optimize_pipeline(pipeline)
+    assert optimized == expected
+    _same_results(db, pipeline, optimized)
+
+
+@pytest.mark.parametrize("pipeline", [
+    # A computed field the $match reads must stay ahead of it
+    [{"$addFields": {"score": 0}}, {"$match": {"score": 0}}],
+    [{"$project": {"renamed": "$limit"}}, {"$match": {"renamed": 5000}}],
+    [{"$project": {"account_id": 1}}, {"$match": {"limit": 5000}}],
+    # Filtering after $limit or $group sees different documents
+    [{"$limit": 5}, {"$match": {"limit": 5000}}],
+    [{"$group": {"_id": "$limit", "n": {"$sum": 1}}}, {"$match": {"n": {"$gt": 1}}}],
+])
+def test_unsafe_reorders_are_left_alone(db, pipeline):
+    assert optimize_pipeline(pipeline) == pipeline
+
+
+def test_normalize_filter_is_equivalent(db):
+    raw = {"$and": [{"limit": {"$eq": 10000}}, {"$and": [{"score": {"$gte": 3}}]}, {},
+                    {"score": {"$lt": 6}}], "$or": [{"owner.tier": "gold"}]}
+    normalized = normalize_filter(raw)
+    assert normalized == {"limit": 10000, "score": {"$gte": 3}, "owner.tier": "gold",
+                          "$and": [{"score": {"$lt": 6}}]}
+    assert list(db.accounts.find(raw)) == list(db.accounts.find(normalized))
+
+
+def test_find_and_count_intents_are_canonicalized():
+    assert optimize_intent({"query_type": "Find ", "filter": {"limit": {"$eq": 5000}}, "projection": {},
+                            "pipeline": []}) == {"query_type": "find", "filter": {"limit": 5000}}
+    assert optimize_intent({"query_type": "count", "filter": None, "projection": {"a": 1}, "pipeline": []}) == {
+        "query_type": "count", "filter": {}}
+    assert optimize_intent({"query_type": "error", "error_type": "impossible"}) == {
+        "query_type": "error", "error_type": "impossible"}
+
+
+def test_counting_pipelines_become_count_queries(db):
+    manager = DatabaseManager("mongodb://unused", "sample_analytics")
+    manager.db = db
+    for pipeline in ([{"$match": {"limit": 10000}}, {"$count": "count"}],
+                     [{"$match": {"limit": 10000}}, {"$match": {"score": 1}}, {"$count": "total"}]):
+        optimized = optimize_intent({"query_type": "aggregate", "pipeline": pipeline})
+        assert optimized["query_type"] == "count"
+        result = manager.execute_query("accounts", "aggregate", {"pipeline": pipeline})
+        assert result["data"] == list(db.accounts.aggregate(pipeline))
+    # When nothing matches, MongoDB's $count outputs no document (mongomock returns a zero here)
+    result = manager.execute_query("accounts", "aggregate",
+                                   {"pipeline": [{"$match": {"limit": 123}}, {"$count": "total"}]})
+    assert result["data"] == []
+    # A count asked for directly still answers zero
+    assert manager.execute_query("accounts", "count", {"filter": {"limit": 123}})["data"] == [{"count": 0}]
+
+
+def test_finds_only_counted_become_count_queries(db):
+    manager = DatabaseManager("mongodb://unused", "sample_analytics")
+    manager.db = db
+    find = {"query_type": "find", "filter": {"limit": {"$eq": 10000}}, "projection": {"account_id": 1},
+            "sort": {"account_id": 1}, "limit": 5, "count_only": True}
+    assert optimize_intent(find) == {"query_type": "count", "filter": {"limit": 10000}}
+    result = manager.execute_query("accounts", "find", dict(find, limit=0))
+    assert result["data"] == [{"count": len(list(db.accounts.find({"limit": 10000})))}]
+    # Untagged finds still return rows
+    assert optimize_intent(dict(find, count_only=False))["query_type"] == "find"
+
+
+def test_intent_key_is_shared_by_equivalent_intents():
+    a = {"query_type": "find", "filter": {"$and": [{"limit": 5000}, {"score": 1}]}, "projection": {}, "pipeline": []}
+    b = {"query_type": "find", "filter": {"score": {"$eq": 1}, "limit": 5000}, "resolved_by": "value_dictionary"}
+    assert intent_key("accounts", a) == intent_key("accounts", b)
+    assert intent_key("accounts", a) != intent_key("customers", a)
+    assert intent_key("accounts", a) != intent_key("accounts", dict(a, filter={"limit": 5000}))
@@ -0,0 +1,84 @@
+# tests/test_replay_traffic.py
+import sys
+import os
+import json
+import threading
+import uuid
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'scripts')))
+from replay_traffic import build_schedule, group_by_session, percentile, TrafficReplayer
+
+
+def _events():
+    t0 = datetime(2025, 6, 20, 12, 0, 0)
+    return [
+        {"timestamp": t0, "session_id": "a", "text": "How many customers are there?", "collection": "customers"},
+        {"timestamp": t0 + timedelta(seconds=2), "session_id": "b", "text": "Show transactions"},
+        {"timestamp": t0 + timedelta(seconds=4), "session_id": "a", "text": "Show only their names",
+         "collection": "customers"},
+    ]
+
+
+def test_build_schedule_compresses_time_and_defaults_collection():
+    schedule = build_schedule(_events(), speedup=2.0, default_collection="transactions")
+    assert [item["offset"] for item in schedule] == [0.0, 1.0, 2.0]
+    assert schedule[1]["collection"] == "transactions"
+    assert schedule[0]["collection"] == "customers"
+
+
+def test_group_by_session_keeps_order():
+    sessions = group_by_session(build_schedule(_events()))
+    assert [[item["query_text"] for item in items] for items in sessions] == [
+        ["How many customers are there?", "Show only their names"],
+        ["Show transactions"],
+    ]
+
+
+def test_percentile_nearest_rank():
+    values = sorted(float(i) for i in range(1, 101))
+    assert percentile(values, 50) == 50.0
+    assert percentile(values, 99) == 99.0
+    assert percentile([], 90) == 0.0
+
+
+def test_replay_sends_one_fresh_session_per_recorded_session():
+    received = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            received.append(body)
+            reply = {"session_id": "server-global", "data": []}
+            if "names" in body["query_text"]:
+                reply["error"], reply["error_type"] = "ambiguous", "ambiguous"
+            payload = json.dumps(reply).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        # One worker: session "a" waiting for its second turn must not hold it from session "b"
+        replayer = TrafficReplayer(f"http://127.0.0.1:{server.server_port}/query", concurrency=1)
+        report = replayer.run(build_schedule(_events(), speedup=10.0))
+    finally:
+        server.shutdown()
+
+    assert report["requests"] == 3
+    assert report["outcomes"] == {"ok": 2, "ambiguous": 1}
+    follow_up = next(body for body in received if "names" in body["query_text"])
+    first = next(body for body in received if body["query_text"].startswith("How many"))
+    other = next(body for body in received if body["query_text"] == "Show transactions")
+    assert [body["query_text"] for body in received] == [first["query_text"], other["query_text"],
+                                                         follow_up["query_text"]]
+    assert follow_up["session_id"] == first["session_id"] != other["session_id"]
+    assert str(uuid.UUID(first["session_id"])) == first["session_id"]
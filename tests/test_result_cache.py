@@ -0,0 +1,202 @@
+# tests/test_result_cache.py
+import sys
+import os
+from datetime import datetime
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.result_cache import SessionResultCache, UnsupportedPredicate, filter_narrows, matches, project
+
+CUSTOMERS = [
+    {"_id": f"c{i}", "name": name, "address": address, "balance": balance,
+     "accounts": accounts, "tier": {"level": level}, "birthdate": datetime(1980 + i, 1, 1)}
+    for i, (name, address, balance, accounts, level) in enumerate([
+        ("Ann Lee", "12 Oak St, Fresno, CA 93650", 12500, [371138, 324287], "gold"),
+        ("Bo Chan", "4 Elm Rd, Austin, TX 73301", 800, [674364], "silver"),
+        ("Cy Diaz", "9 Pine Ave, San Diego, CA 92101", 4300, [], "bronze"),
+        ("Di Fox", "77 Main St, Oakland, CA 94601", 25000, [371138], "gold"),
+        ("Ed Gray", "1 Bay Blvd, Tampa, FL 33601", 15000, [387979, 674364], "silver"),
+    ])
+]
+
+IN_CA = {"address": {"$regex": "\\bCA\\b", "$options": "i"}}
+
+
+def test_matches_covers_prompt_operators():
+    ann = CUSTOMERS[0]
+    assert matches(ann, IN_CA)
+    assert matches(ann, {"balance": {"$gt": 10000, "$lte": 12500}})
+    assert matches(ann, {"accounts": 324287})
+    assert matches(ann, {"tier.level": {"$in": ["gold", "platinum"]}})
+    assert matches(ann, {"$or": [{"balance": {"$lt": 100}}, {"name": "Ann Lee"}]})
+    assert matches(ann, {"nickname": {"$exists": False}, "accounts": {"$size": 2}})
+    assert matches(ann, {"birthdate": {"$lt": datetime(1990, 1, 1)}})
+    assert not matches(ann, {"balance": {"$gt": "100"}})  # Types compare only within a class
+    assert not matches(ann, {"tier.level": {"$nin": ["gold"]}})
+    with pytest.raises(UnsupportedPredicate):
+        matches(ann, {"$where": "this.balance > 0"})
+    with pytest.raises(UnsupportedPredicate):
+        matches(ann, {"accounts": {"$elemMatch": {"$gt": 1}}})
+
+
+def test_filter_narrows():
+    assert filter_narrows(IN_CA, IN_CA)
+    assert filter_narrows({}, {"balance": {"$gt": 5}})
+    assert filter_narrows(IN_CA, dict(IN_CA, balance={"$gt": 10000}))
+    assert filter_narrows(IN_CA, {"$and": [IN_CA, {"balance": {"$gt": 10000}}]})
+    assert filter_narrows({"balance": {"$gt": 100}}, {"balance": {"$gt": 100, "$lt": 500}})
+    assert not filter_narrows(IN_CA, {"address": {"$regex": "\\bTX\\b", "$options": "i"}})
+    assert not filter_narrows(dict(IN_CA, balance={"$gt": 10000}), IN_CA)
+
+
+def test_project_inclusion_and_exclusion():
+    ann = CUSTOMERS[0]
+    assert project(ann, {"name": 1}) == {"_id": "c0", "name": "Ann Lee"}
+    assert project(ann, {"name": 1, "_id": 0}) == {"name": "Ann Lee"}
+    assert project(ann, {"tier.level": 1, "_id": 0}) == {"tier": {"level": "gold"}}
+    assert "accounts" not in project(ann, {"accounts": 0})
+
+
+def _seeded_cache(rows=CUSTOMERS, intent=None, **kwargs):
+    cache = SessionResultCache(**kwargs)
+    intent = intent or {"query_type": "find", "filter": IN_CA, "projection": {}}
+    cache.remember("s1", "customers", intent, [row for row in rows if matches(row, intent["filter"])])
+    return cache
+
+
+def test_follow_ups_are_answered_from_cached_rows():
+    cache = _seeded_cache()
+    names = cache.answer("s1", "customers", {"query_type": "find", "filter": IN_CA,
+                                             "projection": {"name": 1, "_id": 0}})
+    assert names == [{"name": "Ann Lee"}, {"name": "Cy Diaz"}, {"name": "Di Fox"}]
+    assert cache.answer("s1", "customers", {"query_type": "count", "filter": IN_CA}) == [{"count": 3}]
+
+    richer = cache.answer("s1", "customers", {"query_type": "find",
+                                              "filter": dict(IN_CA, balance={"$gt": 10000}),
+                                              "sort": [["balance", -1]]})
+    assert [row["name"] for row in richer] == ["Di Fox", "Ann Lee"]
+
+    levels = cache.answer("s1", "customers", {"query_type": "distinct", "field": "tier.level", "filter": IN_CA})
+    assert levels == [{"field": "tier.level", "distinct_values": ["gold", "bronze"], "count": 2}]
+    assert cache.stats()["hits"] == 4
+
+
+def test_falls_back_to_mongo_when_rows_cannot_answer():
+    cache = _seeded_cache()
+    wider = {"query_type": "count", "filter": {}}
+    other_state = {"query_type": "count", "filter": {"address": {"$regex": "\\bTX\\b"}}}
+    assert cache.answer("s1", "customers", wider) is None
+    assert cache.answer("s1", "customers", other_state) is None
+    assert cache.answer("s1", "transactions", {"query_type": "count", "filter": IN_CA}) is None
+    assert cache.answer("s2", "customers", {"query_type": "count", "filter": IN_CA}) is None
+    assert cache.answer("s1", "customers", {"query_type": "aggregate", "pipeline": []}) is None
+    unsupported = {"query_type": "count", "filter": dict(IN_CA, name={"$text": "Ann"})}
+    assert cache.answer("s1", "customers", unsupported) is None
+
+
+def test_incomplete_or_projected_results_limit_reuse():
+    truncated = _seeded_cache(intent={"query_type": "find", "filter": IN_CA, "limit": 3})
+    assert truncated.answer("s1", "customers", {"query_type": "count", "filter": IN_CA}) is None
+
+    names_only = _seeded_cache(rows=[project(row, {"name": 1}) for row in CUSTOMERS],
+                               intent={"query_type": "find", "filter": {}, "projection": {"name": 1}})
+    assert names_only.answer("s1", "customers", {"query_type": "count", "filter": {"name": "Bo Chan"}}) == [{"count": 1}]
+    # The cached rows carry no balances, so this must go to MongoDB
+    assert names_only.answer("s1", "customers", {"query_type": "count", "filter": {"balance": {"$gt": 1}}}) is None
+    assert names_only.answer("s1", "customers", {"query_type": "find", "filter": {}}) is None
+
+
+def test_null_or_malformed_limits():
+    # The LLM emits "limit": null; that means the default limit, as it does in MongoDB
+    cache = _seeded_cache(intent={"query_type": "find", "filter": IN_CA, "limit": None})
+    assert len(cache.answer("s1", "customers", {"query_type": "find", "filter": IN_CA, "limit": None})) == 3
+    assert cache.answer("s1", "customers", {"query_type": "find", "filter": IN_CA, "limit": "ten"}) is None
+    malformed = _seeded_cache(intent={"query_type": "find", "filter": IN_CA, "limit": "ten"})
+    assert malformed.answer("s1", "customers", {"query_type": "count", "filter": IN_CA}) is None
+
+
+def test_context_tracks_last_turn_and_entries_expire():
+    cache = _seeded_cache(ttl=0)
+    assert cache.context("s1") == {"last_filter": IN_CA, "last_query_type": "find", "last_projection": {}}
+    assert cache.context("unknown") is None
+    assert cache.answer("s1", "customers", {"query_type": "count", "filter": IN_CA}) is None
+
+
+def test_in_process_results_match_mongo():
+    mongomock = pytest.importorskip("mongomock")
+    collection = mongomock.MongoClient().db.customers
+    collection.insert_many([dict(row) for row in CUSTOMERS])
+    cache = SessionResultCache()
+    cache.remember("s1", "customers", {"query_type": "find", "filter": IN_CA},
+                   list(collection.find(IN_CA)))
+
+    follow_ups = [
+        {"query_type": "find", "filter": dict(IN_CA, balance={"$gte": 4300}), "projection": {"name": 1, "balance": 1}},
+        {"query_type": "find", "filter": dict(IN_CA, accounts=371138), "projection": {"_id": 0, "name": 1}},
+        {"query_type": "find", "filter": {"$and": [IN_CA, {"tier.level": {"$ne": "gold"}}]}},
+        {"query_type": "find", "filter": IN_CA, "sort": [["balance", 1]], "limit": 2},
+    ]
+    for intent in follow_ups:
+        expected = list(collection.find(intent["filter"], intent.get("projection")).sort(
+            intent.get("sort") or [("_id", 1)]).limit(intent.get("limit", 100)))
+        assert cache.answer("s1", "customers", intent) == expected
+    count = {"query_type": "count", "filter": dict(IN_CA, balance={"$lt": 20000})}
+    assert cache.answer("s1", "customers", count) == [{"count": collection.count_documents(count["filter"])}]
+
+
+def test_query_endpoint_reuses_previous_turn(monkeypatch):
+    from fastapi.testclient import TestClient
+    import app as agent_app
+
+    class FakeNLPProcessor:
+        def __init__(self):
+            self.contexts, self.executed = [], []
+
+        def parse_query(self, user_text, collection_name, session_context=None):
+            self.contexts.append(session_context)
+            if user_text.startswith("How many"):
+                return {"query_type": "count", "filter": IN_CA}
+            return {"query_type": "find", "filter": IN_CA, "projection": {}}
+
+        def execute_intent(self, collection_name, intent):
+            self.executed.append(intent["query_type"])
+            rows = [row for row in CUSTOMERS if matches(row, intent["filter"])]
+            return {"success": True, "data": rows, "execution_time_seconds": 0.01}
+
+    class FakeConversationManager:
+        session_id = "default-session"
+
+        def add_user_message_to_analytics(self, text, collection=None, session_id=None):
+            pass
+
+        def add_ai_message_to_analytics(self, text, intent, success_flag, exec_time, session_id=None,
+                                        collection=None, results=None, question=None):
+            pass
+
+        def save_interaction_to_memory(self, user_input, ai_output):
+            pass
+
+    fake_nlp = FakeNLPProcessor()
+    monkeypatch.setattr(agent_app, "nlp_processor", fake_nlp)
+    monkeypatch.setattr(agent_app, "conv_manager", FakeConversationManager())
+    monkeypatch.setattr(agent_app, "result_cache", SessionResultCache())
+    monkeypatch.setattr(agent_app.startup_state, "ready", True)
+
+    client = TestClient(agent_app.app)
+    body = {"session_id": "drill-down", "collection": "customers"}
+    first = client.post("/query", json=dict(body, query_text="Customers in California"))
+    second = client.post("/query", json=dict(body, query_text="How many are there?"))
+
+    assert len(first.json()["data"]) == 3
+    assert second.json()["data"] == [{"count": 3}]
+    assert fake_nlp.executed == ["find"]
+    assert fake_nlp.contexts[1]["last_filter"] == IN_CA
+
+    # Callers without a session id never see each other's turns
+    anonymous = {"collection": "customers"}
+    first = client.post("/query", json=dict(anonymous, query_text="Customers in California"))
+    second = client.post("/query", json=dict(anonymous, query_text="How many are there?"))
+    assert first.json()["session_id"] != second.json()["session_id"]
+    assert fake_nlp.contexts[-1] is None
+    assert fake_nlp.executed == ["find", "find", "count"]
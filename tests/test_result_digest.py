@@ -0,0 +1,64 @@
+# tests/test_result_digest.py
+import sys
+import os
+import logging
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.result_digest import ResultPayloadStore, digest_results
+
+
+def test_digest_is_compact_and_stable():
+    rows = [{"name": f"customer {i}", "accounts": list(range(i))} for i in range(100)]
+    digest = digest_results(rows, preview_rows=5, preview_bytes=10_000)
+    assert digest["count"] == 100 and digest["bytes"] > 10_000
+    assert digest["preview"] == rows[:5] and digest["preview_truncated"]
+
+    # Key order does not matter, row order does
+    reordered = [{"accounts": row["accounts"], "name": row["name"]} for row in rows]
+    assert digest_results(reordered)["hash"] == digest["hash"]
+    assert digest_results(list(reversed(rows)))["hash"] != digest["hash"]
+
+    # The byte budget cuts the preview, which stays a prefix of the results
+    budgeted = digest_results([{"x": "a" * 50}, {"x": "b" * 500}, {"x": "c"}], preview_rows=3, preview_bytes=100)
+    assert budgeted["preview"] == [{"x": "a" * 50}]
+    assert digest_results([]) == {"count": 0, "bytes": 0, "hash": digest_results([])["hash"],
+                                  "preview": [], "preview_truncated": False}
+
+
+def test_payload_store_round_trips_with_ttl():
+    mongomock = pytest.importorskip("mongomock")
+    collection = mongomock.MongoClient().analytics.event_payloads
+    store = ResultPayloadStore(collection, ttl=3600, max_bytes=1024)
+    ttl_index = [index for index in collection.index_information().values()
+                 if index["key"] == [("created_at", 1)]]
+    assert ttl_index[0]["expireAfterSeconds"] == 3600
+
+    rows = [{"name": "Ann", "balance": 10}] * 200
+    payload_id = store.save(rows, digest_results(rows)["hash"])
+    assert store.load(payload_id) == rows
+    assert len(collection.find_one()["data"]) < 1024  # Stored compressed
+
+    incompressible = [{"blob": os.urandom(2048).hex()}]
+    assert store.save(incompressible, "h") is None
+
+
+def test_ai_events_store_digests_not_results():
+    mongomock = pytest.importorskip("mongomock")
+    from src.conversation_manager import ConversationManager
+
+    analytics_db = mongomock.MongoClient().analytics
+    manager = ConversationManager.__new__(ConversationManager)
+    manager.logger, manager.session_id, manager.analytics_db = logging.getLogger("test"), "s-1", analytics_db
+    manager.payloads = ResultPayloadStore(analytics_db.event_payloads)
+
+    rows = [{"name": f"customer {i}", "notes": "x" * 200} for i in range(50)]
+    manager.add_ai_message_to_analytics("50 results", {"query_type": "find"}, True, 0.25,
+                                        collection="customers", results=rows)
+    event = manager.analytics_db.events.find_one({"type": "ai_response"})
+    # Fields the ETL reads are unchanged
+    assert (event["intent"], event["response_success"], event["execution_time"]) == ({"query_type": "find"}, True, 0.25)
+    assert event["text"] == "50 results"
+    assert event["result"]["count"] == 50 and event["result"]["preview_truncated"]
+    assert manager.payloads.load(event["result"]["payload_id"]) == rows
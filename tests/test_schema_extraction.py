@@ -0,0 +1,52 @@
+# tests/test_schema_extraction.py
+import sys
+import os
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.database_manager import DatabaseManager
+
+
+def test_extract_schemas_runs_collections_concurrently(monkeypatch):
+    db_manager = DatabaseManager("mongodb://localhost:27017", "sample_analytics")
+    db_manager.db = object()  # extract_schema is stubbed below
+    delays = {"customers": 0.2, "accounts": 0.1, "transactions": 0.2, "empty": 0.0}
+
+    def fake_extract_schema(collection_name, sample_size=100):
+        time.sleep(delays[collection_name])
+        if collection_name == "empty":
+            return {"error": f"No documents found in collection {collection_name}"}
+        return {"collection_name": collection_name, "fields": {}, "sample_size": sample_size}
+
+    monkeypatch.setattr(db_manager, "extract_schema", fake_extract_schema)
+    completed = []
+    result = db_manager.extract_schemas(list(delays), sample_size=20, max_workers=4,
+                                        on_complete=lambda name, schema: completed.append(name))
+
+    assert set(result["schemas"]) == set(delays)
+    assert result["schemas"]["customers"]["sample_size"] == 20
+    assert result["failed"] == ["empty"]
+    assert sorted(completed) == sorted(delays)
+    assert result["timings"]["customers"] >= 0.2
+    # Bounded by the slowest collection, not the 0.5s sum
+    assert result["total_seconds"] < 0.45
+
+
+def test_get_schema_serves_from_cache(monkeypatch):
+    db_manager = DatabaseManager("mongodb://localhost:27017", "sample_analytics")
+    calls = []
+
+    def fake_extract_schema(collection_name, sample_size=100):
+        calls.append(collection_name)
+        schema = {"collection_name": collection_name, "fields": {}}
+        info = db_manager._collection_info(collection_name)
+        info["schema"] = schema
+        info["last_updated"] = datetime.now()
+        return schema
+
+    monkeypatch.setattr(db_manager, "extract_schema", fake_extract_schema)
+    first = db_manager.get_schema("customers")
+    assert db_manager.get_schema("customers") is first
+    assert db_manager.get_schema("customers", max_age=0) is not first
+    assert calls == ["customers", "customers"]
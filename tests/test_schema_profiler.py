@@ -0,0 +1,77 @@
+# tests/test_schema_profiler.py
+import sys
+import os
+from datetime import datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.schema_profiler import HyperLogLog, TopK, SchemaProfiler
+
+
+def test_hyperloglog_estimates_within_tolerance():
+    for true_count in (10, 1000, 20000):
+        sketch = HyperLogLog()
+        for i in range(true_count):
+            sketch.add(f"user-{i}")
+            sketch.add(f"user-{i}")  # duplicates must not inflate the estimate
+        assert abs(sketch.count() - true_count) <= max(2, 0.1 * true_count)
+
+
+def test_topk_keeps_heavy_hitters_in_bounded_memory():
+    top = TopK(k=2, capacity=8)
+    for value in ["gold"] * 50 + ["silver"] * 30 + [f"noise-{i}" for i in range(100)]:
+        top.add(value)
+    assert len(top.counts) == 8
+    assert [entry["value"] for entry in top.top()] == ["gold", "silver"]
+
+
+def test_profiler_walks_every_array_element_iteratively():
+    docs = [
+        {"_id": 1, "username": "a", "tier_and_details": [
+            {"tier": "Gold", "benefits": ["car rental"]},
+            {"tier": "Silver", "active": True},
+        ], "accounts": [371138, 324287]},
+        {"_id": 2, "username": "b", "tier_and_details": [{"tier": "Gold"}], "accounts": [],
+         "birthdate": datetime(1977, 3, 2)},
+    ]
+    fields = SchemaProfiler(array_cap=10, top_k=3).add_many(docs).summary()
+
+    assert "_id" not in fields
+    assert fields["username"]["frequency"] == 1.0
+    assert fields["tier_and_details"]["type"] == ["array"]
+    # The second element's field is seen even though value[0] lacks it
+    assert fields["tier_and_details[].active"]["count"] == 1
+    # Presence counts once per document even when several elements match
+    assert fields["tier_and_details[].tier"]["count"] == 2
+    assert fields["tier_and_details[].tier"]["top_values"][0] == {"value": "Gold", "count": 2}
+    assert fields["tier_and_details[].benefits[]"]["sample_values"] == ["car rental"]
+    assert fields["accounts[]"]["min"] == 324287 and fields["accounts[]"]["max"] == 371138
+    assert fields["birthdate"]["type"] == ["datetime"]
+    assert fields["birthdate"]["frequency"] == 0.5
+
+
+def test_profiler_caps_array_elements_and_handles_deep_nesting():
+    deep = current = {}
+    for _ in range(2000):  # deeper than the recursion limit
+        current["child"] = {}
+        current = current["child"]
+    current["leaf"] = 1
+    fields = SchemaProfiler(array_cap=5).add_many([{"values": list(range(100)), "deep": deep}]).summary()
+    assert fields["values[]"]["max"] == 4
+    assert any(name.endswith(".leaf") for name in fields)
+
+
+def test_topk_counts_equal_values_of_different_types_apart():
+    top = TopK(k=3)
+    for value in [True] * 3 + [1] * 2 + [1.0]:
+        top.add(value)
+    assert [(type(entry["value"]), entry["count"]) for entry in top.top()] == [(bool, 3), (int, 2), (float, 1)]
+
+
+def test_value_hints_render_bson_scalars():
+    from bson import Binary, Decimal128
+    from src.nlp_processor import NLPProcessor
+
+    fields = {"code": {"sample_values": [Decimal128("1.50"), Decimal128("2.00")], "distinct_estimate": 2},
+              "blob": {"sample_values": [Binary(b"\x01")], "distinct_estimate": 1}}
+    hints = NLPProcessor.__new__(NLPProcessor)._format_value_hints(fields)
+    assert 'code: "1.50", "2.00"' in hints and "blob: " in hints
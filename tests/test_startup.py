@@ -0,0 +1,64 @@
+# tests/test_startup.py
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.startup import StartupState, connect_with_retries, warm_collections
+
+
+class FlakyDatabaseManager:
+    def __init__(self, failures):
+        self.failures = failures
+        self.calls = 0
+
+    def connect(self):
+        self.calls += 1
+        return self.calls > self.failures
+
+
+class FakeWarmupManager:
+    def __init__(self):
+        self.warmed = []
+
+    def extract_schemas(self, collections, max_workers=None, on_complete=None):
+        schemas = {}
+        for collection_name in collections:
+            if collection_name == "missing":
+                schemas[collection_name] = {"error": "No documents found"}
+            else:
+                schemas[collection_name] = {"fields": {}}
+            on_complete(collection_name, schemas[collection_name])
+        return {"schemas": schemas, "timings": {}, "total_seconds": 0.0, "failed": ["missing"]}
+
+    def get_sample_document(self, collection_name):
+        self.warmed.append(collection_name)
+        return {}
+
+
+def test_connect_retries_with_capped_backoff():
+    state = StartupState()
+    delays = []
+    manager = FlakyDatabaseManager(failures=4)
+    assert connect_with_retries(manager, state, max_attempts=0, base_delay=1.0,
+                                max_delay=3.0, sleep=delays.append)
+    assert delays == [1.0, 2.0, 3.0, 3.0]
+    assert state.snapshot()["connect_attempts"] == 5
+    assert state.snapshot()["last_error"] is None
+
+
+def test_connect_gives_up_after_max_attempts():
+    state = StartupState()
+    manager = FlakyDatabaseManager(failures=10)
+    assert not connect_with_retries(manager, state, max_attempts=3, base_delay=0.0, sleep=lambda _: None)
+    assert manager.calls == 3
+    assert "attempt 3" in state.snapshot()["last_error"]
+
+
+def test_warm_collections_reports_progress():
+    state = StartupState()
+    manager = FakeWarmupManager()
+    warm_collections(manager, ["customers", "transactions", "missing"], state, max_workers=3)
+    warmup = state.snapshot()["warmup"]
+    assert warmup["completed"] == 3
+    assert warmup["collections"] == {"customers": "done", "transactions": "done", "missing": "failed"}
+    assert sorted(manager.warmed) == ["customers", "missing", "transactions"]
@@ -0,0 +1,97 @@
+# tests/test_value_dictionary.py
+import sys
+import os
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.value_dictionary import (
+    ValueDictionaryStore, ValueMatcher, asks_for_count, normalize_tokens, predicates_for, resolve_without_llm,
+    state_matcher
+)
+from src.schema_profiler import SchemaProfiler
+from src.nlp_processor import extract_state_from_text
+
+CA = {"$regex": "\\bCA\\b", "$options": "i"}
+
+
+def _products_matcher():
+    matcher = state_matcher()
+    for product in ["InvestmentStock", "Derivatives", "Commodity", "CurrencyService"]:
+        matcher.add(product, "products", product)
+    for tier in ["Gold", "Silver", "Platinum"]:
+        matcher.add(tier, "tier", tier)
+    return matcher
+
+
+def test_tokens_split_camel_case_and_plurals():
+    assert normalize_tokens("InvestmentStock") == ["investment", "stock"]
+    assert normalize_tokens("Derivatives, please!") == ["derivative", "please"]
+
+
+def test_longest_match_wins():
+    assert extract_state_from_text("customers in West Virginia") == "west virginia"
+    assert extract_state_from_text("customers from Arkansas") == "arkansas"
+    assert extract_state_from_text("customers in Narnia") is None
+
+    matches = _products_matcher().match("Accounts with investment stocks or derivatives")
+    assert [(m.field, m.value) for m in matches] == [("products", "InvestmentStock"), ("products", "Derivatives")]
+
+
+def test_predicates_for_combines_fields_and_alternatives():
+    matcher = _products_matcher()
+    assert predicates_for(matcher.match("gold customers in California")) == {"tier": "Gold", "address": CA}
+    assert predicates_for(matcher.match("commodity or derivatives")) == {
+        "products": {"$in": ["Commodity", "Derivatives"]}}
+    assert predicates_for(matcher.match("California or Texas")) == {
+        "$or": [{"address": CA}, {"address": {"$regex": "\\bTX\\b", "$options": "i"}}]}
+
+
+def test_resolve_without_llm_only_when_question_is_fully_explained():
+    matcher = _products_matcher()
+    assert resolve_without_llm("How many customers are there in California?", "customers", matcher) == {
+        "query_type": "count", "filter": {"address": CA}, "resolved_by": "value_dictionary"}
+    shown = resolve_without_llm("Show gold tier customers", "customers", matcher)
+    assert shown["query_type"] == "find" and shown["filter"] == {"tier": "Gold"}
+
+    for question in ["How many customers in California have a balance over 1000?",
+                     "Show their names",
+                     "Which customers in California are gold?",
+                     "How many customers are there?"]:
+        assert resolve_without_llm(question, "customers", matcher) is None
+
+
+def test_count_questions_are_recognized():
+    assert asks_for_count("How many accounts trade commodities?")
+    assert asks_for_count("  total number of customers in Texas")
+    assert not asks_for_count("Show the accounts with how many products each has")
+
+
+def test_store_builds_from_low_cardinality_fields():
+    mongomock = pytest.importorskip("mongomock")
+    db = mongomock.MongoClient().sample_analytics
+    docs = [{"account_id": i, "limit": 10000, "products": ["InvestmentStock", "Commodity"][:1 + i % 2],
+             "owner_note": f"free text note number {i}"} for i in range(300)]
+    db.accounts.insert_many(docs)
+
+    class FakeDatabaseManager:
+        def __init__(self):
+            self.db = db
+
+        def get_schema(self, collection_name):
+            return {"fields": SchemaProfiler().add_many(db[collection_name].find()).summary()}
+
+        def sampling_collection(self, collection_name):
+            return db[collection_name]
+
+    store = ValueDictionaryStore(FakeDatabaseManager(), ttl=60)
+    matcher = store.get("accounts")
+    assert [m.value for m in matcher.match("accounts holding commodities")] == ["Commodity"]
+    assert not matcher.match("note number 7")  # High-cardinality text is not indexed
+    stored = db.value_dictionaries.find_one({"_id": "accounts"})
+    assert [(entry["field"], sorted(entry["values"])) for entry in stored["fields"]] == [
+        ("products", ["Commodity", "InvestmentStock"])]
+
+    # A fresh store loads the stored dictionary instead of rescanning
+    db.accounts.drop()
+    assert ValueDictionaryStore(FakeDatabaseManager(), ttl=60).get("accounts").size == matcher.size
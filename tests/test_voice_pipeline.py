@@ -0,0 +1,105 @@
+# tests/test_voice_pipeline.py
+import sys
+import os
+import threading
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import voice_client
+from voice_client import (AudioClip, BargeInMonitor, TTSBackend, VoicePipeline,
+                          speak_streaming, split_sentences)
+
+
+class SlowBackend(TTSBackend):
+    name = "slow"
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.synthesized = []
+
+    def synthesize(self, text):
+        time.sleep(self.delay)
+        self.synthesized.append((text, time.perf_counter()))
+        return AudioClip(np.zeros(800 * len(text.split()), dtype=np.int16), 8000)
+
+
+def test_split_sentences():
+    assert split_sentences("I found 3 matching results. Here they are: Ann, Bob, Cy") == [
+        "I found 3 matching results.", "Here they are:", "Ann, Bob, Cy"]
+
+
+def test_first_sentence_plays_while_rest_synthesizes():
+    backend = SlowBackend(delay=0.1)
+    played = []
+
+    def player(clip, cancel):
+        played.append(time.perf_counter())
+        time.sleep(0.15)
+        return True
+
+    assert speak_streaming("One. Two. Three.", backend=backend, player=player)
+    assert len(played) == 3
+    # Playback of the first sentence starts before the last one is synthesized
+    assert played[0] < backend.synthesized[-1][1]
+
+
+def test_barge_in_cancels_remaining_sentences():
+    backend = SlowBackend(delay=0.0)
+    cancel = threading.Event()
+    played = []
+
+    def player(clip, cancel_event):
+        played.append(clip)
+        cancel_event.set()  # the user starts talking during the first sentence
+        return False
+
+    assert not speak_streaming("One. Two. Three.", cancel=cancel, backend=backend, player=player)
+    assert len(played) == 1
+
+
+def test_barge_in_monitor_needs_sustained_speech():
+    cancel = threading.Event()
+    monitor = BargeInMonitor(cancel, energy_threshold=1000, blocks_to_trigger=3)
+    loud = np.full(480, 5000, dtype=np.int16)
+    quiet = np.zeros(480, dtype=np.int16)
+    for block in (loud, loud, quiet, loud, loud):
+        monitor.feed(block)
+    assert not cancel.is_set()
+    monitor.feed(loud)
+    assert cancel.is_set()
+
+
+def test_pipeline_acknowledges_slow_queries_and_reuses_session(monkeypatch):
+    spoken, streamed, payloads = [], [], []
+
+    class FakeResponse:
+        def __init__(self, body):
+            self.body = body
+
+        def raise_for_status(self):
+            pass
+
+        def json(self):
+            return self.body
+
+    pipeline = VoicePipeline(speak=spoken.append,
+                             speak_stream=lambda text, cancel: streamed.append(text) or True)
+
+    def fake_post(url, json=None, timeout=None):
+        payloads.append(json)
+        assert timeout == voice_client.REQUEST_TIMEOUT
+        time.sleep(0.6)
+        return FakeResponse({"session_id": "s-1", "data": [{"name": "Ann"}]})
+
+    monkeypatch.setattr(pipeline.http, "post", fake_post)
+    try:
+        assert pipeline.handle_turn("Show customers from Texas")
+        assert pipeline.handle_turn("Show only their names")
+    finally:
+        pipeline.close()
+
+    assert spoken == [voice_client.ACK_PHRASE, voice_client.ACK_PHRASE]
+    assert streamed[0] == "I found 1 matching results. Here they are: Ann"
+    assert "session_id" not in payloads[0]
+    assert payloads[1]["session_id"] == "s-1"
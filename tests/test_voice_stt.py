@@ -0,0 +1,176 @@
+# tests/test_voice_stt.py
+import sys
+import os
+import wave
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from voice_client import (EnergyVAD, STTBackend, iter_wav_frames, stream_transcription,
+                          transcribe_utterance)
+
+RATE = 16000
+SPEECH_FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures", "speech")
+VOSK_MODEL = os.getenv("VOSK_MODEL_PATH", "models/vosk-model-small-en-us-0.15")
+
+
+def speech_fixture(name):
+    """Path of a recorded speech fixture (see fixtures/speech/README.md); skips the test when it is missing."""
+    path = os.path.join(SPEECH_FIXTURES, name)
+    if not os.path.isfile(path):
+        pytest.skip(f"Recorded fixture {name} not present")
+    return path
+
+
+def write_fixture(path, segments, rate=RATE, channels=1):
+    """segments: list of (seconds, amplitude); amplitude 0 is silence."""
+    pieces = []
+    for seconds, amplitude in segments:
+        t = np.arange(int(rate * seconds)) / rate
+        pieces.append((amplitude * np.sin(2 * np.pi * 220 * t)).astype(np.int16))
+    samples = np.concatenate(pieces)
+    if channels == 2:
+        samples = np.repeat(samples, 2)
+    with wave.open(str(path), "wb") as wav:
+        wav.setnchannels(channels)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes(samples.tobytes())
+    return str(path)
+
+
+def write_speech_like(path, syllables, pauses, rate=RATE, seed=7):
+    """
+    Deterministic stand-in for recorded speech: phrases of voiced syllables
+    (harmonics of a drifting pitch shaped by vowel formants, under a
+    raised-cosine envelope) separated by the short dips of running speech,
+    `pauses` seconds between phrases and low background noise throughout.
+    Returns the path and each phrase's (start, end) in seconds.
+    """
+    rng = np.random.default_rng(seed)
+    vowels = [(730, 1090), (270, 2290), (530, 1840), (570, 840), (300, 870)]
+    pieces, phrases, clock = [np.zeros(int(rate * 0.5))], [], 0.5
+    for index, count in enumerate(syllables):
+        start = clock
+        for syllable in range(count):
+            seconds = rng.uniform(0.12, 0.25)
+            t = np.arange(int(rate * seconds)) / rate
+            pitch = 120 + 15 * np.sin(2 * np.pi * 3 * t + rng.uniform(0, np.pi))
+            phase = 2 * np.pi * np.cumsum(pitch) / rate
+            first, second = vowels[rng.integers(len(vowels))]
+            voiced = sum((np.exp(-((k * 120 - first) / 150) ** 2) + 0.5 * np.exp(-((k * 120 - second) / 200) ** 2))
+                         * np.sin(k * phase) for k in range(1, 30))
+            envelope = np.sin(np.pi * t / seconds) ** 0.5
+            pieces.append(6000 * envelope * voiced / np.abs(voiced).max())
+            clock += seconds
+            if syllable < count - 1:
+                gap = rng.uniform(0.03, 0.12)
+                pieces.append(np.zeros(int(rate * gap)))
+                clock += gap
+        phrases.append((start, clock))
+        pause = pauses[index] if index < len(pauses) else 0.5
+        pieces.append(np.zeros(int(rate * pause)))
+        clock += pause
+    samples = np.concatenate(pieces)
+    samples = samples + rng.normal(0, 40, len(samples))
+    with wave.open(str(path), "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes(np.clip(samples, -32768, 32767).astype(np.int16).tobytes())
+    return str(path), phrases
+
+
+class FrameCountingBackend(STTBackend):
+    """Reports how much audio it has heard, one 'word' per 300ms."""
+    name = "counting"
+
+    def start(self):
+        self.frames = 0
+
+    def accept(self, frame):
+        self.frames += 1
+        return " ".join(["word"] * (self.frames // 10)) or None
+
+    def finish(self):
+        return f"heard {self.frames} frames"
+
+
+def test_backend_without_finish_fails_at_construction():
+    class Incomplete(STTBackend):
+        name = "incomplete"
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_utterance_ends_when_speech_stops(tmp_path):
+    fixture = write_fixture(tmp_path / "query.wav", [(0.5, 0), (1.2, 8000), (0.9, 0), (1.0, 8000)])
+    partials = []
+    text = transcribe_utterance(iter_wav_frames(fixture), FrameCountingBackend(),
+                                EnergyVAD(energy_threshold=500, end_silence_ms=600),
+                                on_partial=partials.append)
+    # 300ms pre-roll + 1.2s of speech + 600ms of trailing silence (30ms frames),
+    # and none of the second burst
+    frames = int(text.split()[1])
+    assert 60 <= frames <= 72
+    assert partials[0] == "word"
+    assert partials == sorted(set(partials), key=len)
+
+
+def test_partials_stream_before_final(tmp_path):
+    fixture = write_fixture(tmp_path / "long.wav", [(0.2, 0), (1.0, 8000), (1.0, 0)])
+    results = list(stream_transcription(iter_wav_frames(fixture), FrameCountingBackend(),
+                                        EnergyVAD(energy_threshold=500)))
+    assert [is_final for is_final, _ in results][-1] is True
+    assert not any(is_final for is_final, _ in results[:-1])
+    assert len(results) > 2
+
+
+def test_silence_times_out_without_transcript(tmp_path):
+    fixture = write_fixture(tmp_path / "silence.wav", [(2.0, 0)])
+    assert transcribe_utterance(iter_wav_frames(fixture), FrameCountingBackend(),
+                                EnergyVAD(energy_threshold=500), listen_timeout=1) is None
+
+
+def test_phrase_time_limit_caps_utterance(tmp_path):
+    fixture = write_fixture(tmp_path / "rambling.wav", [(3.0, 8000)])
+    text = transcribe_utterance(iter_wav_frames(fixture), FrameCountingBackend(),
+                                EnergyVAD(energy_threshold=500), phrase_time_limit=1)
+    assert int(text.split()[1]) <= 40
+
+
+def test_wav_fixtures_must_be_mono(tmp_path):
+    fixture = write_fixture(tmp_path / "stereo.wav", [(0.1, 100)], channels=2)
+    with pytest.raises(ValueError):
+        list(iter_wav_frames(fixture))
+
+
+def test_utterance_ends_at_the_pause_between_questions(tmp_path):
+    fixture, phrases = write_speech_like(tmp_path / "two_questions.wav", [6, 4], pauses=[1.5])
+    (start, end), (second_start, _) = phrases
+    backend = FrameCountingBackend()
+    text = transcribe_utterance(iter_wav_frames(fixture), backend, EnergyVAD(energy_threshold=300, end_silence_ms=600))
+    heard = int(text.split()[1])
+    # The short dips between syllables do not end the utterance; the pause does, 600ms in.
+    # The recognizer hears 300ms of pre-roll, the first question and the trailing silence only.
+    expected = round((end - start) / 0.03) + 7 + 20
+    assert abs(heard - expected) <= 4
+    assert (start + heard * 0.03) < second_start
+
+
+@pytest.mark.skipif(not os.path.isdir(VOSK_MODEL), reason="Vosk model not downloaded")
+def test_vosk_transcribes_recorded_question():
+    from voice_client import VoskSTTBackend
+    fixture = speech_fixture("how_many_customers.wav")
+    text = transcribe_utterance(iter_wav_frames(fixture), VoskSTTBackend(), EnergyVAD(energy_threshold=300))
+    assert text == "how many customers are there"
+
+
+@pytest.mark.skipif(not os.path.isdir(VOSK_MODEL), reason="Vosk model not downloaded")
+def test_vosk_stops_at_end_of_first_utterance():
+    from voice_client import VoskSTTBackend
+    fixture = speech_fixture("two_questions.wav")
+    text = transcribe_utterance(iter_wav_frames(fixture), VoskSTTBackend(),
+                                EnergyVAD(energy_threshold=300, end_silence_ms=600))
+    assert text == "show customers in texas"
@@ -0,0 +1,111 @@
+# tests/test_voice_tts.py
+import sys
+import os
+import ctypes
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import voice_client
+from voice_client import AudioClip, OfflineTTSBackend, PhraseAudioCache, TTSBackend, TTSError
+
+
+class ToneBackend(TTSBackend):
+    """Test stand-in for a speech engine: one short tone per word."""
+    name = "tone"
+
+    def __init__(self, samplerate=8000, word_seconds=0.18):
+        self.samplerate = samplerate
+        self.word_seconds = word_seconds
+
+    def synthesize(self, text):
+        t = np.arange(int(self.samplerate * self.word_seconds)) / self.samplerate
+        words = [(0.3 * np.sin(2 * np.pi * (180 + len(word) * 15) * t) * 32767).astype(np.int16)
+                 for word in text.split()]
+        return AudioClip(np.concatenate(words) if words else np.zeros(1, dtype=np.int16), self.samplerate)
+
+
+class CountingBackend(TTSBackend):
+    name = "counting"
+
+    def __init__(self):
+        self.inner = ToneBackend()
+        self.calls = []
+
+    def synthesize(self, text):
+        self.calls.append(text)
+        return self.inner.synthesize(text)
+
+
+def test_backend_without_synthesize_fails_at_construction():
+    class Incomplete(TTSBackend):
+        name = "incomplete"
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_offline_backend_collects_engine_output_in_memory():
+    class FakeESpeak:
+        """Hands synthesized samples to the callback in blocks, as eSpeak's synchronous mode does."""
+
+        def espeak_SetSynthCallback(self, callback):
+            self.callback = callback
+
+        def espeak_Synth(self, data, size, *args):
+            self.text = data.decode("utf-8")
+            for block in ([1, -2, 3], [400, -500]):
+                self.callback((ctypes.c_short * len(block))(*block), len(block), None)
+            self.callback(None, 0, None)
+            return 0
+
+    backend = OfflineTTSBackend.__new__(OfflineTTSBackend)
+    backend.lib, backend.samplerate = FakeESpeak(), 22050
+    backend._callback = OfflineTTSBackend.SYNTH_CALLBACK(backend._collect)
+    clip = backend.synthesize("Café")
+    assert backend.lib.text == "Café" and clip.samplerate == 22050
+    assert clip.samples.tolist() == [1, -2, 3, 400, -500]
+    assert backend.synthesize("again").samples.tolist() == [1, -2, 3, 400, -500]  # Nothing carried over
+
+
+def test_offline_backend_speaks_without_network():
+    try:
+        backend = OfflineTTSBackend()
+    except TTSError as e:  # eSpeak NG is not installed
+        pytest.skip(f"No speech engine: {e}")
+    clip = backend.synthesize("Listening... please speak your query.")
+    assert clip.samples.dtype.name == "int16" and clip.samples.ndim == 1
+    assert 0.5 < clip.duration < 6.0
+    assert clip.samples.any()
+
+
+def test_phrase_cache_reuses_audio_and_evicts_lru():
+    backend = CountingBackend()
+    cache = PhraseAudioCache(max_entries=2)
+    first = cache.get_or_synthesize(backend, "Listening")
+    assert cache.get_or_synthesize(backend, "Listening") is first
+    cache.get_or_synthesize(backend, "Goodbye!")
+    cache.get_or_synthesize(backend, "Listening")
+    cache.get_or_synthesize(backend, "Hello")  # evicts "Goodbye!"
+    cache.get_or_synthesize(backend, "Goodbye!")
+    assert backend.calls == ["Listening", "Goodbye!", "Hello", "Goodbye!"]
+    assert (cache.hits, cache.misses) == (2, 4)
+
+
+def test_speak_text_measures_time_to_first_audio(monkeypatch):
+    played = []
+    monkeypatch.setattr(voice_client, "tts_backend", CountingBackend())
+    monkeypatch.setattr(voice_client, "phrase_cache", PhraseAudioCache())
+    monkeypatch.setattr(voice_client, "tts_metrics", voice_client.TTSMetrics())
+    monkeypatch.setattr(voice_client, "play_clip", played.append)
+
+    voice_client.speak_text("Listening... please speak your query.")
+    voice_client.speak_text("Listening... please speak your query.")
+    voice_client.speak_text("I found 3 matching results.", cache=False)
+
+    summary = voice_client.tts_metrics.summary()
+    assert len(played) == 3
+    assert summary["utterances"] == 3
+    assert summary["cached"] == 1
+    assert voice_client.tts_backend.calls == ["Listening... please speak your query.",
+                                              "I found 3 matching results."]
@@ -0,0 +1,158 @@
+# tests/test_world_model.py
+import sys
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+mongomock = pytest.importorskip("mongomock")
+from src.world_model import WorldModel, question_pattern, schema_fingerprint, suggest
+
+SCHEMA = {"fields": {
+    "name": {"type": ["str"], "frequency": 1.0},
+    "balance": {"type": ["int"], "frequency": 1.0},
+    "birthdate": {"type": ["datetime"], "frequency": 0.9},
+    "nickname": {"type": ["str"], "frequency": 0.01},
+}}
+NOW = datetime.utcnow().replace(microsecond=0)  # Recent: the TTL index on last_seen is enforced
+
+
+def _ask(events, session_id, question, at, error_type="impossible", resolved_by=None):
+    events.insert_one({"type": "user_message", "session_id": session_id, "text": question,
+                       "collection": "customers", "timestamp": at})
+    intent = {"query_type": "error", "error_type": error_type, "error_message": "No such data"}
+    if resolved_by:
+        intent["resolved_by"] = resolved_by
+    events.insert_one({"type": "ai_response", "session_id": session_id, "collection": "customers", "question": question,
+                       "response_success": False, "intent": intent, "timestamp": at + timedelta(seconds=1)})
+
+
+def _model(schemas):
+    db = mongomock.MongoClient().analytics
+    return WorldModel(db, db.events, lambda name: schemas[name], min_failures=2), db.events
+
+
+def test_fingerprint_and_pattern():
+    assert schema_fingerprint(SCHEMA) == schema_fingerprint({"fields": dict(SCHEMA["fields"], rare={"frequency": 0.0})})
+    assert schema_fingerprint(SCHEMA) != schema_fingerprint({"fields": {"name": {}}})
+    assert schema_fingerprint({"error": "unreachable"}) is None
+    assert question_pattern("Customers' shoe sizes?") == question_pattern("customer shoe size")
+    assert "balance" in suggest("impossible", "average balances by shoe size", SCHEMA)
+
+
+def test_learns_repeated_failures_and_short_circuits():
+    model, events = _model({"customers": SCHEMA})
+    _ask(events, "s1", "What is the shoe size of each customer?", NOW - timedelta(hours=2))
+    _ask(events, "s2", "Which customers own a tesla?", NOW - timedelta(hours=2), error_type="timeout")
+    assert model.learn(["customers"], now=NOW) == {"customers": 1}
+    assert model.lookup("customers", "what is the shoe size of each customer") is None  # One failure is not enough
+
+    _ask(events, "s3", "what is the SHOE size of each customer", NOW + timedelta(minutes=1))
+    model.learn(["customers"], now=NOW + timedelta(minutes=5))
+    intent = model.lookup("customers", "What is the shoe size of each customer?")
+    assert intent["query_type"] == "error" and intent["error_type"] == "impossible"
+    assert intent["resolved_by"] == "world_model" and intent["suggestion"] in intent["error_message"]
+    assert model.lookup("transactions", "What is the shoe size of each customer?") is None
+    assert model.stats()["hits"] == 1
+
+    gap = model.gaps_report()[0]
+    assert gap["failures"] == 2 and gap["active"] and len(gap["examples"]) == 2
+
+    # Answers given from the store are not learned again
+    _ask(events, "s4", "What is the shoe size of each customer?", NOW + timedelta(minutes=6), resolved_by="world_model")
+    model.learn(["customers"], now=NOW + timedelta(minutes=10))
+    assert model.gaps_report()[0]["failures"] == 2
+
+
+def test_learns_the_failed_question_not_the_sessions_latest_message():
+    model, events = _model({"customers": SCHEMA})
+    for i in range(2):
+        # Batch items and anonymous callers share a session; another question lands in between
+        at = NOW - timedelta(minutes=10 - i)
+        events.insert_one({"type": "user_message", "session_id": "shared", "text": "favourite colour of customers",
+                           "collection": "customers", "timestamp": at})
+        events.insert_one({"type": "user_message", "session_id": "shared", "text": "list customers named Bob",
+                           "collection": "customers", "timestamp": at + timedelta(milliseconds=1)})
+        events.insert_one({"type": "ai_response", "session_id": "shared", "collection": "customers",
+                           "question": "favourite colour of customers", "response_success": False,
+                           "intent": {"query_type": "error", "error_type": "impossible"},
+                           "timestamp": at + timedelta(seconds=1)})
+    # Responses logged without their question are skipped, not paired by order
+    events.insert_one({"type": "ai_response", "session_id": "shared", "collection": "customers",
+                       "response_success": False, "intent": {"query_type": "error", "error_type": "impossible"},
+                       "timestamp": NOW - timedelta(minutes=1)})
+    model.learn(["customers"], now=NOW)
+    assert model.lookup("customers", "list customers named Bob") is None
+    assert model.lookup("customers", "Favourite colour of customers?")["error_type"] == "impossible"
+
+
+def test_ambiguous_entries_yield_to_context():
+    model, events = _model({"customers": SCHEMA})
+    for i in range(2):
+        _ask(events, f"s{i}", "show the big ones", NOW - timedelta(minutes=10 - i), error_type="ambiguous")
+    model.learn(["customers"], now=NOW)
+    assert model.lookup("customers", "show the big ones")["error_type"] == "ambiguous"
+    assert model.lookup("customers", "show the big ones", has_context=True) is None
+
+
+def test_schema_change_expires_entries():
+    schemas = {"customers": SCHEMA}
+    model, events = _model(schemas)
+    for i in range(2):
+        _ask(events, f"s{i}", "customers by loyalty points", NOW - timedelta(minutes=10 - i))
+    model.learn(["customers"], now=NOW)
+    assert model.lookup("customers", "customers by loyalty points") is not None
+
+    schemas["customers"] = {"fields": dict(SCHEMA["fields"], loyalty_points={"type": ["int"], "frequency": 1.0})}
+    model.learn(["customers"], now=NOW + timedelta(minutes=1))
+    assert model.lookup("customers", "customers by loyalty points") is None
+    assert model.gaps_report() == []
+
+
+def test_query_endpoint_skips_llm_for_known_gaps(monkeypatch):
+    from fastapi.testclient import TestClient
+    import app as agent_app
+
+    class FakeNLPProcessor:
+        calls = 0
+
+        def parse_query(self, user_text, collection_name, session_context=None):
+            self.calls += 1
+            return {"query_type": "error", "error_type": "impossible", "error_message": "Cannot answer"}
+
+    class FakeConversationManager:
+        session_id = "default-session"
+
+        def __init__(self):
+            self.logged = []
+
+        def add_user_message_to_analytics(self, text, collection=None, session_id=None):
+            pass
+
+        def add_ai_message_to_analytics(self, text, intent, success_flag, exec_time, session_id=None,
+                                        collection=None, results=None, question=None):
+            self.logged.append((intent, question))
+
+    model, events = _model({"customers": SCHEMA})
+    for i in range(2):
+        _ask(events, f"s{i}", "customers by shoe size", datetime.utcnow() - timedelta(minutes=10 - i))
+    model.learn(["customers"])
+    nlp, conversations = FakeNLPProcessor(), FakeConversationManager()
+    monkeypatch.setattr(agent_app, "nlp_processor", nlp)
+    monkeypatch.setattr(agent_app, "conv_manager", conversations)
+    monkeypatch.setattr(agent_app, "world_model", model)
+    monkeypatch.setattr(agent_app, "db_manager", object())
+    monkeypatch.setattr(agent_app.startup_state, "ready", True)
+    client = TestClient(agent_app.app)
+
+    response = client.post("/query", json={"collection": "customers", "query_text": "Customers by shoe size?"})
+    body = response.json()
+    assert body["error_type"] == "impossible" and "Available fields include: name, balance" in body["error"]
+    assert nlp.calls == 0
+    intent, question = conversations.logged[-1]
+    assert intent["resolved_by"] == "world_model" and question == "Customers by shoe size?"
+
+    client.post("/query", json={"collection": "customers", "query_text": "customers by eye colour"})
+    assert nlp.calls == 1
+    assert client.get("/admin/world-model").json()["stats"]["hits"] == 1
@@ -1,6 +1,5 @@
 # tests/validate_etl.py
 import pandas as pd
-from pymongo import MongoClient
 from datetime import datetime, timedelta
 import sys
 import os
@@ -10,10 +9,12 @@ import numpy as np
 # This assumes the script is run from the project's root directory.
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from config.settings import config
+from src.mongo_clients import client_registry
 
 # --- Database Connection ---
 try:
-    client = MongoClient(config.MONGODB_URI, serverSelectionTimeoutMS=5000)
+    # Same client role as scripts/etl_metrics.py: reads are served by a secondary when one is available
+    client = client_registry.get_client(config.MONGODB_URI, "etl")
     client.admin.command('ismaster')
     db = client[config.DATABASE_NAME]
     print("✓ Successfully connected to MongoDB.")
@@ -28,7 +29,11 @@ print("\n--- Rival ETL Validation ---")
 # FIX 1: Fetch only the last 24 hours of events to prevent timeouts and match the main ETL script.
 print("Fetching events from the last 24 hours...")
 yesterday = datetime.utcnow() - timedelta(days=1)
-events_cursor = db.events.find({"timestamp": {"$gte": yesterday}})
+events_cursor = db.events.find(
+    {"timestamp": {"$gte": yesterday}},
+    # Only the fields the metrics use; result digests and texts stay on the server
+    {"_id": 0, "type": 1, "intent": 1, "execution_time": 1, "response_success": 1}
+)
 events_df = pd.DataFrame(list(events_cursor))
 
 if events_df.empty:
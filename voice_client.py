@@ -1,66 +1,533 @@
 # voice_client.py
 import requests
+import abc
+import ctypes
+import ctypes.util
+import io
 import json
-import speech_recognition as sr
-from gtts import gTTS
-import sounddevice as sd
-from scipy.io import wavfile
-import tempfile
 import os
+import queue
+import re
+import threading
 import time
+import wave
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from contextlib import nullcontext
+import numpy as np
 
 # --- Configuration ---
 AGENT_API_URL = "http://localhost:8000/query"
 DEFAULT_COLLECTION = "customers"
 LISTEN_TIMEOUT = 10
 PHRASE_TIME_LIMIT = 15
+FRAME_MS = 30  # Audio frame size for voice activity detection
+STT_BACKEND = os.getenv("VOICE_STT_BACKEND", "vosk")  # "vosk" (offline) or "google"
+VOSK_MODEL_PATH = os.getenv("VOSK_MODEL_PATH", "models/vosk-model-small-en-us-0.15")
+TTS_BACKEND = os.getenv("VOICE_TTS_BACKEND", "gtts")  # "gtts" or "offline"
+PHRASE_CACHE_SIZE = 64  # Synthesized phrases kept in memory
+REQUEST_TIMEOUT = (3.05, 30)  # (connect, read) seconds for agent API calls
+REQUEST_DEADLINE_MS = 28000  # Server-side budget, so the server gives up before we do
+ACK_DELAY = 0.4  # Speak an acknowledgement if the answer takes longer than this
+ACK_PHRASE = "One moment."
+BARGE_IN = os.getenv("VOICE_BARGE_IN", "true").lower() == "true"
 
-def speak_text(text):
-    """Converts text to speech and speaks it using gTTS and sounddevice."""
+# --- Text-to-Speech ---
+class AudioClip:
+    """Mono PCM audio held in memory."""
+
+    def __init__(self, samples, samplerate):
+        self.samples = samples
+        self.samplerate = samplerate
+
+    @property
+    def duration(self):
+        return len(self.samples) / float(self.samplerate)
+
+class TTSBackend(abc.ABC):
+    """Turns text into an in-memory AudioClip. Subclasses set `name`."""
+    name = "base"
+
+    @abc.abstractmethod
+    def synthesize(self, text):
+        """Speech for `text` as an AudioClip."""
+
+class GTTSBackend(TTSBackend):
+    """Google TTS; the MP3 is decoded in memory (no temp files or ffmpeg)."""
+    name = "gtts"
+    SAMPLE_RATE = 24000  # gTTS output rate
+
+    def __init__(self, lang='en'):
+        self.lang = lang
+
+    def synthesize(self, text):
+        from gtts import gTTS
+        import miniaudio
+        mp3 = io.BytesIO()
+        gTTS(text=text, lang=self.lang).write_to_fp(mp3)
+        decoded = miniaudio.decode(mp3.getvalue(), output_format=miniaudio.SampleFormat.SIGNED16,
+                                   nchannels=1, sample_rate=self.SAMPLE_RATE)
+        return AudioClip(np.frombuffer(decoded.samples, dtype=np.int16), decoded.sample_rate)
+
+class TTSError(Exception):
+    """The speech synthesizer could not run (missing engine)."""
+
+class OfflineTTSBackend(TTSBackend):
+    """
+    Network-free speech from the eSpeak NG library (the engine pyttsx3
+    drives on Linux) through its C API. It runs in synchronous mode: eSpeak
+    hands each block of samples to a callback, which appends it to an
+    in-memory buffer, so nothing is played or written to disk.
+    """
+    name = "offline"
+    AUDIO_OUTPUT_SYNCHRONOUS = 2
+    POS_CHARACTER = 1
+    CHARS_UTF8 = 1
+    ENDPAUSE = 0x1000
+    RATE = 1
+    SYNTH_CALLBACK = ctypes.CFUNCTYPE(ctypes.c_int, ctypes.POINTER(ctypes.c_short), ctypes.c_int, ctypes.c_void_p)
+    _lock = threading.Lock()  # eSpeak keeps one global synthesizer; the streaming producer runs on its own thread
+
+    def __init__(self, rate=None, voice=None):
+        path = ctypes.util.find_library("espeak-ng") or ctypes.util.find_library("espeak")
+        if path is None:
+            raise TTSError("eSpeak NG library not found")
+        self.lib = ctypes.CDLL(path)
+        self.lib.espeak_Synth.argtypes = [ctypes.c_char_p, ctypes.c_size_t, ctypes.c_uint, ctypes.c_int,
+                                          ctypes.c_uint, ctypes.c_uint, ctypes.c_void_p, ctypes.c_void_p]
+        self.samplerate = self.lib.espeak_Initialize(self.AUDIO_OUTPUT_SYNCHRONOUS, 0, None, 0)
+        if self.samplerate <= 0:
+            raise TTSError("eSpeak NG failed to initialize")
+        if rate is not None:
+            self.lib.espeak_SetParameter(self.RATE, int(rate), 0)  # Words per minute, as in pyttsx3
+        if voice is not None:
+            self.lib.espeak_SetVoiceByName(voice.encode("utf-8"))
+        self._buffer = io.BytesIO()
+        self._callback = self.SYNTH_CALLBACK(self._collect)  # Referenced here so it is not garbage collected
+
+    def _collect(self, wav, numsamples, events):
+        if wav and numsamples > 0:
+            self._buffer.write(ctypes.string_at(wav, numsamples * 2))
+        return 0  # Continue synthesis
+
+    def synthesize(self, text):
+        data = text.encode("utf-8")
+        with self._lock:
+            self._buffer = io.BytesIO()
+            self.lib.espeak_SetSynthCallback(self._callback)
+            error = self.lib.espeak_Synth(data, len(data) + 1, 0, self.POS_CHARACTER, 0,
+                                          self.CHARS_UTF8 | self.ENDPAUSE, None, None)
+            if error != 0:
+                raise TTSError(f"eSpeak NG synthesis failed (error {error})")
+            samples = np.frombuffer(self._buffer.getvalue(), dtype=np.int16)
+        return AudioClip(samples, self.samplerate)
+
+TTS_BACKENDS = {GTTSBackend.name: GTTSBackend, OfflineTTSBackend.name: OfflineTTSBackend}
+
+class PhraseAudioCache:
+    """LRU cache of synthesized audio keyed by (backend, text)."""
+
+    def __init__(self, max_entries=PHRASE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get_or_synthesize(self, backend, text):
+        key = (backend.name, text)
+        with self._lock:
+            clip = self.entries.get(key)
+            if clip is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return clip
+            self.misses += 1
+        clip = backend.synthesize(text)
+        with self._lock:
+            self.entries[key] = clip
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return clip
+
+class TTSMetrics:
+    """Time from speak request to playback start, split by cache hit/miss."""
+
+    def __init__(self):
+        self.samples = []
+
+    def record(self, seconds, cached):
+        self.samples.append((seconds, cached))
+
+    def summary(self):
+        def mean(values):
+            return sum(values) / len(values) if values else 0.0
+        hits = [s for s, cached in self.samples if cached]
+        misses = [s for s, cached in self.samples if not cached]
+        return {"utterances": len(self.samples), "cached": len(hits),
+                "mean_time_to_first_audio": mean([s for s, _ in self.samples]),
+                "mean_time_to_first_audio_cached": mean(hits),
+                "mean_time_to_first_audio_uncached": mean(misses)}
+
+tts_backend = TTS_BACKENDS.get(TTS_BACKEND, GTTSBackend)()
+phrase_cache = PhraseAudioCache()
+tts_metrics = TTSMetrics()
+
+def play_clip(clip, cancel=None):
+    """Plays a clip; returns False if `cancel` was set (barge-in) before it finished."""
+    import sounddevice as sd
+    sd.play(clip.samples, clip.samplerate)
+    if cancel is None:
+        sd.wait()
+        return True
+    if cancel.wait(clip.duration):
+        sd.stop()
+        return False
+    sd.wait()
+    return True
+
+def speak_text(text, cache=True):
+    """
+    Speaks text through the configured TTS backend. Fixed phrases are cached;
+    pass cache=False for one-off text such as query summaries.
+    """
     print(f"🤖 Agent: {text}")
+    started = time.perf_counter()
     try:
-        tts = gTTS(text=text, lang='en')
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".mp3") as fp:
-            tts.save(fp.name)
-            wav_path = fp.name.replace('.mp3', '.wav')
-            # Convert mp3 to wav for playback
-            os.system(f"ffmpeg -y -i {fp.name} {wav_path} > /dev/null 2>&1")
-            samplerate, data = wavfile.read(wav_path)
-            sd.play(data, samplerate)
-            sd.wait()
-            os.remove(fp.name)
-            os.remove(wav_path)
+        hits_before = phrase_cache.hits
+        if cache:
+            clip = phrase_cache.get_or_synthesize(tts_backend, text)
+        else:
+            clip = tts_backend.synthesize(text)
+        tts_metrics.record(time.perf_counter() - started, cache and phrase_cache.hits > hits_before)
+        play_clip(clip)
     except Exception as e:
-        print(f"Error in gTTS speak_text: {e}")
+        print(f"Error in speak_text: {e}")
 
-# --- Initialize Speech-to-Text Recognizer ---
-recognizer = sr.Recognizer()
-recognizer.energy_threshold = 4000
-recognizer.dynamic_energy_threshold = True
+def split_sentences(text):
+    """Split text into sentences so the first can play while the rest synthesize."""
+    return [part for part in re.split(r"(?<=[.!?:])\s+", text.strip()) if part]
 
-def listen_to_user():
-    """Captures audio from the microphone and transcribes it to text."""
-    with sr.Microphone() as source:
-        speak_text("Listening... please speak your query.")
-        print("🎤 Listening...")
-        recognizer.adjust_for_ambient_noise(source, duration=1)
+def speak_streaming(text, cancel=None, backend=None, player=None):
+    """
+    Speaks text sentence by sentence: a producer thread synthesizes ahead
+    while earlier sentences play. Returns False if playback was cancelled.
+    """
+    print(f"🤖 Agent: {text}")
+    backend = backend or tts_backend
+    player = player or play_clip
+    cancel = cancel or threading.Event()
+    clips = queue.Queue(maxsize=2)
+    started = time.perf_counter()
+
+    def produce():
+        try:
+            for sentence in split_sentences(text):
+                clip = backend.synthesize(sentence)
+                while not cancel.is_set():
+                    try:
+                        clips.put(clip, timeout=0.1)
+                        break
+                    except queue.Full:
+                        continue
+                if cancel.is_set():
+                    return
+        except Exception as e:
+            print(f"Error in speak_streaming: {e}")
+        clips.put(None)
+
+    threading.Thread(target=produce, name="tts-producer", daemon=True).start()
+    first = True
+    while True:
+        try:
+            clip = clips.get(timeout=0.1)
+        except queue.Empty:
+            if cancel.is_set():
+                return False
+            continue
+        if clip is None:
+            return True
+        if first:
+            tts_metrics.record(time.perf_counter() - started, False)
+            first = False
+        if not player(clip, cancel):
+            return False
+
+class BargeInMonitor:
+    """
+    Watches the microphone while the agent speaks and sets `cancel` when the
+    user starts talking over it. Speech is a run of loud input blocks,
+    relative to the calibrated energy threshold; a headset avoids the
+    agent's own voice triggering it.
+    """
+
+    def __init__(self, cancel, energy_threshold, samplerate=16000, block_seconds=0.03, blocks_to_trigger=8):
+        self.cancel = cancel
+        self.energy_threshold = energy_threshold
+        self.samplerate = samplerate
+        self.blocksize = int(samplerate * block_seconds)
+        self.blocks_to_trigger = blocks_to_trigger
+        self.loud_blocks = 0
+        self.stream = None
+
+    def feed(self, samples):
+        """Process one block of int16 samples; exposed for testing."""
+        rms = float(np.sqrt(np.mean(samples.astype(np.float64) ** 2))) if len(samples) else 0.0
+        self.loud_blocks = self.loud_blocks + 1 if rms > self.energy_threshold else 0
+        if self.loud_blocks >= self.blocks_to_trigger:
+            self.cancel.set()
+
+    def __enter__(self):
+        import sounddevice as sd
+        self.stream = sd.InputStream(samplerate=self.samplerate, channels=1, dtype='int16',
+                                     blocksize=self.blocksize,
+                                     callback=lambda data, frames, t, status: self.feed(data[:, 0]))
+        self.stream.start()
+        return self
+
+    def __exit__(self, *exc):
+        if self.stream is not None:
+            self.stream.stop()
+            self.stream.close()
+        return False
+
+# --- Speech-to-Text ---
+class STTError(Exception):
+    """The speech recognizer could not run (missing model, service down)."""
+
+class STTBackend(abc.ABC):
+    """
+    Streaming recognizer: start() opens an utterance, accept() takes 16-bit
+    mono PCM frames and may return a partial transcript, finish() returns the
+    final text ("" if nothing was recognized).
+    """
+    name = "base"
+
+    def __init__(self, samplerate=16000):
+        self.samplerate = samplerate
+
+    def start(self):
+        pass
+
+    def accept(self, frame):
+        return None
+
+    @abc.abstractmethod
+    def finish(self):
+        """Final transcript of the utterance."""
+
+class VoskSTTBackend(STTBackend):
+    """Offline CPU recognizer (Vosk/Kaldi) with incremental partial results."""
+    name = "vosk"
+
+    def __init__(self, model_path=None, samplerate=16000):
+        super().__init__(samplerate)
+        model_path = model_path or VOSK_MODEL_PATH
+        if not os.path.isdir(model_path):
+            raise STTError(f"Vosk model not found at {model_path}")
+        import vosk
+        vosk.SetLogLevel(-1)
+        self.model = vosk.Model(model_path)
+        self.recognizer = None
+        self.segments = []
+
+    def start(self):
+        import vosk
+        self.recognizer = vosk.KaldiRecognizer(self.model, self.samplerate)
+        self.segments = []
+
+    def accept(self, frame):
+        if self.recognizer.AcceptWaveform(frame):
+            text = json.loads(self.recognizer.Result()).get("text", "")
+            if text:
+                self.segments.append(text)
+            return " ".join(self.segments) or None
+        partial = json.loads(self.recognizer.PartialResult()).get("partial", "")
+        return " ".join(self.segments + [partial]).strip() or None
+
+    def finish(self):
+        text = json.loads(self.recognizer.FinalResult()).get("text", "")
+        return " ".join(self.segments + [text]).strip()
+
+class GoogleSTTBackend(STTBackend):
+    """Remote Google Web Speech recognition; no partial results."""
+    name = "google"
+
+    def start(self):
+        self.frames = []
+
+    def accept(self, frame):
+        self.frames.append(frame)
+        return None
+
+    def finish(self):
+        import speech_recognition as sr
+        audio = sr.AudioData(b"".join(self.frames), self.samplerate, 2)
         try:
-            audio = recognizer.listen(source, timeout=LISTEN_TIMEOUT, phrase_time_limit=PHRASE_TIME_LIMIT)
-        except sr.WaitTimeoutError:
-            speak_text("I didn't hear anything. Please try again when you're ready.")
+            return sr.Recognizer().recognize_google(audio)
+        except sr.UnknownValueError:
+            return ""
+        except sr.RequestError as e:
+            raise STTError(f"My speech recognition service seems to be down. Error: {e}")
+
+STT_BACKENDS = {VoskSTTBackend.name: VoskSTTBackend, GoogleSTTBackend.name: GoogleSTTBackend}
+
+def frame_rms(frame):
+    samples = np.frombuffer(frame, dtype=np.int16).astype(np.float64)
+    return float(np.sqrt(np.mean(samples ** 2))) if len(samples) else 0.0
+
+class EnergyVAD:
+    """
+    Streaming energy-based voice activity detection over fixed-size frames.
+    Speech starts after `start_frames` consecutive loud frames and ends after
+    `end_silence_ms` of quiet, so an utterance closes as soon as the user
+    stops talking instead of waiting for a phrase time limit.
+    """
+
+    def __init__(self, energy_threshold=300, frame_ms=FRAME_MS, start_frames=3, end_silence_ms=600):
+        self.energy_threshold = energy_threshold
+        self.start_frames = start_frames
+        self.end_frames = max(1, end_silence_ms // frame_ms)
+        self.in_speech = False
+        self.loud = 0
+        self.quiet = 0
+
+    def process(self, frame):
+        """Returns "start", "end" or None for each frame."""
+        loud = frame_rms(frame) > self.energy_threshold
+        if not self.in_speech:
+            self.loud = self.loud + 1 if loud else 0
+            if self.loud >= self.start_frames:
+                self.in_speech, self.quiet = True, 0
+                return "start"
             return None
+        self.quiet = 0 if loud else self.quiet + 1
+        if self.quiet >= self.end_frames:
+            self.in_speech, self.loud = False, 0
+            return "end"
+        return None
+
+def stream_transcription(frames, backend, vad, frame_ms=FRAME_MS,
+                         listen_timeout=LISTEN_TIMEOUT, phrase_time_limit=PHRASE_TIME_LIMIT):
+    """
+    Feeds audio frames through the VAD into the recognizer. Yields
+    (is_final, text) tuples: partial transcripts while the user speaks, then
+    one final transcript when the VAD detects the end of the utterance.
+    Yields nothing if no speech starts within `listen_timeout` seconds.
+    """
+    pre_roll = deque(maxlen=max(1, 300 // frame_ms))  # Keep the onset of the first word
+    waited = spoken = 0
+    for frame in frames:
+        if not vad.in_speech:
+            event = vad.process(frame)
+            pre_roll.append(frame)
+            if event != "start":
+                waited += 1
+                if waited * frame_ms >= listen_timeout * 1000:
+                    return
+                continue
+            backend.start()
+            last_partial = None
+            for buffered in pre_roll:
+                partial = backend.accept(buffered)
+            spoken = len(pre_roll)
+            continue
+
+        partial = backend.accept(frame)
+        spoken += 1
+        if partial and partial != last_partial:
+            last_partial = partial
+            yield False, partial
+        if vad.process(frame) == "end" or spoken * frame_ms >= phrase_time_limit * 1000:
+            yield True, backend.finish()
+            return
+
+    if vad.in_speech:
+        yield True, backend.finish()
+
+def transcribe_utterance(frames, backend, vad, on_partial=None, **kwargs):
+    """Final transcript of the first utterance in `frames`, or None."""
+    for is_final, text in stream_transcription(frames, backend, vad, **kwargs):
+        if is_final:
+            return text or None
+        if on_partial:
+            on_partial(text)
+    return None
 
+def iter_wav_frames(path, frame_ms=FRAME_MS):
+    """Frames from a 16-bit mono WAV file, e.g. recorded test fixtures."""
+    with wave.open(path, "rb") as wav:
+        if wav.getnchannels() != 1 or wav.getsampwidth() != 2:
+            raise ValueError("WAV fixtures must be 16-bit mono PCM")
+        frame_samples = int(wav.getframerate() * frame_ms / 1000)
+        while True:
+            frame = wav.readframes(frame_samples)
+            if len(frame) < frame_samples * 2:
+                return
+            yield frame
+
+def iter_microphone_frames(samplerate=16000, frame_ms=FRAME_MS, stop=None):
+    """Live microphone frames until `stop` is set or the consumer stops iterating."""
+    import sounddevice as sd
+    frames = queue.Queue()
+    stop = stop or threading.Event()
+    with sd.RawInputStream(samplerate=samplerate, channels=1, dtype='int16',
+                           blocksize=int(samplerate * frame_ms / 1000),
+                           callback=lambda data, count, t, status: frames.put(bytes(data))):
+        while not stop.is_set():
+            try:
+                yield frames.get(timeout=0.5)
+            except queue.Empty:
+                continue
+
+def create_stt_backend(name=None):
+    """Configured recognizer; falls back to Google if the local model is missing."""
+    name = name or STT_BACKEND
     try:
-        print("🔍 Recognizing...")
-        user_input = recognizer.recognize_google(audio)
-        print(f"🗣️ You said: {user_input}")
-        return user_input
-    except sr.UnknownValueError:
-        speak_text("Sorry, I didn't catch that. Could you please repeat?")
+        return STT_BACKENDS.get(name, VoskSTTBackend)()
+    except STTError as e:
+        print(f"⚠ {e}; falling back to Google speech recognition")
+        return GoogleSTTBackend()
+
+_stt_backend = None
+vad_threshold = 300
+
+def get_stt_backend():
+    global _stt_backend
+    if _stt_backend is None:
+        _stt_backend = create_stt_backend()
+    return _stt_backend
+
+def calibrate_microphone(duration=1):
+    """Measure ambient noise once and set the VAD threshold above it."""
+    global vad_threshold
+    print("🎚️ Calibrating for ambient noise...")
+    frames = iter_microphone_frames()
+    levels = [frame_rms(next(frames)) for _ in range(int(duration * 1000 / FRAME_MS))]
+    frames.close()
+    vad_threshold = max(300.0, 3.0 * (sum(levels) / len(levels)))
+    return vad_threshold
+
+def listen_to_user():
+    """Captures one utterance from the microphone and transcribes it to text."""
+    speak_text("Listening... please speak your query.")
+    print("🎤 Listening...")
+    frames = iter_microphone_frames()
+    try:
+        user_input = transcribe_utterance(frames, get_stt_backend(), EnergyVAD(vad_threshold),
+                                          on_partial=lambda text: print(f"   … {text}"))
+    except STTError as e:
+        speak_text(str(e), cache=False)
         return None
-    except sr.RequestError as e:
-        speak_text(f"My speech recognition service seems to be down. Error: {e}")
+    finally:
+        frames.close()
+
+    if user_input is None:
+        speak_text("I didn't hear anything. Please try again when you're ready.")
         return None
+    print(f"🗣️ You said: {user_input}")
+    return user_input
 
 def summarize_for_speech(response_json):
     """Creates a natural language summary of the agent's JSON response."""
@@ -89,38 +556,97 @@ def summarize_for_speech(response_json):
     
     return summary
 
-def main_loop():
-    """The main conversation loop for the voice client."""
-    session_id = None
-    speak_text("Hello! I'm your conversational database agent. How can I help you?")
+class VoicePipeline:
+    """
+    One voice turn with overlapping stages: the API call runs in the
+    background over a keep-alive session while a short acknowledgement
+    plays, and the answer is spoken sentence by sentence with barge-in.
+    """
 
-    while True:
-        user_query = listen_to_user()
+    def __init__(self, api_url=AGENT_API_URL, collection=DEFAULT_COLLECTION,
+                 speak=None, speak_stream=None, barge_in=None):
+        self.api_url = api_url
+        self.collection = collection
+        self.session_id = None
+        self.http = requests.Session()
+        self.http.headers["X-Request-Deadline-Ms"] = str(REQUEST_DEADLINE_MS)
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="agent-query")
+        self.speak = speak or speak_text
+        self.speak_stream = speak_stream or speak_streaming
+        # Factory returning a context manager that watches for barge-in
+        self.barge_in = barge_in
+        self.turn_latencies = []
 
-        if user_query is None:
-            continue
+    def query(self, user_query):
+        # Only these fields are spoken, so the server can leave the rest in MongoDB
+        payload = {"collection": self.collection, "query_text": user_query,
+                   "render_fields": ["name", "account_id"]}
+        if self.session_id:
+            payload["session_id"] = self.session_id
+        response = self.http.post(self.api_url, json=payload, timeout=REQUEST_TIMEOUT)
+        try:
+            response.raise_for_status()
+        except requests.exceptions.HTTPError:
+            if response.status_code != 429:
+                raise
+            retry_after = response.headers.get("Retry-After", "a few")
+            return {"error": f"I'm answering too many questions right now. Please ask again in {retry_after} seconds."}
+        return response.json()
 
-        if user_query.lower() in ["goodbye", "exit", "stop", "quit"]:
-            speak_text("Goodbye!")
-            break
-        
-        payload = { "collection": DEFAULT_COLLECTION, "query_text": user_query }
-        if session_id:
-            payload["session_id"] = session_id
-        
-        headers = {"Content-Type": "application/json"}
+    def handle_turn(self, user_query):
+        """Query the agent and speak the answer; returns False if the user barged in."""
+        turn_started = time.perf_counter()
+        pending = self.executor.submit(self.query, user_query)
+        try:
+            response_json = pending.result(timeout=ACK_DELAY)
+        except FutureTimeout:
+            # Let the user know we heard them while the query is in flight
+            self.speak(ACK_PHRASE)
+            response_json = None
 
         try:
-            response = requests.post(AGENT_API_URL, headers=headers, data=json.dumps(payload))
-            response.raise_for_status()
-            response_json = response.json()
-            session_id = response_json.get("session_id")
-            speech_summary = summarize_for_speech(response_json)
-            speak_text(speech_summary)
+            if response_json is None:
+                response_json = pending.result()
+            self.session_id = response_json.get("session_id") or self.session_id
+            summary = summarize_for_speech(response_json)
         except requests.exceptions.RequestException as e:
-            speak_text(f"I couldn't connect to my brain. Please check the server. Error: {e}")
+            summary = f"I couldn't connect to my brain. Please check the server. Error: {e}"
         except Exception as e:
-            speak_text(f"An unexpected error occurred: {e}")
+            summary = f"An unexpected error occurred: {e}"
+
+        self.turn_latencies.append(time.perf_counter() - turn_started)
+        cancel = threading.Event()
+        with (self.barge_in(cancel) if self.barge_in else nullcontext()):
+            completed = self.speak_stream(summary, cancel)
+        if not completed:
+            print("✋ Playback interrupted")
+        return completed
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+        self.http.close()
+
+def main_loop():
+    """The main conversation loop for the voice client."""
+    speak_text("Hello! I'm your conversational database agent. How can I help you?")
+    energy_threshold = calibrate_microphone()
+    barge_in = (lambda cancel: BargeInMonitor(cancel, energy_threshold)) if BARGE_IN else None
+    pipeline = VoicePipeline(barge_in=barge_in)
+
+    try:
+        while True:
+            user_query = listen_to_user()
+
+            if user_query is None:
+                continue
+
+            if user_query.lower() in ["goodbye", "exit", "stop", "quit"]:
+                speak_text("Goodbye!")
+                break
+
+            pipeline.handle_turn(user_query)
+    finally:
+        pipeline.close()
 
 if __name__ == "__main__":
     main_loop()
\ No newline at end of file